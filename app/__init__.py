@@ -9,10 +9,32 @@ from flask_mail import Mail
 from functools import update_wrapper
 # local import
 from instance.config import app_config
+from app.search import EventSearch
+from app.cache.categories import CategoryCache
+from app.cache.listings import ListingCache
+from app.cache.tokens import TokenCache
+from app.cache.blacklist import BlacklistFilter
+from app.maintenance import BlacklistPurger
+from app.profiling import QueryProfiler
+from app.metrics import Metrics
+from app.hashing import PasswordHasher, HashingBusy
+from app.smtp_pool import SMTPConnectionPool
+from app.mail_templates import EmailTemplates
 
 # initialize sql-alchemy
 db = SQLAlchemy()
 mail = Mail()
+search = EventSearch()
+category_cache = CategoryCache()
+listing_cache = ListingCache()
+token_cache = TokenCache()
+blacklist_filter = BlacklistFilter()
+token_purger = BlacklistPurger()
+password_hasher = PasswordHasher()
+mail_pool = SMTPConnectionPool()
+email_templates = EmailTemplates()
+query_profiler = QueryProfiler()
+metrics = Metrics()
 
 def create_app(config_name):
     """Creates a new Flask object and returns when it's configured
@@ -24,7 +46,18 @@ def create_app(config_name):
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
     db.init_app(app)
+    query_profiler.init_app(app)
+    metrics.init_app(app)
     mail.init_app(app)
+    mail_pool.init_app(app)
+    email_templates.init_app(app)
+    search.init_app(app)
+    category_cache.init_app(app)
+    listing_cache.init_app(app)
+    token_cache.init_app(app)
+    blacklist_filter.init_app(app)
+    token_purger.init_app(app)
+    password_hasher.init_app(app)
 
 
     # import the authentication blueprint and register it on the app
@@ -38,5 +71,6 @@ def create_app(config_name):
     app.errorhandler(404)(error.not_found_error)
     app.errorhandler(405)(error.method_error)
     app.errorhandler(500)(error.internal_error)
+    app.errorhandler(HashingBusy)(error.service_unavailable_error)
 
     return app
@@ -2,9 +2,10 @@
 import os
 import re
 from flask.views import MethodView
-from flask import make_response, request, jsonify, render_template, url_for
+from flask import make_response, request, jsonify, url_for
+from app import password_hasher, email_templates
+from app.hashing import HashingBusy
 from app.models import User, BlacklistToken
-from flask_bcrypt import Bcrypt
 from itsdangerous import URLSafeTimedSerializer
 
 from app.emails import send_mail, confirm_token
@@ -69,7 +70,7 @@ class RegistrationView(MethodView):
                 subject = "welcome to Bright Events"
 
                 link = url_for("auth.VERIFY_VIEW", token=token, _external=True)
-                html = render_template("inline_welcome.html", name=name, link=link)
+                html = email_templates.render("inline_welcome.html", name=name, link=link)
 
                 send_mail(to=user.email, subject=subject, html=html)
 
@@ -80,7 +81,10 @@ class RegistrationView(MethodView):
                 }
                 # return a response notifying the user that they registered successfully
                 return make_response(jsonify(response)), 201
-    
+
+            except HashingBusy:
+                # answered with a 503 by the app's error handler
+                raise
             except Exception as error:
                 # An error occured, therefore return a string message containing the error
                 response = {
@@ -123,6 +127,9 @@ class LoginView(MethodView):
             }
             return make_response(jsonify(response)), 401
 
+        except HashingBusy:
+            # answered with a 503 by the app's error handler
+            raise
         except Exception as er:
             # Create a response containing an string error message
             response = {
@@ -145,7 +152,7 @@ class RestEmailView(MethodView):
             subject = "Reset Password"
 
             link = url_for("auth.RESET_PASSWORD_VIEW", token=token, _external=True)
-            html = render_template("inline_reset.html", link=link)
+            html = email_templates.render("inline_reset.html", link=link)
 
             send_mail(to=user.email, subject=subject, html=html)
 
@@ -173,8 +180,7 @@ class RestPasswordView(MethodView):
         reset_password = User.query.filter_by(email=email).first()
 
         post_data = request.data
-        reset_password.password = Bcrypt().generate_password_hash(
-            post_data['password']).decode()
+        reset_password.password = password_hasher.hash_password(post_data['password'])
         reset_password.update_user_data()
 
 
@@ -290,7 +296,7 @@ class ConfirmEmailView(MethodView):
             subject = "Email Confirmation" # subject of the email
 
             link = url_for("auth.VERIFY_VIEW", token=token, _external=True)
-            html = render_template("inline_confirm.html", name=name, link=link)
+            html = email_templates.render("inline_confirm.html", name=name, link=link)
 
             send_mail(to=user.email, subject=subject, html=html) # send the email to the user
 
@@ -0,0 +1,133 @@
+"""Cache backends shared by the app's caches.
+
+SimpleBackend keeps values in this process. RedisBackend shares them
+between processes through any client exposing the redis-py get/set/delete
+calls, with set(nx=True) for add(); InMemoryRedis is a local stand-in for that client for tests and
+single box deployments. Values are stored as JSON so every backend
+behaves the same way. A backend's shared attribute tells whether other
+processes see what it stores.
+"""
+
+import json
+import threading
+import time
+
+
+class SimpleBackend(object):
+    """An in-process dict whose entries expire after a timeout."""
+
+    shared = False
+
+    def __init__(self):
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        """Returns the value stored at key, or None if missing or expired."""
+        with self.lock:
+            entry = self.values.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at is not None and expires_at <= time.time():
+                del self.values[key]
+                return None
+        return json.loads(value)
+
+    def set(self, key, value, timeout=None):
+        """Stores value at key, for timeout seconds if given."""
+        expires_at = time.time() + timeout if timeout else None
+        with self.lock:
+            self.values[key] = (expires_at, json.dumps(value))
+
+    def add(self, key, value, timeout=None):
+        """Stores value at key unless it holds an unexpired value, and
+        returns whether it did."""
+        expires_at = time.time() + timeout if timeout else None
+        with self.lock:
+            entry = self.values.get(key)
+            if entry is not None and (entry[0] is None or entry[0] > time.time()):
+                return False
+            self.values[key] = (expires_at, json.dumps(value))
+        return True
+
+    def delete(self, key):
+        """Removes key."""
+        with self.lock:
+            self.values.pop(key, None)
+
+    def clear(self):
+        """Removes every key."""
+        with self.lock:
+            self.values.clear()
+
+
+class InMemoryRedis(object):
+    """Implements the few redis-py client calls RedisBackend makes,
+    so the shared backend can run without a redis server."""
+
+    def __init__(self):
+        self.backend = SimpleBackend()
+
+    def get(self, name):
+        return self.backend.get(name)
+
+    def set(self, name, value, ex=None, nx=False):
+        if nx:
+            return self.backend.add(name, value, ex) or None
+        self.backend.set(name, value, ex)
+        return True
+
+    def delete(self, *names):
+        for name in names:
+            self.backend.delete(name)
+
+    def flushdb(self):
+        self.backend.clear()
+
+
+class RedisBackend(object):
+    """Stores values in redis (or a stand-in) under a common prefix."""
+
+    shared = True
+
+    def __init__(self, client, prefix='bright-events:'):
+        self.client = client
+        self.prefix = prefix
+
+    def get(self, key):
+        value = self.client.get(self.prefix + key)
+        if value is None:
+            return None
+        if isinstance(value, bytes):
+            value = value.decode()
+        return json.loads(value)
+
+    def set(self, key, value, timeout=None):
+        self.client.set(self.prefix + key, json.dumps(value), ex=timeout or None)
+
+    def add(self, key, value, timeout=None):
+        return bool(self.client.set(self.prefix + key, json.dumps(value),
+                                    ex=timeout or None, nx=True))
+
+    def delete(self, key):
+        self.client.delete(self.prefix + key)
+
+    def clear(self):
+        self.client.flushdb()
+
+
+def create_backend(app):
+    """Builds the backend named by the CACHE_BACKEND setting."""
+    name = app.config.get('CACHE_BACKEND', 'simple')
+    if name == 'simple':
+        return SimpleBackend()
+    if name == 'redis':
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError('CACHE_BACKEND "redis" needs the redis package installed')
+        return RedisBackend(redis.StrictRedis.from_url(app.config.get('CACHE_REDIS_URL')))
+    if name == 'redis-local':
+        return RedisBackend(InMemoryRedis())
+    raise ValueError('Unknown CACHE_BACKEND {}'.format(name))
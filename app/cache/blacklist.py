@@ -0,0 +1,151 @@
+"""Bloom filter in front of the blacklist_tokens lookup.
+
+Almost no token is ever blacklisted, so most blacklist checks can be
+answered "definitely not" from memory. The filter is loaded from
+blacklist_tokens on first use and updated by BlacklistToken.save. Only a
+possible hit falls back to SQL.
+
+Tokens blacklisted by other processes are picked up by re-reading the rows
+added since the last refresh. Every save publishes a new version through
+the cache backend, and a check that finds the version changed re-reads
+before answering, so a logout takes effect at once in every process
+sharing the backend. Rows are also re-read every BLACKLIST_FILTER_REFRESH
+seconds. The re-read starts BLACKLIST_FILTER_OVERLAP ids back, so a row
+whose transaction committed after a later id was already seen is not
+missed.
+
+A backend that is not shared cannot tell one process about another's
+saves. With more than one WEB_CONCURRENCY process on such a backend the
+filter answers "maybe" to every check, so each goes to the db.
+"""
+
+import hashlib
+import math
+import threading
+import time
+import uuid
+
+from app.cache import SimpleBackend, create_backend
+
+
+class BloomFilter(object):
+    """A fixed size bit array answering "maybe present" or "not present"."""
+
+    def __init__(self, capacity, error_rate=0.001):
+        capacity = max(capacity, 1)
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.size = int(math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, int(round(self.size / capacity * math.log(2))))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, item):
+        # double hashing: two 64 bit halves of one digest give every position
+        digest = hashlib.sha256(item.encode()).digest()
+        first = int.from_bytes(digest[:8], 'big')
+        second = int.from_bytes(digest[8:16], 'big') | 1
+        return [(first + i * second) % self.size for i in range(self.hashes)]
+
+    def add(self, item):
+        """Adds an item to the filter, counting it only if it was not
+        already (possibly) present."""
+        if item in self:
+            return
+        for position in self._positions(item):
+            self.bits[position // 8] |= 1 << (position % 8)
+        self.count += 1
+
+    def __contains__(self, item):
+        return all(self.bits[position // 8] & (1 << (position % 8))
+                   for position in self._positions(item))
+
+
+class BlacklistFilter(object):
+    """Tells whether a token might be blacklisted without querying the db."""
+
+    VERSION_KEY = 'blacklist-version'
+
+    def __init__(self, app=None):
+        self.backend = SimpleBackend()
+        self.trusted = True
+        self.capacity = 100000
+        self.error_rate = 0.001
+        self.refresh_interval = 5
+        self.overlap = 50
+        self.lock = threading.Lock()
+        self.reset()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Starts the app with an empty filter, loaded on first use."""
+        self.backend = create_backend(app)
+        self.trusted = self.backend.shared or app.config.get('WEB_CONCURRENCY', 1) <= 1
+        self.capacity = app.config.get('BLACKLIST_FILTER_CAPACITY', 100000)
+        self.error_rate = app.config.get('BLACKLIST_FILTER_ERROR_RATE', 0.001)
+        self.refresh_interval = app.config.get('BLACKLIST_FILTER_REFRESH', 5)
+        self.overlap = app.config.get('BLACKLIST_FILTER_OVERLAP', 50)
+        self.reset()
+        app.extensions['blacklist_filter'] = self
+
+    def reset(self):
+        """Empties the filter so the next check reloads it from the db."""
+        self.bloom = BloomFilter(self.capacity, self.error_rate)
+        self.last_id = 0
+        self.version = None
+        self.refreshed_at = None
+        self.lookups = 0
+        self.db_lookups = 0
+
+    def _refresh(self, version):
+        from app.models import BlacklistToken
+        # version was read before the rows, and is published after a
+        # row commits, so the rows read include every row it covers
+        self.version = version
+        since = max(self.last_id - self.overlap, 0) if self.refreshed_at else 0
+        rows = BlacklistToken.query.with_entities(
+            BlacklistToken.id, BlacklistToken.token_digest
+        ).filter(BlacklistToken.id > since).order_by(BlacklistToken.id).all()
+        for row_id, digest in rows:
+            self.bloom.add(digest)
+            self.last_id = max(self.last_id, row_id)
+        self.refreshed_at = time.time()
+
+        if self.bloom.count > self.bloom.capacity:
+            # too full to keep the error rate, rebuild twice as big
+            self.capacity = self.bloom.count * 2
+            self.bloom = BloomFilter(self.capacity, self.error_rate)
+            self.refreshed_at = None
+            self._refresh(version)
+
+    def might_contain(self, digest):
+        """False when the token with this digest is certainly not blacklisted."""
+        if not self.trusted:
+            with self.lock:
+                self.lookups += 1
+                self.db_lookups += 1
+            return True
+
+        version = self.backend.get(self.VERSION_KEY)
+        with self.lock:
+            if self.refreshed_at is None or version != self.version or \
+                    time.time() - self.refreshed_at >= self.refresh_interval:
+                self._refresh(version)
+            self.lookups += 1
+            found = digest in self.bloom
+            if found:
+                self.db_lookups += 1
+            return found
+
+    def add(self, digest):
+        """Records the digest of a token blacklisted by this process, once
+        its row is committed, and tells the other processes to re-read."""
+        with self.lock:
+            self.bloom.add(digest)
+        self.backend.set(self.VERSION_KEY, uuid.uuid4().hex)
+
+    def stats(self):
+        """Returns how many checks were made and how many needed the db."""
+        return {'lookups': self.lookups, 'db_lookups': self.db_lookups,
+                'entries': self.bloom.count}
@@ -0,0 +1,93 @@
+"""Cache of the event_category table.
+
+Categories almost never change but every serialized event needs its
+category name, so the whole table is cached as a list of (id, name)
+pairs, with an ETag of that list and the updated_at of each category.
+EventCategory.save and EventCategory.delete invalidate it, and entries
+also expire after CATEGORY_CACHE_TIMEOUT seconds so other processes
+using a SimpleBackend catch up.
+"""
+
+import hashlib
+import json
+import threading
+from dateutil.parser import isoparse
+
+from app.cache import SimpleBackend, create_backend
+
+
+class CategoryCache(object):
+    """Serves category names without querying the database once warm."""
+
+    KEY = 'event-categories'
+
+    def __init__(self, app=None):
+        self.backend = SimpleBackend()
+        self.timeout = 300
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Starts the app with an empty cache and fresh counters."""
+        self.backend = create_backend(app)
+        self.timeout = app.config.get('CATEGORY_CACHE_TIMEOUT', 300)
+        self.hits = 0
+        self.misses = 0
+        app.extensions['category_cache'] = self
+
+    def _load(self):
+        cached = self.backend.get(self.KEY)
+        with self.lock:
+            if cached is not None:
+                self.hits += 1
+            else:
+                self.misses += 1
+        if cached is None:
+            from app.models import EventCategory
+            rows = EventCategory.get__all_categories()
+            categories = [(category.id, category.category_name) for category in rows]
+            cached = {
+                'categories': categories,
+                'etag': hashlib.sha1(json.dumps(categories).encode()).hexdigest(),
+                'updated_at': {str(category.id): category.updated_at.isoformat()
+                               for category in rows},
+            }
+            self.backend.set(self.KEY, cached, self.timeout)
+        return cached
+
+    def get_all(self):
+        """Returns every category as a list of (id, category_name) pairs."""
+        return [tuple(category) for category in self._load()['categories']]
+
+    def get_versioned(self):
+        """Returns the categories as get_all does and an ETag of them, for
+        conditional requests. A deleted category leaves no updated_at
+        behind, so only the ETag tells that the table changed."""
+        cached = self._load()
+        return [tuple(category) for category in cached['categories']], cached['etag']
+
+    def get_updated_at(self, category_id):
+        """Returns when a category last changed, or None if it does not exist."""
+        updated_at = self._load()['updated_at'].get(str(category_id))
+        return isoparse(updated_at) if updated_at else None
+
+    def get_name(self, category_id):
+        """Returns the name of a category, or None if it does not exist."""
+        if category_id is None:
+            return None
+        try:
+            category_id = int(category_id)
+        except (TypeError, ValueError):
+            return None
+        return dict(self.get_all()).get(category_id)
+
+    def invalidate(self):
+        """Drops the cached table after a category changes."""
+        self.backend.delete(self.KEY)
+
+    def stats(self):
+        """Returns the hit and miss counters of this process."""
+        return {'hits': self.hits, 'misses': self.misses}
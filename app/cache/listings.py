@@ -0,0 +1,131 @@
+"""Cache of the public event listing responses.
+
+Pages of /api/events/all are stored under a key made from the current
+generation and the normalized query. Changing an event or category
+starts a new generation instead of finding and deleting every page, so
+pages of the old one are never read again and expire on their own after
+LISTING_CACHE_TIMEOUT seconds. Generations live in the cache backend, so
+on a SimpleBackend a change only starts one in the process that made it:
+with several WEB_CONCURRENCY processes the others keep serving their
+pages until they expire, and a warning is logged at start up.
+
+RSVPs change the rsvp_count of listed events but start no generation,
+or every page would miss during a ticket rush. Cached pages show counts
+up to LISTING_CACHE_TIMEOUT seconds old.
+
+A miss is filled once: threads of a process wait on a lock per key, and
+processes sharing a backend wait for the one that claimed the key with
+add() to store the page, for at most LISTING_CACHE_LOCK_TIMEOUT seconds.
+"""
+
+import threading
+import time
+import uuid
+import weakref
+
+from app.cache import SimpleBackend, create_backend
+
+
+class ListingCache(object):
+    """Serves repeated listing requests without querying the database."""
+
+    GENERATION_KEY = 'event-listing-generation'
+    POLL_INTERVAL = 0.02
+
+    def __init__(self, app=None):
+        self.backend = SimpleBackend()
+        self.timeout = 60
+        self.lock_timeout = 5
+        self.hits = 0
+        self.misses = 0
+        self.waits = 0
+        self.lock = threading.Lock()
+        self.key_locks = weakref.WeakValueDictionary()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Starts the app with an empty cache and fresh counters."""
+        self.backend = create_backend(app)
+        self.timeout = app.config.get('LISTING_CACHE_TIMEOUT', 60)
+        self.lock_timeout = app.config.get('LISTING_CACHE_LOCK_TIMEOUT', 5)
+        self.hits = 0
+        self.misses = 0
+        self.waits = 0
+        app.extensions['listing_cache'] = self
+        if not self.backend.shared and app.config.get('WEB_CONCURRENCY', 1) > 1:
+            app.logger.warning(
+                'listing cache: CACHE_BACKEND is not shared, so pages may be up to %ss '
+                'stale in processes other than the one changing an event', self.timeout)
+
+    def generation(self):
+        """Returns the current generation, starting one if there is none."""
+        generation = self.backend.get(self.GENERATION_KEY)
+        if generation is None:
+            generation = uuid.uuid4().hex
+            if not self.backend.add(self.GENERATION_KEY, generation):
+                generation = self.backend.get(self.GENERATION_KEY) or generation
+        return generation
+
+    def invalidate(self):
+        """Starts a new generation after an event or category changes."""
+        self.backend.set(self.GENERATION_KEY, uuid.uuid4().hex)
+
+    def get_or_set(self, key, load):
+        """Returns the value cached at key, calling load() to fill it on
+        a miss. The value must be JSON serializable."""
+        key = 'event-listing:{}:{}'.format(self.generation(), key)
+        value = self.backend.get(key)
+        if value is not None:
+            self._count('hits')
+            return value
+
+        with self._key_lock(key):
+            # another thread may have filled it while this one waited
+            value = self.backend.get(key)
+            if value is not None:
+                self._count('hits')
+                return value
+
+            lock_key = key + ':lock'
+            claimed = self.backend.add(lock_key, 1, self.lock_timeout)
+            if not claimed:
+                self._count('waits')
+                value = self._wait_for(key, lock_key)
+                if value is not None:
+                    return value
+            try:
+                self._count('misses')
+                value = load()
+                self.backend.set(key, value, self.timeout)
+            finally:
+                if claimed:
+                    self.backend.delete(lock_key)
+        return value
+
+    def _key_lock(self, key):
+        with self.lock:
+            lock = self.key_locks.get(key)
+            if lock is None:
+                lock = self.key_locks[key] = threading.Lock()
+        return lock
+
+    def _wait_for(self, key, lock_key):
+        # polls until the process holding lock_key stores the value
+        deadline = time.time() + self.lock_timeout
+        while time.time() < deadline:
+            time.sleep(self.POLL_INTERVAL)
+            value = self.backend.get(key)
+            if value is not None:
+                return value
+            if self.backend.get(lock_key) is None:
+                return self.backend.get(key)
+        return None
+
+    def _count(self, counter):
+        with self.lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def stats(self):
+        """Returns the hit, miss and wait counters of this process."""
+        return {'hits': self.hits, 'misses': self.misses, 'waits': self.waits}
@@ -0,0 +1,91 @@
+"""Cache of recently verified access tokens.
+
+Verifying a token costs an HMAC check and a blacklist lookup, and polling
+clients send the same token over and over. Verified tokens are kept in a
+bounded LRU keyed by their SHA-256 digest. An entry lives until the token's
+exp, or at most TOKEN_CACHE_TIMEOUT seconds. It only saves the HMAC check:
+User.decode_token still asks the blacklist filter about a cached token,
+so one logged out by another process is rejected as soon as the filter
+knows. BlacklistToken.save evicts the token from this process straight
+away.
+"""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+
+def token_digest(token):
+    """Returns the SHA-256 hex digest of a token."""
+    if isinstance(token, str):
+        token = token.encode()
+    return hashlib.sha256(token).hexdigest()
+
+
+class TokenCache(object):
+    """A bounded LRU mapping verified tokens to their user id."""
+
+    def __init__(self, app=None):
+        self.entries = OrderedDict()
+        self.max_size = 1024
+        self.timeout = 30
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Starts the app with an empty cache and fresh counters."""
+        self.max_size = app.config.get('TOKEN_CACHE_SIZE', 1024)
+        self.timeout = app.config.get('TOKEN_CACHE_TIMEOUT', 30)
+        self.clear()
+        app.extensions['token_cache'] = self
+
+    def get(self, token):
+        """Returns the user id of a cached token, or None."""
+        key = token_digest(token)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[0] <= time.time():
+                del self.entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, token, user_id, expires):
+        """Caches a verified token until expires (a unix timestamp)."""
+        if self.max_size < 1:
+            return
+        expires_at = min(expires, time.time() + self.timeout)
+        key = token_digest(token)
+        with self.lock:
+            self.entries[key] = (expires_at, user_id)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def invalidate(self, token):
+        """Evicts a token, e.g. once it has been blacklisted."""
+        self.invalidate_digest(token_digest(token))
+
+    def invalidate_digest(self, digest):
+        """Evicts the token with this digest."""
+        with self.lock:
+            self.entries.pop(digest, None)
+
+    def clear(self):
+        """Evicts every token and resets the counters."""
+        with self.lock:
+            self.entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        """Returns the hit and miss counters and size of this process' cache."""
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(self.entries)}
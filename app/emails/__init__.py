@@ -2,19 +2,30 @@ import os
 from flask_mail import Message
 from flask import current_app, make_response, jsonify
 from itsdangerous import URLSafeTimedSerializer, SignatureExpired
-from app import mail
+from app import mail_pool
 
 SECRET = URLSafeTimedSerializer(os.getenv('SECRET'))
 
 
-def send_mail(to, subject, html):
-    """a function to send emails from the app"""
+def build_message(to, subject, html):
+    """builds the Flask-Mail message for an email from the app"""
     msg = Message(sender=current_app.config.get('MAIL_USERNAME'),
                   recipients=[to])
     # os.getenv('MAIL_USERNAME')
     msg.subject = subject
     msg.html = html
-    mail.send(msg)
+    return msg
+
+
+def send_mail(to, subject, html):
+    """a function to send emails from the app.
+    With MAIL_QUEUE_ENABLED the email is written to the outbox for the
+    mail worker to send, so the request does not wait on the SMTP server."""
+    if current_app.config.get('MAIL_QUEUE_ENABLED'):
+        from app.models import OutboxMail
+        OutboxMail(recipient=to, subject=subject, html=html).save()
+        return "queued"
+    mail_pool.send(build_message(to, subject, html))
     return "sent"
 
 
@@ -0,0 +1,81 @@
+"""Sends the emails queued in the mail_outbox table.
+
+Run it with `python manage.py mail_worker`. Every poll the worker takes up
+to MAIL_OUTBOX_BATCH_SIZE due emails and sends them all over one pooled
+SMTP connection, which stays open for the next batch. A failed email is retried after MAIL_OUTBOX_RETRY_DELAY
+seconds, doubling on each attempt, and marked failed after
+MAIL_OUTBOX_MAX_ATTEMPTS attempts. Only emails the worker tried to send
+use an attempt, so an SMTP outage does not wear down the batch waiting
+behind it.
+"""
+
+import time
+from datetime import datetime, timedelta
+
+from flask import current_app
+
+from app import db, mail_pool
+from app.emails import build_message
+from app.smtp_pool import is_connection_error, send_timed
+from app.models import OutboxMail
+
+
+def _record_failure(outbox_mail, error, now):
+    config = current_app.config
+    outbox_mail.attempts += 1
+    outbox_mail.last_error = str(error)
+    if outbox_mail.attempts >= config.get('MAIL_OUTBOX_MAX_ATTEMPTS', 5):
+        outbox_mail.status = OutboxMail.FAILED
+    else:
+        delay = config.get('MAIL_OUTBOX_RETRY_DELAY', 30) * 2 ** (outbox_mail.attempts - 1)
+        outbox_mail.next_attempt_at = now + timedelta(seconds=delay)
+
+
+def drain_outbox(batch_size=None):
+    """Sends one batch of due emails, returning (sent, failed) counts."""
+    batch_size = batch_size or current_app.config.get('MAIL_OUTBOX_BATCH_SIZE', 50)
+    due = OutboxMail.get_due(batch_size)
+    if not due:
+        db.session.commit()
+        return 0, 0
+
+    sent = failed = 0
+    now = datetime.utcnow()
+    sending = None
+    try:
+        with mail_pool.connection() as connection:
+            for outbox_mail in due:
+                sending = outbox_mail
+                try:
+                    send_timed(connection, build_message(
+                        outbox_mail.recipient, outbox_mail.subject, outbox_mail.html))
+                except Exception as error:
+                    if is_connection_error(error):
+                        raise
+                    _record_failure(outbox_mail, error, now)
+                    failed += 1
+                else:
+                    outbox_mail.status = OutboxMail.SENT
+                    outbox_mail.sent_at = now
+                    sent += 1
+    except Exception as error:
+        # the connection itself failed: only the email it failed on used
+        # an attempt, the ones never tried are released unchanged
+        current_app.logger.warning('mail worker: SMTP connection failed: %s', error)
+        if sending is not None and sending.status == OutboxMail.PENDING \
+                and sending.next_attempt_at <= now:
+            _record_failure(sending, error, now)
+            failed += 1
+    db.session.commit()
+    return sent, failed
+
+
+def run_worker(poll_interval=None):
+    """Drains the outbox until stopped, sleeping when it is empty."""
+    poll_interval = poll_interval or current_app.config.get('MAIL_WORKER_POLL_INTERVAL', 2)
+    while True:
+        sent, failed = drain_outbox()
+        if sent or failed:
+            current_app.logger.info('mail worker: sent=%d failed=%d', sent, failed)
+        else:
+            time.sleep(poll_interval)
@@ -0,0 +1,102 @@
+"""A local SMTP server that keeps the messages it receives.
+
+It speaks just enough SMTP for smtplib (and so Flask-Mail) to deliver to
+it, which lets the tests and benchmarks exercise real SMTP sessions
+without a mail server:
+
+    sink = SMTPSink().start()
+    app.config.update(MAIL_SERVER=sink.host, MAIL_PORT=sink.port,
+                      MAIL_USE_TLS=False)
+    ...
+    sink.messages, sink.connections
+    sink.stop()
+
+Recipients added to sink.refused are refused, as a server refuses an
+address it has no mailbox for.
+"""
+
+import socketserver
+import threading
+
+
+class _SMTPHandler(socketserver.StreamRequestHandler):
+
+    def reply(self, line):
+        self.wfile.write((line + '\r\n').encode())
+
+    def handle(self):
+        sink = self.server.sink
+        with sink.lock:
+            sink.connections += 1
+        self.reply('220 localhost SMTP sink ready')
+        envelope = {'from': None, 'to': []}
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode(errors='replace').strip()
+            verb = command.split(' ', 1)[0].upper()
+            if verb == 'EHLO':
+                self.wfile.write(b'250-localhost\r\n250-AUTH PLAIN LOGIN\r\n250 8BITMIME\r\n')
+            elif verb == 'HELO':
+                self.reply('250 localhost')
+            elif verb == 'AUTH':
+                self.reply('235 Authentication successful')
+            elif verb == 'MAIL':
+                envelope = {'from': command[10:].strip('<> '), 'to': []}
+                self.reply('250 OK')
+            elif verb == 'RCPT':
+                recipient = command[8:].strip('<> ')
+                if recipient in sink.refused:
+                    self.reply('550 No such user')
+                    continue
+                envelope['to'].append(recipient)
+                self.reply('250 OK')
+            elif verb == 'DATA':
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                body = []
+                for data in iter(self.rfile.readline, b''):
+                    if data in (b'.\r\n', b'.\n'):
+                        break
+                    body.append(data)
+                with sink.lock:
+                    sink.messages.append(dict(envelope, data=b''.join(body).decode(errors='replace')))
+                self.reply('250 OK queued')
+            elif verb in ('RSET', 'NOOP'):
+                self.reply('250 OK')
+            elif verb == 'QUIT':
+                self.reply('221 Bye')
+                return
+            else:
+                self.reply('502 Command not implemented')
+
+
+class _ThreadingServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class SMTPSink(object):
+    """Accepts mail on host:port and records it in messages."""
+
+    def __init__(self, host='127.0.0.1', port=0):
+        self.server = _ThreadingServer((host, port), _SMTPHandler)
+        self.server.sink = self
+        self.host, self.port = self.server.server_address
+        self.messages = []
+        self.refused = set()
+        self.connections = 0
+        self.lock = threading.Lock()
+        self.thread = None
+
+    def start(self):
+        """Serves in a daemon thread and returns the sink."""
+        self.thread = threading.Thread(target=self.server.serve_forever, name='smtp-sink')
+        self.thread.daemon = True
+        self.thread.start()
+        return self
+
+    def stop(self):
+        """Shuts the server down."""
+        self.server.shutdown()
+        self.server.server_close()
@@ -26,4 +26,12 @@ def internal_error(error):
     response_object = {
         'message': 'Oops error from our side, weare working to solve it'
     }
-    return make_response(jsonify(response_object)), 500     
+    return make_response(jsonify(response_object)), 500
+
+def service_unavailable_error(error):
+    response_object = {
+        'message': str(error)
+    }
+    response = make_response(jsonify(response_object))
+    response.headers['Retry-After'] = '1'
+    return response, 503
@@ -0,0 +1,41 @@
+"""Conditional GET support for the public event reads.
+
+Responses carry a weak ETag, and a Last-Modified header where a single
+row's updated_at dates them. Collections have no Last-Modified: deleting
+a row changes them without moving the updated_at of the rows left. A
+request whose If-None-Match matches the ETag, or that sends no
+If-None-Match and an If-Modified-Since no older than Last-Modified, is
+answered with an empty 304 before anything is serialized.
+"""
+
+import hashlib
+
+from flask import make_response, request
+
+
+def entity_tag(*parts):
+    """Builds an ETag from the values a response is derived from."""
+    return hashlib.sha1('|'.join(str(part) for part in parts).encode()).hexdigest()
+
+
+def add_validators(response, tag, last_modified=None):
+    """Sets the ETag and, when known, Last-Modified of a response."""
+    response.set_etag(tag, weak=True)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    return response
+
+
+def not_modified(tag, last_modified=None):
+    """Returns a 304 response when the client's copy is current, else None.
+    If-None-Match takes precedence over If-Modified-Since, which only has
+    whole seconds to compare with."""
+    if request.if_none_match:
+        fresh = request.if_none_match.contains_weak(tag)
+    elif request.if_modified_since and last_modified is not None:
+        fresh = last_modified.replace(microsecond=0) <= request.if_modified_since
+    else:
+        fresh = False
+    if not fresh:
+        return None
+    return add_validators(make_response('', 304), tag, last_modified)
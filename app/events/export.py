@@ -0,0 +1,83 @@
+"""Streaming exports of query results as CSV, gzipped CSV or NDJSON.
+
+Rows are fetched in batches of EXPORT_BATCH_SIZE from a server-side
+cursor where the driver has one (psycopg2 does) and written out as they
+arrive, so memory use does not grow with the size of the export.
+"""
+
+import csv
+import io
+import json
+import zlib
+
+from flask import Response, current_app, stream_with_context
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv',
+    'csv.gz': 'application/gzip',
+    'ndjson': 'application/x-ndjson',
+}
+
+
+class InvalidFormat(ValueError):
+    """Raised for an export format other than those in EXPORT_FORMATS."""
+
+
+def export_format(name, default='csv'):
+    """Checks a requested export format, default when none is given."""
+    name = (name or default).lower()
+    if name not in EXPORT_FORMATS:
+        raise InvalidFormat('format must be one of {}'.format(', '.join(sorted(EXPORT_FORMATS))))
+    return name
+
+
+def stream_query(query):
+    """Iterates over a query's rows a batch at a time."""
+    batch_size = current_app.config.get('EXPORT_BATCH_SIZE', 1000)
+    return query.execution_options(stream_results=True).yield_per(batch_size)
+
+
+def csv_lines(fields, rows):
+    """Yields a CSV header line then one line per row."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in _with_header(fields, rows):
+        writer.writerow(row)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+
+def ndjson_lines(fields, rows):
+    """Yields one JSON object per row, keyed by fields."""
+    for row in rows:
+        yield json.dumps(dict(zip(fields, row)), default=str) + '\n'
+
+
+def gzip_chunks(lines):
+    """Gzip-compresses lines as they are produced."""
+    compressor = zlib.compressobj(wbits=16 + zlib.MAX_WBITS)
+    for line in lines:
+        chunk = compressor.compress(line.encode('utf-8'))
+        if chunk:
+            yield chunk
+    yield compressor.flush()
+
+
+def _with_header(fields, rows):
+    yield fields
+    for row in rows:
+        yield row
+
+
+def export_response(fields, rows, export, filename):
+    """Streams rows as an attachment in the given export format."""
+    if export == 'ndjson':
+        body = ndjson_lines(fields, rows)
+    else:
+        body = csv_lines(fields, rows)
+        if export == 'csv.gz':
+            body = gzip_chunks(body)
+    return Response(
+        stream_with_context(body), mimetype=EXPORT_FORMATS[export],
+        headers={'Content-Disposition': 'attachment; filename={}.{}'.format(filename, export)})
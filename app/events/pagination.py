@@ -0,0 +1,104 @@
+"""Helpers for paging through event queries.
+
+Two modes are supported. page/limit uses LIMIT/OFFSET and is kept for
+backwards compatibility. cursor/next_cursor is keyset based: the cursor
+holds the sort key values of the last row returned, so the next page is
+an index range scan no matter how deep the client pages.
+"""
+
+import base64
+import json
+from datetime import datetime
+
+from dateutil.parser import isoparse
+from flask import current_app
+from sqlalchemy import DateTime, and_, or_
+
+
+class InvalidCursor(ValueError):
+    """Raised when a client sends a cursor we did not issue."""
+
+
+def clamp_limit(limit):
+    """Keeps the page size between 1 and the configured MAX_PAGE_LIMIT."""
+    max_limit = current_app.config.get('MAX_PAGE_LIMIT', 100)
+    if limit < 1:
+        limit = current_app.config.get('DEFAULT_PAGE_LIMIT', 10)
+    return min(limit, max_limit)
+
+
+def page_items(query, page, limit):
+    """Returns the rows of the requested page of a query.
+    Unlike paginate() this does not issue an extra COUNT query."""
+    page = max(page, 1)
+    limit = clamp_limit(limit)
+    return query.limit(limit).offset((page - 1) * limit).all()
+
+
+def encode_cursor(values):
+    """Turns a dict of sort key values into an opaque url safe token.
+    datetimes are written in ISO 8601."""
+    values = {key: value.isoformat() if isinstance(value, datetime) else value
+              for key, value in values.items()}
+    raw = json.dumps(values, sort_keys=True, separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor, columns):
+    """Reads back the sort key values of a cursor made by encode_cursor."""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()).decode())
+        return [_read_value(column, values[column.key]) for column in columns]
+    except (ValueError, TypeError, KeyError):
+        raise InvalidCursor('Invalid cursor')
+
+
+def _read_value(column, value):
+    # a cursor only ever holds non null sort keys of its column's type
+    if isinstance(column.type, DateTime):
+        if not isinstance(value, str):
+            raise TypeError('{} must be a date and time'.format(column.key))
+        return isoparse(value)
+    python_type = column.type.python_type
+    if isinstance(value, bool) or not isinstance(value, python_type):
+        raise TypeError('{} must be a {}'.format(column.key, python_type.__name__))
+    return value
+
+
+def keyset_filter(columns, values):
+    """Builds the row comparison (c1, c2, ...) > (v1, v2, ...) portably,
+    as (c1 > v1) OR (c1 = v1 AND c2 > v2) OR ..."""
+    clauses = []
+    for position, column in enumerate(columns):
+        equal = [columns[i] == values[i] for i in range(position)]
+        clauses.append(and_(*(equal + [column > values[position]])))
+    return or_(*clauses)
+
+
+def _row_entity(row, columns):
+    """Returns the mapped object holding the sort keys of a result row."""
+    if isinstance(row, columns[0].class_):
+        return row
+    return row[0]
+
+
+def keyset_page(query, columns, cursor, limit):
+    """Returns (rows, next_cursor) for the page following cursor.
+    An empty cursor starts from the beginning; next_cursor is None on
+    the last page."""
+    limit = clamp_limit(limit)
+    query = query.order_by(None).order_by(*columns)
+    if cursor:
+        query = query.filter(keyset_filter(columns, decode_cursor(cursor, columns)))
+
+    # fetch one extra row to know whether there is a next page
+    rows = query.limit(limit + 1).all()
+    if len(rows) <= limit:
+        return rows, None
+
+    rows = rows[:limit]
+    last = _row_entity(rows[-1], columns)
+    next_cursor = encode_cursor(
+        {column.key: getattr(last, column.key) for column in columns})
+    return rows, next_cursor
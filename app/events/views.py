@@ -1,12 +1,27 @@
 """import depancies and methods."""
 
 from functools import wraps
+from urllib.parse import urlencode
 from flask.views import MethodView
-from flask import make_response, request, jsonify, render_template
-from app.models import User, Events, EventCategory
+from flask import current_app, make_response, request, jsonify
+from sqlalchemy.exc import IntegrityError
+from dateutil import parser as date_parser
+from app import db, search, category_cache, listing_cache, email_templates
+from app.models import User, Events, EventCategory, rsvps, RSVP_EXISTS, RSVP_WAITLISTED
 from app.emails import send_mail
 
 from . import events_blueprint
+from .pagination import InvalidCursor, clamp_limit, keyset_page, page_items
+from .export import InvalidFormat, export_format, export_response, stream_query
+from .conditional import add_validators, entity_tag, not_modified
+
+# columns listings are ordered by, which the keyset cursor is built from
+EVENT_SORT_KEYS = (Events.id,)
+# orders a listing may be asked for with ?sort=, each backed by an index
+EVENT_SORTS = {
+    'id': EVENT_SORT_KEYS,
+    'starts_at': (Events.starts_at, Events.id),
+}
 
 
 def token_required(function):
@@ -42,63 +57,285 @@ def token_required(function):
     return wrapper
 
 
+def serialize_event(event, event_category, created_by=None):
+    """Builds the JSON representation of an event shared by the event views.
+    created_by is only included when given, since the views differ on
+    whether they expose the creator id or name."""
+    obj = {
+        'id': event.id,
+        'title': event.title,
+        'location': event.location,
+        'time': event.time,
+        'date': event.date,
+        'description': event.description,
+        'image_url': event.image_url,
+        'event_category': event_category,
+        'rsvp_count': event.rsvp_count,
+        'capacity': event.capacity,
+        'starts_at': event.starts_at.isoformat() if event.starts_at else None
+    }
+    if created_by is not None:
+        obj['created_by'] = created_by
+    return obj
+
+
+def parse_capacity(value):
+    """Reads the optional capacity of an event, None meaning no limit.
+    Raises ValueError unless it is a positive whole number."""
+    if value in (None, ''):
+        return None
+    capacity = int(value)
+    if capacity < 1:
+        raise ValueError('capacity must be positive')
+    return capacity
+
+
+CAPACITY_ERROR = {'message': 'capacity must be a positive whole number'}
+TITLE_EXISTS = 'Event title exists. Choose another one'
+EVENT_FIELDS = [
+    'title', 'location', 'time', 'date',
+    'description', 'image_url', 'event_category'
+]
+
+
+def read_event(data):
+    """Validates the fields of a new event sent by a client.
+    Returns the arguments for Events and None, or None and a message
+    saying what is wrong. Text longer than its column is refused here,
+    as PostgreSQL would fail the whole insert on it."""
+    args = {}
+    for event_res in EVENT_FIELDS:
+        var = str(data.get(event_res, '')).capitalize()
+        var = var.strip(' \t\n\r')
+        if not var:
+            return None, '{} missing'.format(event_res)
+        length = getattr(Events.__table__.c[event_res].type, 'length', None)
+        if length and len(var) > length:
+            return None, '{} must be at most {} characters'.format(event_res, length)
+        args.update({event_res: var})
+
+    try:
+        args['capacity'] = parse_capacity(data.get('capacity'))
+    except (TypeError, ValueError):
+        return None, CAPACITY_ERROR['message']
+    return args, None
+
+
+class InvalidFilter(ValueError):
+    """Raised when a listing filter argument cannot be read."""
+
+
+def time_arg(name):
+    """Reads a date or date and time request argument, None when absent."""
+    value = request.args.get(name)
+    if not value:
+        return None
+    try:
+        return date_parser.parse(value)
+    except (ValueError, OverflowError):
+        raise InvalidFilter('{} must be a date or a date and time'.format(name))
+
+
+def filter_catalogue(events):
+    """Applies the event_category, title, location, from/to (starts_at
+    from inclusive, to exclusive) and q (full text search) filters of
+    the request to an event listing query."""
+    starts_from, starts_to = time_arg('from'), time_arg('to')
+    if starts_from:
+        events = events.filter(Events.starts_at >= starts_from)
+    if starts_to:
+        events = events.filter(Events.starts_at < starts_to)
+
+    arr = ['title', 'location']
+    categ = request.args.get('event_category')
+    if categ:
+        events = events.filter(Events.event_category == categ)
+    for element in arr:
+        val = request.args.get(element)
+        if val:
+            events = events.filter(getattr(Events, element).ilike('%{}%'.format(val)))
+
+    # full text search, ranked best match first
+    query = request.args.get('q')
+    if query:
+        events = search.filter(events, query)
+    return events
+
+
+# exported per event by CatalogueExportView, event_category becomes its name
+CATALOGUE_COLUMNS = (
+    Events.id, Events.title, Events.location, Events.time, Events.date,
+    Events.description, Events.image_url, Events.event_category, User.name,
+    Events.rsvp_count, Events.capacity, Events.starts_at, Events.updated_at,
+)
+CATALOGUE_FIELDS = (
+    'id', 'title', 'location', 'time', 'date', 'description', 'image_url',
+    'event_category', 'created_by', 'rsvp_count', 'capacity', 'starts_at', 'updated_at',
+)
+
+
+def listing_page(events, sort_keys=EVENT_SORT_KEYS, conditional=False):
+    """Reads and serializes a page of a listing query.
+    When a cursor argument is sent (empty for the first page) the page
+    is read with keyset pagination and returned with its next_cursor,
+    otherwise the page/limit arguments are used. Keyset pages are always
+    in sort_keys order, so search ranking only applies to page/limit.
+
+    Returns a JSON serializable dict of the response status and body and,
+    for a 200, its ETag. The ETag covers the query string, the id and
+    updated_at of each event on the page and the categories. Pages have
+    no Last-Modified, since deleting an event changes a page without
+    changing the updated_at of anything left on it. With conditional set
+    a page the client already has is not serialized, and a 304 without
+    body is returned instead."""
+    limit = request.args.get('limit', default=10, type=int)
+    cursor = request.args.get('cursor')
+    categories, categories_tag = category_cache.get_versioned()
+    categories = dict(categories)
+
+    next_cursor = None
+    if cursor is not None:
+        try:
+            rows, next_cursor = keyset_page(events, sort_keys, cursor, limit)
+        except InvalidCursor as error:
+            return {'status': 400, 'body': {'message': str(error)}}
+    else:
+        page = request.args.get('page', default=1, type=int)
+        rows = page_items(events, page, limit)
+
+    if cursor is None and not rows:
+        return {'status': 404, 'body': {'message': "No events found"}}
+    tag = entity_tag(request.query_string.decode(), categories_tag,
+                     *((event.id, event.updated_at) for event, _ in rows))
+    if conditional and not_modified(tag) is not None:
+        return {'status': 304, 'etag': tag}
+
+    results = [
+        serialize_event(event, categories.get(event.event_category), created_by=creator)
+        for event, creator in rows
+    ]
+    return {
+        'status': 200,
+        'body': {'events': results, 'next_cursor': next_cursor} if cursor is not None else results,
+        'etag': tag,
+    }
+
+
+def page_response(page):
+    """Builds the response to a page from listing_page, or an empty 304
+    when the client already has it."""
+    tag = page.get('etag')
+    if tag is None:
+        return make_response(jsonify(page['body'])), page['status']
+    unchanged = not_modified(tag)
+    if unchanged is not None:
+        return unchanged
+    response = make_response(jsonify(page['body']))
+    return add_validators(response, tag), page['status']
+
+
+def listing_response(events, sort_keys=EVENT_SORT_KEYS):
+    """Serializes a page of a listing query, see listing_page. Cached
+    pages are kept whole, so only this uncached path skips serializing
+    a page the client has."""
+    return page_response(listing_page(events, sort_keys, conditional=True))
+
+
+# the /api/events/all arguments whose pages are kept in the listing cache
+CACHED_LISTING_ARGS = ('page', 'limit', 'event_category', 'title', 'location')
+
+
+def listing_cache_key():
+    """Returns the request's arguments normalized into a listing cache
+    key, or None when it sends any the cache does not cover."""
+    if any(name not in CACHED_LISTING_ARGS for name in request.args):
+        return None
+    args = [
+        ('page', max(request.args.get('page', default=1, type=int), 1)),
+        ('limit', clamp_limit(request.args.get('limit', default=10, type=int))),
+    ]
+    for name in CACHED_LISTING_ARGS[2:]:
+        value = request.args.get(name)
+        if value:
+            args.append((name, value))
+    return urlencode(args)
+
+
 class AllEventsView(MethodView):
     """This class gets all events with out token validation."""
 
     @staticmethod
     def get():
-        """Handle POST request for this view. Url ---> /api/events/all"""
-
-        # GET all the events for this user
-        events = Events.query
-        page = request.args.get('page', default=1, type=int)
-        limit = request.args.get('limit', default=10, type=int)
-
-        args = {}
-        potential_search = ['event_category']
-
-        for search_res in potential_search:
-            var = request.args.get(search_res)
-            if var:
-                args.update({search_res: var})
+        """Handle POST request for this view. Url ---> /api/events/all
+        Pages asked for with only the CACHED_LISTING_ARGS come from the
+        listing cache."""
 
-        arr = ['title', 'location']
-        categ = request.args.get('event_category')
-        if categ:
-            events = events.filter_by(event_category=categ)
-        for element in arr:
-            val = request.args.get(element)
-            if val:
-                events = events.filter(getattr(Events, element).ilike('%{}%'.format(val)))
-
-        event_page = events.paginate(page, limit, False).items
+        # GET all the events with their category and creator in one query
+        try:
+            events = filter_catalogue(Events.get_listing())
+        except InvalidFilter as error:
+            return make_response(jsonify({'message': str(error)})), 400
+
+        sort = request.args.get('sort')
+        if not sort:
+            key = listing_cache_key()
+            if key is None:
+                return listing_response(events)
+            return page_response(listing_cache.get_or_set(key, lambda: listing_page(events)))
+        if sort not in EVENT_SORTS:
+            response = {
+                'message': 'sort must be one of {}'.format(', '.join(sorted(EVENT_SORTS)))
+            }
+            return make_response(jsonify(response)), 400
 
-        results = []
+        # events without a readable start time have no place in time order
+        sort_keys = EVENT_SORTS[sort]
+        events = events.filter(sort_keys[0].isnot(None)).order_by(None).order_by(*sort_keys)
+        return listing_response(events, sort_keys)
 
-        for event in event_page:
-            event = Events.query.filter_by(id=event.id).first_or_404()
-            category = EventCategory.query.filter_by(id=event.event_category).first()
-            event_category = category.category_name
 
-            obj = {
-                'id': event.id,
-                'title': event.title,
-                'location': event.location,
-                'time': event.time,
-                'date': event.date,
-                'description': event.description,
-                'image_url': event.image_url,
-                'event_category': event_category
-            }
-            results.append(obj)
+class CatalogueExportView(MethodView):
+    """This class streams the whole public catalogue in one response.
+    Url ---> /api/events/all/export"""
 
-        if not results:
-            response = {
-                'message': "No events found"
-            }
-            return make_response(jsonify(response)), 404
+    @staticmethod
+    def get():
+        """Streams the events matching the /api/events/all filters as
+        ?format=ndjson (the default), csv.gz or csv.
+
+        Last-Modified is the latest updated_at of the matching events.
+        With If-Modified-Since only events changed since then are sent,
+        from the start of that second. That may be none, but it is never
+        a 304: deleting an event does not move Last-Modified, so a 304
+        would tell the client its copy is whole when it is not. Such a
+        delta is sent no-store, so no cache keeps it as the whole export."""
+        try:
+            export = export_format(request.args.get('format'), default='ndjson')
+        except InvalidFormat as error:
+            return make_response(jsonify({'message': str(error)})), 400
 
-        return make_response(jsonify(results)), 200
+        try:
+            events = filter_catalogue(Events.get_listing())
+        except InvalidFilter as error:
+            return make_response(jsonify({'message': str(error)})), 400
+        last_modified = events.with_entities(
+            db.func.max(Events.updated_at)).order_by(None).scalar()
+        since = request.if_modified_since
+        if since is not None:
+            events = events.filter(Events.updated_at >= since)
+
+        categories = dict(category_cache.get_all())
+        rows = (
+            row[:7] + (categories.get(row[7]),) + row[8:]
+            for row in stream_query(events.with_entities(*CATALOGUE_COLUMNS))
+        )
+        response = export_response(CATALOGUE_FIELDS, rows, export, 'events')
+        if last_modified is not None:
+            response.last_modified = last_modified
+        response.vary.add('If-Modified-Since')
+        if since is not None:
+            response.cache_control.no_store = True
+        return response
 
 
 class SingleEventView(MethodView):
@@ -107,23 +344,25 @@ class SingleEventView(MethodView):
 
     @staticmethod
     def get(event_id):
-        """Handle getting a single event by id"""
-        event = Events.query.filter_by(id=event_id).first_or_404()
-        category = EventCategory.query.filter_by(id=event.event_category).first()
-        event_category = category.category_name
+        """Handle getting a single event by id.
+        Its updated_at and category are read first, so a request for an
+        unchanged event is answered 304 without loading the event."""
+        updated, category_id = db.session.query(
+            Events.updated_at, Events.event_category).filter(
+            Events.id == event_id).first_or_404()
+        event_category = category_cache.get_name(category_id)
+        tag = entity_tag(event_id, updated, event_category)
+        # a category with events cannot be deleted, so only a rename
+        # changes the name sent, and that moves its updated_at
+        last_modified = max(filter(None, (updated, category_cache.get_updated_at(category_id))))
+        unchanged = not_modified(tag, last_modified)
+        if unchanged is not None:
+            return unchanged
 
-        response = jsonify({
-            'id': event.id,
-            'title': event.title,
-            'location': event.location,
-            'time': event.time,
-            'date': event.date,
-            'description': event.description,
-            'image_url': event.image_url,
-            'created_by': event.created_by,
-            'event_category': event_category
-        })
-        return make_response(response), 200
+        event = Events.query.filter_by(id=event_id).first_or_404()
+        response = make_response(jsonify(serialize_event(
+            event, event_category, created_by=event.created_by)))
+        return add_validators(response, tag, last_modified), 200
 
 
 class UserEventsView(MethodView):
@@ -140,25 +379,13 @@ class UserEventsView(MethodView):
             }
             return make_response(jsonify(response)), 401
 
-        args = {}
-        event_models = [
-            'title', 'location', 'time', 'date',
-            'description', 'image_url', 'event_category'
-        ]
-
-        for event_res in event_models:
-            var = str(request.data.get(event_res, '').capitalize())
-            var = var.strip(' \t\n\r')
-            if not var:
-                response = {
-                    "message": '{} missing'.format(event_res)
-                }
-                return make_response(jsonify(response)), 401
-            args.update({event_res: var})
+        args, message = read_event(request.data)
+        if message:
+            return make_response(jsonify({"message": message})), 401
 
         if Events.query.filter_by(title=args['title']).first():
             response = {
-                "message": 'Event title exists. Choose another one'
+                "message": TITLE_EXISTS
             }
             return make_response(jsonify(response)), 401
 
@@ -168,18 +395,8 @@ class UserEventsView(MethodView):
         )
 
         event.save()
-        response = jsonify({
-            'id': event.id,
-            'title': event.title,
-            'location': event.location,
-            'time': event.time,
-            'date': event.date,
-            'description': event.description,
-            'image_url': event.image_url,
-            'created_by': user.name,
-            'event_category': event.event_category,
-
-        })
+        response = jsonify(serialize_event(
+            event, event.event_category, created_by=user.name))
 
         return make_response(response), 201
 
@@ -187,41 +404,80 @@ class UserEventsView(MethodView):
     def get(self, user_id):
         """Handle GET request for this view. Url ---> /api/events"""
 
-        user = User.query.filter_by(id=user_id).first()  # get user details
+        events = Events.get_listing().filter(Events.created_by == user_id)
 
-        page = request.args.get('page', default=1, type=int)
-        limit = request.args.get('limit', default=10, type=int)
+        return listing_response(events)
 
-        events = Events.get_all_user(user_id)
 
-        event_page = events.paginate(page, limit, False).items
-        results = []
+class BulkEventsView(MethodView):
+    """This class handles creating many events of a user at once.
+    Url ---> /api/events/bulk"""
 
-        for event in event_page:
-            event = Events.query.filter_by(id=event.id).first_or_404()
-            category = EventCategory.query.filter_by(id=event.event_category).first()
-            event_category = category.category_name
+    @token_required
+    def post(self, user_id):
+        """Creates every event in a JSON array, or none of them.
+        All rows are validated and their titles checked in one query
+        before a single transaction inserts them, and each invalid row
+        is reported with its index."""
 
-            obj = {
-                'id': event.id,
-                'title': event.title,
-                'location': event.location,
-                'time': event.time,
-                'date': event.date,
-                'description': event.description,
-                'image_url': event.image_url,
-                'event_category': event_category,
-                'created_by': user.name,
+        user = User.query.filter_by(id=user_id).first()  # get user details
+        if user.email_confirmed is not True:
+            response = {
+                "message": 'Your Must Confirm your Email Address in-order to create an event'
             }
-            results.append(obj)
+            return make_response(jsonify(response)), 401
 
-        if not results:
+        data = request.data
+        limit = current_app.config.get('BULK_EVENTS_LIMIT', 500)
+        if not isinstance(data, list) or not data or len(data) > limit:
             response = {
-                'message': "No events found"
+                "message": 'Send a JSON array of between 1 and {} events'.format(limit)
             }
-            return make_response(jsonify(response)), 404
+            return make_response(jsonify(response)), 400
+
+        categories = dict(category_cache.get_all())
+        category_ids = {str(category_id) for category_id in categories}
+        rows, errors, indexes = [], [], {}
+        for index, item in enumerate(data):
+            args, message = read_event(item) if isinstance(item, dict) else (
+                None, 'event must be an object')
+            if message is None and args['event_category'] not in category_ids:
+                message = 'event_category does not exist'
+            elif message is None and args['title'] in indexes:
+                message = 'Event title repeats event {}'.format(indexes[args['title']])
+            if message:
+                errors.append({'index': index, 'message': message})
+                continue
+            indexes[args['title']] = index
+            rows.append(args)
+
+        if indexes:
+            taken = Events.query.with_entities(Events.title).filter(
+                Events.title.in_(list(indexes)))
+            errors.extend({'index': indexes[title], 'message': TITLE_EXISTS}
+                          for title, in taken)
+
+        if errors:
+            response = {
+                "message": 'No events were created',
+                "errors": sorted(errors, key=lambda error: error['index'])
+            }
+            return make_response(jsonify(response)), 400
 
-        return make_response(jsonify(results)), 200
+        try:
+            events = Events.create_many(rows, created_by=user_id)
+        except IntegrityError:
+            db.session.rollback()
+            response = {
+                "message": TITLE_EXISTS
+            }
+            return make_response(jsonify(response)), 409
+
+        response = {
+            'events': [serialize_event(event, categories.get(event.event_category),
+                                       created_by=user.name) for event in events]
+        }
+        return make_response(jsonify(response)), 201
 
 
 class EventsManupilationView(MethodView):
@@ -231,11 +487,9 @@ class EventsManupilationView(MethodView):
     @token_required
     def get(self, user_id, event_id):
         """Handles single event data with GET by event id."""
-        user = User.query.filter_by(id=user_id).first()  # get user details
-
-        event = Events.query.filter_by(id=event_id).first_or_404()
-        category = EventCategory.query.filter_by(id=event.event_category).first()
-        event_category = category.category_name
+        event, creator = Events.get_listing().filter(
+            Events.id == event_id).first_or_404()
+        event_category = category_cache.get_name(event.event_category)
 
         if user_id is not event.created_by:
             response = {
@@ -243,17 +497,7 @@ class EventsManupilationView(MethodView):
             }
             return make_response(jsonify(response)), 401
 
-        response = jsonify({
-            'id': event.id,
-            'title': event.title,
-            'location': event.location,
-            'time': event.time,
-            'date': event.date,
-            'description': event.description,
-            'image_url': event.image_url,
-            'created_by': user.name,
-            'event_category': event_category
-        })
+        response = jsonify(serialize_event(event, event_category, created_by=creator))
         return make_response(response), 200
 
     @token_required
@@ -261,8 +505,6 @@ class EventsManupilationView(MethodView):
         """This function handles editing of single events by their id"""
 
         event = Events.query.filter_by(id=event_id).first_or_404()
-        category = EventCategory.query.filter_by(id=event.event_category).first()
-        event_category = category.category_name
 
         if user_id is not event.created_by:
             response = {
@@ -277,6 +519,11 @@ class EventsManupilationView(MethodView):
         description = str(request.data.get('description', ''))
         image_url = str(request.data.get('image_url', ''))
         event_category = str(request.data.get('event_category', ''))
+        if 'capacity' in request.data:
+            try:
+                event.capacity = parse_capacity(request.data['capacity'])
+            except (TypeError, ValueError):
+                return make_response(jsonify(CAPACITY_ERROR)), 401
 
         event.title = title
         event.location = location
@@ -287,17 +534,11 @@ class EventsManupilationView(MethodView):
         event.event_category = event_category
 
         event.save()
-        response = {
-            'id': event.id,
-            'title': event.title,
-            'location': event.location,
-            'time': event.time,
-            'date': event.date,
-            'description': event.description,
-            'image_url': event.image_url,
-            'created_by': event.created_by,
-            'event_category': event_category
-        }
+        if 'capacity' in request.data:
+            # seats added by a higher capacity go to those waiting
+            for promoted in event.fill_from_waitlist():
+                send_rsvp_mail(event, promoted)
+        response = serialize_event(event, event_category, created_by=event.created_by)
         return make_response(jsonify(response)), 200
 
     @token_required
@@ -318,6 +559,12 @@ class EventsManupilationView(MethodView):
                }, 200
 
 
+def send_rsvp_mail(event, user):
+    """Emails a user the details of the event they have a seat at."""
+    html = email_templates.render_rsvp(event, user.name)
+    send_mail(to=user.email, subject="RSVP to an Event", html=html)
+
+
 class EventRsvpView(MethodView):
     """This class handles POST method for user
     RSVP to and event in url, ----> /api/events/<int:event_id>/rsvp"""
@@ -330,26 +577,75 @@ class EventRsvpView(MethodView):
 
         # POST User to the RSVP
         user = User.query.filter_by(id=user_id).first_or_404()
-        has_prev_rsvpd = event.add_rsvp(user)
-        if has_prev_rsvpd:
+        outcome = event.add_rsvp(user)
+        if outcome == RSVP_EXISTS:
             response = {
                 'message': 'You have already reserved a seat'
             }
             return make_response(jsonify(response)), 202
-        subject = "RSVP to an Event"
-
-        html = render_template(
-            "inline_rsvp.html", title=event.title, date=event.date,
-            time=event.time, location=event.location, description=event.description
-        )
+        if outcome == RSVP_WAITLISTED:
+            response = {
+                'message': 'The event is full, you have been added to the waitlist'
+            }
+            return make_response(jsonify(response)), 202
 
-        send_mail(to=user.email, subject=subject, html=html)
+        send_rsvp_mail(event, user)
 
         response = {
             'message': 'You have Reserved a seat'
         }
         return make_response(jsonify(response)), 200
 
+    @token_required
+    def delete(self, user_id, event_id):
+        """Cancels a user's rsvp to a specific event."""
+
+        event = Events.query.filter_by(id=event_id).first_or_404()
+        user = User.query.filter_by(id=user_id).first_or_404()
+        if not event.remove_rsvp(user):
+            response = {
+                'message': 'You have not reserved a seat'
+            }
+            return make_response(jsonify(response)), 404
+
+        promoted = event.promote_waitlisted()
+        if promoted is not None:
+            send_rsvp_mail(event, promoted)
+
+        response = {
+            'message': 'You have cancelled your reservation'
+        }
+        return make_response(jsonify(response)), 200
+
+
+class EventRsvpExportView(MethodView):
+    """This class handles exporting the attendees of an event for its
+    creator. Url ----> /api/events/<int:event_id>/rsvps/export"""
+
+    @token_required
+    def get(self, user_id, event_id):
+        """Streams the attendees as ?format=csv (the default) or ndjson."""
+        event = Events.query.filter_by(id=event_id).first_or_404()
+
+        if user_id != event.created_by:
+            response = {
+                'message': 'Your do not have authorization to access this event privately'
+            }
+            return make_response(jsonify(response)), 401
+
+        try:
+            export = export_format(request.args.get('format'))
+        except InvalidFormat as error:
+            return make_response(jsonify({'message': str(error)})), 400
+
+        attendees = User.query.with_entities(User.id, User.name, User.email).join(
+            rsvps, rsvps.c.user_id == User.id
+        ).filter(rsvps.c.event_id == event_id).order_by(rsvps.c.user_id)
+
+        return export_response(
+            ('user_id', 'name', 'email'), stream_query(attendees), export,
+            'event-{}-rsvps'.format(event_id))
+
 
 class EventCategories(MethodView):
     """This class handles category creation and viewing"""
@@ -389,14 +685,17 @@ class EventCategories(MethodView):
     @staticmethod
     def get():
         """Handle GET request for this view. Url ---> /api/category"""
-        categories = EventCategory.get__all_categories()
+        categories, tag = category_cache.get_versioned()
+        unchanged = not_modified(tag)
+        if unchanged is not None:
+            return unchanged
 
         results = []
 
-        for category in categories:
+        for category_id, category_name in categories:
             obj = {
-                'id': category.id,
-                'category_name': category.category_name
+                'id': category_id,
+                'category_name': category_name
             }
             results.append(obj)
 
@@ -406,15 +705,19 @@ class EventCategories(MethodView):
             }
             return make_response(jsonify(response)), 404
 
-        return make_response(jsonify(results)), 200
+        response = make_response(jsonify(results))
+        return add_validators(response, tag), 200
 
 
 # Define the API resource
 ALL_EVENTS_VIEW = AllEventsView.as_view('ALL_EVENTS_VIEW')
+CATALOGUE_EXPORT_VIEW = CatalogueExportView.as_view('CATALOGUE_EXPORT_VIEW')
 SINGLE_EVENT_VIEW = SingleEventView.as_view('SINGLE_EVENT_VIEW')
 USER_EVENTS_VIEW = UserEventsView.as_view('USER_EVENTS_VIEW')
+BULK_EVENTS_VIEW = BulkEventsView.as_view('BULK_EVENTS_VIEW')
 EVENT_MANUPILATION_VIEW = EventsManupilationView.as_view('EVENT_MANUPILATION_VIEW')
 EVENT_RSVP_VIEW = EventRsvpView.as_view('EVENT_RSVP_VIEW')
+EVENT_RSVP_EXPORT_VIEW = EventRsvpExportView.as_view('EVENT_RSVP_EXPORT_VIEW')
 EVENT_CATEGORIES_VIEW = EventCategories.as_view('EVENT_CATEGORIES_VIEW')
 
 # Define the rule for view all events url --->  /api/events/all
@@ -424,6 +727,13 @@ events_blueprint.add_url_rule(
     view_func=ALL_EVENTS_VIEW,
     methods=['GET'])
 
+# Define the rule for exporting all events url --->  /api/events/all/export
+# Then add the rule to the blueprint
+events_blueprint.add_url_rule(
+    '/api/events/all/export',
+    view_func=CATALOGUE_EXPORT_VIEW,
+    methods=['GET'])
+
 # Define the rule for view all events url --->  /api/events/all/<int:event_id>
 # Then add the rule to the blueprint
 events_blueprint.add_url_rule(
@@ -443,6 +753,13 @@ events_blueprint.add_url_rule(
     view_func=USER_EVENTS_VIEW,
     methods=['GET'])
 
+# Define the rule for creating many events url --->  /api/events/bulk
+# Then add the rule to the blueprint
+events_blueprint.add_url_rule(
+    '/api/events/bulk',
+    view_func=BULK_EVENTS_VIEW,
+    methods=['POST'])
+
 # Define the rule for view all events url --->  /api/events/<int:event_id>
 # Then add the rule to the blueprint
 events_blueprint.add_url_rule(
@@ -467,6 +784,18 @@ events_blueprint.add_url_rule(
     view_func=EVENT_RSVP_VIEW,
     methods=['POST'])
 
+events_blueprint.add_url_rule(
+    '/api/events/<int:event_id>/rsvp',
+    view_func=EVENT_RSVP_VIEW,
+    methods=['DELETE'])
+
+# Define the rule for exporting attendees url --->  /api/events/<int:event_id>/rsvps/export
+# Then add the rule to the blueprint
+events_blueprint.add_url_rule(
+    '/api/events/<int:event_id>/rsvps/export',
+    view_func=EVENT_RSVP_EXPORT_VIEW,
+    methods=['GET'])
+
 # Define the rule for view all events url --->  /api/category
 # Then add the rule to the blueprint
 events_blueprint.add_url_rule(
@@ -0,0 +1,94 @@
+"""Password hashing off the request thread.
+
+bcrypt is deliberately slow, so a burst of logins could pin every worker
+thread and stall all other endpoints. PasswordHasher runs bcrypt in a
+pool of BCRYPT_POOL_SIZE processes at BCRYPT_LOG_ROUNDS cost. Every web
+process has a pool of its own, so the default size shares the cpus out
+between the WEB_CONCURRENCY processes. BCRYPT_QUEUE_SIZE further calls
+(none by default) may wait up to BCRYPT_QUEUE_TIMEOUT seconds for a free
+pool worker. Any other call gets HashingBusy at once, which the app
+answers with a 503. A pool size of 0 hashes inline.
+
+The calling thread still waits for its hash. A process with a single
+thread, as gunicorn's sync workers have, is taken by a login either way,
+so the Procfile runs threaded workers: logins past the pool's size are
+turned away, and the process' other threads stay free for other requests.
+"""
+
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import bcrypt
+
+
+class HashingBusy(Exception):
+    """Raised when the hashing pool and its queue are full."""
+
+
+def _hash_password(password, rounds):
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds)).decode('utf-8')
+
+
+def _check_password(pw_hash, password):
+    return bcrypt.checkpw(password.encode('utf-8'), pw_hash.encode('utf-8'))
+
+
+class PasswordHasher(object):
+    """Hashes and verifies passwords on a bounded worker pool."""
+
+    def __init__(self, app=None):
+        self.pool_size = 0
+        self.rounds = 12
+        self.queue_size = 0
+        self.queue_timeout = 0
+        self.executor = None
+        self.pid = None
+        self.slots = threading.BoundedSemaphore(1)
+        self.lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Reads the pool settings, the pool itself starts on first use."""
+        self.shutdown()
+        self.pool_size = app.config.get('BCRYPT_POOL_SIZE', 2)
+        self.rounds = app.config.get('BCRYPT_LOG_ROUNDS', 12)
+        self.queue_size = app.config.get('BCRYPT_QUEUE_SIZE', 0)
+        self.queue_timeout = app.config.get('BCRYPT_QUEUE_TIMEOUT', 0)
+        self.slots = threading.BoundedSemaphore(max(self.pool_size + self.queue_size, 1))
+        app.extensions['password_hasher'] = self
+
+    def _executor(self):
+        # processes forked before a gunicorn worker forks are not ours to use
+        with self.lock:
+            if self.executor is None or self.pid != os.getpid():
+                self.executor = ProcessPoolExecutor(max_workers=self.pool_size)
+                self.pid = os.getpid()
+            return self.executor
+
+    def _run(self, function, *args):
+        if self.pool_size < 1:
+            return function(*args)
+        if not (self.slots.acquire(timeout=self.queue_timeout) if self.queue_timeout
+                else self.slots.acquire(blocking=False)):
+            raise HashingBusy('Too many requests are hashing passwords, try again shortly')
+        try:
+            return self._executor().submit(function, *args).result()
+        finally:
+            self.slots.release()
+
+    def hash_password(self, password):
+        """Returns the bcrypt hash of a password."""
+        return self._run(_hash_password, password, self.rounds)
+
+    def check_password(self, pw_hash, password):
+        """Checks a password against its bcrypt hash."""
+        return self._run(_check_password, pw_hash, password)
+
+    def shutdown(self):
+        """Stops the worker processes of this process' pool."""
+        with self.lock:
+            if self.executor is not None and self.pid == os.getpid():
+                self.executor.shutdown(wait=False)
+            self.executor = None
@@ -0,0 +1,87 @@
+"""Email templates compiled once and RSVP bodies cached per event.
+
+The inline_*.html email templates are compiled when the app starts, so
+no request pays for parsing them or for Jinja's modification-time check.
+The RSVP email differs between guests of one event only by the guest's
+name. Its body is rendered once per event version around a placeholder,
+and each guest's escaped name is put in its place, so a rush of RSVPs
+to one event renders the template once. Render counts and times are
+kept per template in stats().
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+from markupsafe import Markup, escape
+
+EMAIL_TEMPLATES = ('inline_welcome.html', 'inline_confirm.html',
+                   'inline_reset.html', 'inline_rsvp.html')
+RSVP_TEMPLATE = 'inline_rsvp.html'
+# passes autoescaping untouched and cannot come from a user
+NAME_PLACEHOLDER = Markup('\x00name\x00')
+
+
+class EmailTemplates(object):
+    """Renders the email templates of an app."""
+
+    def __init__(self, app=None):
+        self.max_size = 256
+        self.templates = {}
+        self.rsvp_bodies = OrderedDict()
+        self.lock = threading.Lock()
+        self.timings = {}
+        self.hits = 0
+        self.misses = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Compiles the email templates and empties the RSVP cache."""
+        self.max_size = app.config.get('EMAIL_TEMPLATE_CACHE_SIZE', 256)
+        self.templates = {name: app.jinja_env.get_template(name) for name in EMAIL_TEMPLATES}
+        self.rsvp_bodies = OrderedDict()
+        self.timings = {}
+        self.hits = 0
+        self.misses = 0
+        app.extensions['email_templates'] = self
+
+    def render(self, template, **context):
+        """Renders one of the compiled email templates."""
+        started = time.perf_counter()
+        html = self.templates[template].render(**context)
+        elapsed = time.perf_counter() - started
+        with self.lock:
+            count, total = self.timings.get(template, (0, 0.0))
+            self.timings[template] = (count + 1, total + elapsed)
+        return html
+
+    def render_rsvp(self, event, name):
+        """Returns the RSVP email for event addressed to name."""
+        key = (event.id, event.title, event.date, event.time,
+               event.location, event.description)
+        with self.lock:
+            body = self.rsvp_bodies.get(key)
+            if body is not None:
+                self.rsvp_bodies.move_to_end(key)
+                self.hits += 1
+        if body is None:
+            body = self.render(
+                RSVP_TEMPLATE, name=NAME_PLACEHOLDER, title=event.title, date=event.date,
+                time=event.time, location=event.location, description=event.description)
+            with self.lock:
+                self.misses += 1
+                if self.max_size > 0:
+                    self.rsvp_bodies[key] = body
+                    while len(self.rsvp_bodies) > self.max_size:
+                        self.rsvp_bodies.popitem(last=False)
+        return body.replace(NAME_PLACEHOLDER, escape(name))
+
+    def stats(self):
+        """Returns render counts and mean times, and RSVP cache hits."""
+        renders = {
+            template: {'count': count, 'mean_ms': total * 1000 / count}
+            for template, (count, total) in self.timings.items()
+        }
+        return {'renders': renders, 'rsvp_hits': self.hits,
+                'rsvp_misses': self.misses, 'rsvp_cached': len(self.rsvp_bodies)}
@@ -0,0 +1,77 @@
+"""Background upkeep of the database.
+
+BlacklistPurger deletes blacklist_tokens rows whose token has expired, since
+an expired token is rejected by User.decode_token before the blacklist is
+consulted. It runs from `python manage.py purge_tokens`, or every
+BLACKLIST_PURGE_INTERVAL seconds in a daemon thread of each serving
+process when that setting is above 0.
+"""
+
+import threading
+import time
+
+
+class BlacklistPurger(object):
+    """Prunes expired blacklisted tokens and counts what it pruned."""
+
+    def __init__(self, app=None):
+        self.app = None
+        self.interval = 0
+        self.batch_size = 1000
+        self.thread = None
+        self.stopped = threading.Event()
+        self.runs = 0
+        self.rows_pruned = 0
+        self.last_run = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Reads the settings and schedules the purge if enabled."""
+        self.app = app
+        self.interval = app.config.get('BLACKLIST_PURGE_INTERVAL', 0)
+        self.batch_size = app.config.get('BLACKLIST_PURGE_BATCH_SIZE', 1000)
+        app.extensions['blacklist_purger'] = self
+        if self.interval > 0:
+            # start after any fork, in the process that serves requests
+            app.before_first_request(self.start)
+
+    def run_once(self):
+        """Purges expired tokens now and returns how many rows went."""
+        from app.models import BlacklistToken
+
+        started = time.time()
+        with self.app.app_context():
+            pruned = BlacklistToken.purge_expired(self.batch_size)
+        self.runs += 1
+        self.rows_pruned += pruned
+        self.last_run = time.time()
+        self.app.logger.info(
+            'blacklist purge: pruned=%d total_pruned=%d seconds=%.3f',
+            pruned, self.rows_pruned, self.last_run - started)
+        return pruned
+
+    def start(self):
+        """Runs the purge every interval seconds in a daemon thread."""
+        if self.thread is not None and self.thread.is_alive():
+            return
+        self.stopped.clear()
+        self.thread = threading.Thread(target=self._loop, name='blacklist-purger')
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop(self):
+        """Stops the background thread."""
+        self.stopped.set()
+
+    def _loop(self):
+        while not self.stopped.wait(self.interval):
+            try:
+                self.run_once()
+            except Exception:
+                self.app.logger.exception('blacklist purge failed')
+
+    def stats(self):
+        """Returns how many purges ran and how many rows they pruned."""
+        return {'runs': self.runs, 'rows_pruned': self.rows_pruned,
+                'last_run': self.last_run}
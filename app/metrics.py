@@ -0,0 +1,356 @@
+"""Prometheus metrics for the app, served at /metrics.
+
+Metrics records per endpoint request latency histograms, in-flight
+gauges and status code counters, how long requests wait to check a
+database connection out of the pool and how long emails take to send.
+The hit and miss counters of the caches are read from their stats() when
+metrics are written out, and a hit ratio gauge is derived from them.
+
+Under gunicorn every worker process has its own metrics. When METRICS_DIR
+is set each process writes a snapshot of its metrics to <pid>.json in
+that directory every METRICS_FLUSH_INTERVAL seconds, and /metrics adds
+up the snapshots of all processes. Counters and histograms of processes
+that have exited keep counting, their gauges are dropped. METRICS_DIR
+is emptied before the server starts by the on_starting hook of
+gunicorn.conf.py, which the Procfile runs gunicorn with. Without
+METRICS_DIR each scrape only sees the worker that answers it, so a
+warning is logged when WEB_CONCURRENCY is above 1.
+"""
+
+import glob
+import json
+import os
+import threading
+import time
+
+from flask import Response, g, request
+from sqlalchemy import event as sa_event
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# name: (type, help) of every metric family
+FAMILIES = {
+    'http_requests_total': ('counter', 'Requests answered, by endpoint, method and status.'),
+    'http_request_duration_seconds': ('histogram', 'Time to answer a request, by endpoint.'),
+    'http_requests_in_flight': ('gauge', 'Requests being answered, by endpoint.'),
+    'db_pool_checkout_seconds': ('histogram', 'Time waited for a database connection.'),
+    'mail_send_seconds': ('histogram', 'Time to send an email over SMTP, by outcome.'),
+    'smtp_connections_total': ('counter', 'SMTP connections opened or reused.'),
+    'cache_requests_total': ('counter', 'Cache lookups, by cache and result.'),
+    'cache_hit_ratio': ('gauge', 'Share of cache lookups that were hits.'),
+}
+
+
+def label_text(labels):
+    """Formats labels, given as sorted (name, value) pairs, for exposition."""
+    if not labels:
+        return ''
+    escaped = (
+        (name, str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n'))
+        for name, value in labels
+    )
+    return '{' + ','.join('{}="{}"'.format(name, value) for name, value in escaped) + '}'
+
+
+def number_text(value):
+    """Formats a sample value or bucket bound."""
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Metrics(object):
+    """Collects this process' metrics and renders those of every process."""
+
+    def __init__(self, app=None):
+        self.app = None
+        self.enabled = False
+        self.directory = None
+        self.flush_interval = 1
+        self.buckets = DEFAULT_BUCKETS
+        self.lock = threading.Lock()
+        self.pid = os.getpid()
+        self.thread = None
+        self.stopped = threading.Event()
+        self._reset()
+        if app is not None:
+            self.init_app(app)
+
+    def _reset(self):
+        self.counters = {}
+        self.gauges = {}
+        self.histograms = {}
+
+    def init_app(self, app):
+        """Hooks into the app and its engine and adds /metrics."""
+        from app import db
+
+        self.app = app
+        self.enabled = app.config.get('METRICS_ENABLED', True)
+        self.directory = app.config.get('METRICS_DIR')
+        self.flush_interval = app.config.get('METRICS_FLUSH_INTERVAL', 1)
+        self.buckets = tuple(app.config.get('METRICS_BUCKETS', DEFAULT_BUCKETS))
+        with self.lock:
+            self._reset()
+        app.extensions['metrics'] = self
+        if not self.enabled:
+            return
+        if self.directory:
+            os.makedirs(self.directory, exist_ok=True)
+        elif app.config.get('WEB_CONCURRENCY', 1) > 1:
+            app.logger.warning(
+                'metrics: METRICS_DIR is not set, so /metrics only reports the '
+                'worker process that answers each scrape')
+        if 'metrics' in app.view_functions:
+            return
+
+        # the engine is looked up once the database url can no longer change
+        app.before_first_request(lambda: self._time_pool(db.get_engine(app)))
+        app.before_request(self._start_request)
+        app.after_request(self._record_status)
+        app.teardown_request(self._finish_request)
+        app.add_url_rule('/metrics', 'metrics', self.view, methods=['GET'])
+        # start after any fork, in the process that serves requests
+        app.before_first_request(self.start)
+
+    def _time_pool(self, engine):
+        # the pool has no event for when a checkout starts, so its
+        # connect() is wrapped; a disposed engine gets a new pool
+        if not sa_event.contains(engine, 'engine_disposed', self._time_pool):
+            sa_event.listen(engine, 'engine_disposed', self._time_pool)
+        pool = engine.pool
+        connect = pool.connect
+        if getattr(connect, 'timed', False):
+            return
+
+        def timed_connect():
+            started = time.perf_counter()
+            try:
+                return connect()
+            finally:
+                self.observe('db_pool_checkout_seconds', time.perf_counter() - started)
+
+        timed_connect.timed = True
+        pool.connect = timed_connect
+
+    def _fork_check(self):
+        # a forked worker starts counting from zero, not from its parent
+        if self.pid != os.getpid():
+            self.pid = os.getpid()
+            self._reset()
+
+    def inc(self, name, value=1, **labels):
+        """Adds value to a counter."""
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self._fork_check()
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def add_gauge(self, name, value, **labels):
+        """Adds value, which may be negative, to a gauge."""
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self._fork_check()
+            self.gauges[key] = self.gauges.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        """Records one observation in a histogram."""
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self._fork_check()
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = [[0] * len(self.buckets), 0.0, 0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    histogram[0][index] += 1
+                    break
+            histogram[1] += value
+            histogram[2] += 1
+
+    @staticmethod
+    def _endpoint():
+        # unmatched urls share one label so clients cannot add series
+        return request.endpoint or 'unmatched'
+
+    def _start_request(self):
+        g.metrics_started = time.perf_counter()
+        self.add_gauge('http_requests_in_flight', 1, endpoint=self._endpoint())
+
+    @staticmethod
+    def _record_status(response):
+        g.metrics_status = response.status_code
+        return response
+
+    def _finish_request(self, exception=None):
+        started = g.pop('metrics_started', None)
+        if started is None:
+            return
+        endpoint = self._endpoint()
+        status = g.pop('metrics_status', 500)
+        self.add_gauge('http_requests_in_flight', -1, endpoint=endpoint)
+        self.inc('http_requests_total', endpoint=endpoint, method=request.method,
+                 status=str(status))
+        self.observe('http_request_duration_seconds', time.perf_counter() - started,
+                     endpoint=endpoint, method=request.method)
+
+    def snapshot(self):
+        """Returns this process' metrics, with the counters read from the
+        caches and the mail pool, in a JSON serializable form."""
+        from app import (category_cache, listing_cache, token_cache, blacklist_filter,
+                         email_templates, mail_pool)
+
+        collected = []
+        for cache, hits, misses in (
+                ('category', category_cache.hits, category_cache.misses),
+                ('listing', listing_cache.hits, listing_cache.misses),
+                ('token', token_cache.hits, token_cache.misses),
+                ('blacklist_filter',
+                 blacklist_filter.lookups - blacklist_filter.db_lookups,
+                 blacklist_filter.db_lookups),
+                ('rsvp_email', email_templates.hits, email_templates.misses)):
+            collected.append(['cache_requests_total', [['cache', cache], ['result', 'hit']], hits])
+            collected.append(['cache_requests_total', [['cache', cache], ['result', 'miss']], misses])
+        pool = mail_pool.stats()
+        collected.append(['smtp_connections_total', [['outcome', 'opened']], pool['opened']])
+        collected.append(['smtp_connections_total', [['outcome', 'reused']], pool['reused']])
+
+        with self.lock:
+            self._fork_check()
+            return {
+                'pid': self.pid,
+                'buckets': list(self.buckets),
+                'counters': [[name, labels, value]
+                             for (name, labels), value in self.counters.items()] + collected,
+                'gauges': [[name, labels, value]
+                           for (name, labels), value in self.gauges.items()],
+                'histograms': [[name, labels, counts, total, count]
+                               for (name, labels), (counts, total, count)
+                               in self.histograms.items()],
+            }
+
+    def flush(self):
+        """Writes this process' snapshot to METRICS_DIR."""
+        snapshot = self.snapshot()
+        path = os.path.join(self.directory, '{}.json'.format(snapshot['pid']))
+        temporary = path + '.tmp'
+        with open(temporary, 'w') as snapshot_file:
+            json.dump(snapshot, snapshot_file)
+        os.replace(temporary, path)
+
+    def start(self):
+        """Flushes every METRICS_FLUSH_INTERVAL seconds in a daemon thread
+        when METRICS_DIR is set."""
+        if not self.directory:
+            return
+        if self.thread is not None and self.thread.is_alive() and self.pid == os.getpid():
+            return
+        self.stopped.clear()
+        self.thread = threading.Thread(target=self._loop, name='metrics-flush')
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop(self):
+        """Stops the background thread."""
+        self.stopped.set()
+
+    def _loop(self):
+        while not self.stopped.wait(self.flush_interval) and self.directory:
+            try:
+                self.flush()
+            except Exception:
+                self.app.logger.exception('metrics flush failed')
+
+    def snapshots(self):
+        """Returns the snapshots of every process, this one up to date."""
+        if not self.directory:
+            return [self.snapshot()]
+        self.flush()
+        snapshots = []
+        for path in glob.glob(os.path.join(self.directory, '*.json')):
+            try:
+                with open(path) as snapshot_file:
+                    snapshots.append(json.load(snapshot_file))
+            except (OSError, ValueError):
+                continue  # removed or replaced while being read
+        return snapshots
+
+    def render(self):
+        """Returns the metrics of every process in the text format."""
+        counters, gauges, histograms = {}, {}, {}
+        for snapshot in self.snapshots():
+            alive = process_alive(snapshot['pid'])
+            for name, labels, value in snapshot['counters']:
+                key = (name, tuple(map(tuple, labels)))
+                counters[key] = counters.get(key, 0) + value
+            for name, labels, value in snapshot['gauges'] if alive else []:
+                key = (name, tuple(map(tuple, labels)))
+                gauges[key] = gauges.get(key, 0) + value
+            for name, labels, counts, total, count in snapshot['histograms']:
+                key = (name, tuple(map(tuple, labels)), tuple(snapshot['buckets']))
+                merged = histograms.setdefault(key, [[0] * len(counts), 0.0, 0])
+                merged[0] = [left + right for left, right in zip(merged[0], counts)]
+                merged[1] += total
+                merged[2] += count
+
+        for (name, labels), hits in list(counters.items()):
+            if name == 'cache_requests_total' and ('result', 'hit') in labels:
+                cache = dict(labels)['cache']
+                misses = counters.get((name, (('cache', cache), ('result', 'miss'))), 0)
+                if hits + misses:
+                    gauges[('cache_hit_ratio', (('cache', cache),))] = hits / (hits + misses)
+
+        samples = {}
+        for (name, labels), value in counters.items():
+            samples.setdefault(name, []).append((name, labels, value))
+        for (name, labels), value in gauges.items():
+            samples.setdefault(name, []).append((name, labels, value))
+        for (name, labels, buckets), (counts, total, count) in histograms.items():
+            lines = samples.setdefault(name, [])
+            cumulative = 0
+            for bound, bucket_count in zip(buckets, counts):
+                cumulative += bucket_count
+                lines.append((name + '_bucket', labels + (('le', number_text(bound)),),
+                              cumulative))
+            lines.append((name + '_bucket', labels + (('le', '+Inf'),), count))
+            lines.append((name + '_sum', labels, total))
+            lines.append((name + '_count', labels, count))
+
+        output = []
+        for name in sorted(samples):
+            kind, help_text = FAMILIES.get(name, ('untyped', name))
+            output.append('# HELP {} {}'.format(name, help_text))
+            output.append('# TYPE {} {}'.format(name, kind))
+            for sample, labels, value in sorted(samples[name], key=sample_order):
+                output.append('{}{} {}'.format(sample, label_text(labels), number_text(value)))
+        return '\n'.join(output) + '\n'
+
+    def view(self):
+        """Serves the metrics. Url ---> /metrics"""
+        return Response(self.render(), content_type=CONTENT_TYPE)
+
+
+def sample_order(sample):
+    """Orders samples by labels, keeping each histogram's lines together."""
+    name, labels, _ = sample
+    series = tuple(label for label in labels if label[0] != 'le')
+    suffix = ('_bucket', '_sum', '_count').index(name[name.rfind('_'):]) \
+        if name.endswith(('_bucket', '_sum', '_count')) else 0
+    bound = dict(labels).get('le')
+    return (series, suffix, float('inf') if bound in (None, '+Inf') else float(bound))
+
+
+def process_alive(pid):
+    """Returns whether a process with this pid is running."""
+    if pid == os.getpid():
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
@@ -1,16 +1,70 @@
 """File contains the db models for application and tables"""
 
 from datetime import datetime, timedelta
-from app import db
-from flask_bcrypt import Bcrypt
+from app import (db, search, category_cache, listing_cache, token_cache, blacklist_filter,
+                 password_hasher)
+from app.search import install_search_trigger
+from app.cache.tokens import token_digest
 import jwt
+from dateutil import parser as date_parser
 from flask import current_app
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.exc import IntegrityError
+
+# how long an access token issued by User.generate_token stays valid
+TOKEN_LIFETIME = timedelta(minutes=1440)
+
+# outcomes of Events.add_rsvp
+RSVP_RESERVED = 'reserved'
+RSVP_EXISTS = 'exists'
+RSVP_WAITLISTED = 'waitlisted'
 
 rsvps = db.Table('rsvps',
-                 db.Column('user_id', db.Integer, db.ForeignKey('users.id')),
-                 db.Column('event_id', db.Integer, db.ForeignKey('eventlists.id'))
+                 db.Column('user_id', db.Integer, db.ForeignKey('users.id'), primary_key=True),
+                 db.Column('event_id', db.Integer, db.ForeignKey('eventlists.id'), primary_key=True),
+                 # the primary key serves lookups by user, this one by event
+                 db.Index('ix_rsvps_event_id_user_id', 'event_id', 'user_id')
                  )
 
+# users waiting for a seat at a full event, served in id order
+waitlist = db.Table('waitlist',
+                    db.Column('id', db.Integer, primary_key=True, autoincrement=True),
+                    db.Column('user_id', db.Integer, db.ForeignKey('users.id'), nullable=False),
+                    db.Column('event_id', db.Integer, db.ForeignKey('eventlists.id'),
+                              nullable=False),
+                    db.Column('joined_on', db.DateTime, nullable=False, default=datetime.utcnow),
+                    db.UniqueConstraint('event_id', 'user_id', name='uq_waitlist_event_id_user_id'),
+                    db.Index('ix_waitlist_event_id_id', 'event_id', 'id')
+                    )
+
+
+def parse_starts_at(date, time):
+    """Reads the free text date and time of an event, such as
+    '6th JAN 2017' and '10:00AM', as a datetime, or None if they do not
+    make one."""
+    try:
+        return date_parser.parse('{} {}'.format(date, time))
+    except (ValueError, OverflowError):
+        return None
+
+
+def insert_ignoring_duplicates(table, **values):
+    """Inserts a row unless it would break a unique constraint, and
+    returns the number of rows inserted, in a single statement where the
+    database supports it."""
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'postgresql':
+        statement = postgresql.insert(table).values(**values).on_conflict_do_nothing()
+    elif dialect == 'sqlite':
+        statement = table.insert().prefix_with('OR IGNORE').values(**values)
+    else:
+        try:
+            with db.session.begin_nested():
+                return db.session.execute(table.insert().values(**values)).rowcount
+        except IntegrityError:
+            return 0
+    return db.session.execute(statement).rowcount
+
 
 class User(db.Model):
     """This class defines the users table """
@@ -33,13 +87,13 @@ class User(db.Model):
         self.name = name
         self.email = email
         self.email_confirmed = email_confirmed
-        self.password = Bcrypt().generate_password_hash(password).decode()
+        self.password = password_hasher.hash_password(password)
 
     def password_is_valid(self, password):
         """
         Checks the password against it's hash to validates the user's password
         """
-        return Bcrypt().check_password_hash(self.password, password)
+        return password_hasher.check_password(self.password, password)
 
     def save(self):
         """Save a user to the database.
@@ -63,7 +117,7 @@ class User(db.Model):
         try:
             # set up a payload with an expiration time
             payload = {
-                'exp': datetime.utcnow() + timedelta(minutes=1440),
+                'exp': datetime.utcnow() + TOKEN_LIFETIME,
                 'iat': datetime.utcnow(),
                 'sub': user_id
             }
@@ -81,15 +135,22 @@ class User(db.Model):
 
     @staticmethod
     def decode_token(token):
-        """Decodes the access token from the Authorization header."""
+        """Decodes the access token from the Authorization header.
+        Recently verified tokens skip the signature check, but not the
+        blacklist, which another process may have added them to."""
+        user_id = token_cache.get(token)
+        if user_id is not None:
+            if BlacklistToken.check_blacklist(token):
+                token_cache.invalidate(token)
+                return 'Token blacklisted. Please log in again.'
+            return user_id
         try:
             # try to decode the token using our SECRET variable
             payload = jwt.decode(token, current_app.config.get('SECRET'))
             is_blacklisted_token = BlacklistToken.check_blacklist(token)
             if is_blacklisted_token:
                 return 'Token blacklisted. Please log in again.'
-            else:
-                return payload['sub']
+            token_cache.set(token, payload['sub'], payload['exp'])
             return payload['sub']
         except jwt.ExpiredSignatureError:
             # the token is expired, return an error string
@@ -113,6 +174,8 @@ class EventCategory(db.Model):
 
     id = db.Column(db.Integer, primary_key=True, autoincrement=True, unique=True)
     category_name = db.Column(db.String(50), unique=True, nullable=False)
+    updated_at = db.Column(db.DateTime, nullable=False,
+                           default=datetime.utcnow, onupdate=datetime.utcnow)
     eventlists = db.relationship(
         'Events', order_by='Events.id')
 
@@ -125,6 +188,15 @@ class EventCategory(db.Model):
         """
         db.session.add(self)
         db.session.commit()
+        category_cache.invalidate()
+        listing_cache.invalidate()
+
+    def delete(self):
+        """This method deletes a given category."""
+        db.session.delete(self)
+        db.session.commit()
+        category_cache.invalidate()
+        listing_cache.invalidate()
 
     @staticmethod
     def get__all_categories():
@@ -156,9 +228,33 @@ class Events(db.Model):
     image_url = db.Column(db.String(255))
     created_by = db.Column(db.Integer, db.ForeignKey(User.id))
     event_category = db.Column(db.Integer, db.ForeignKey(EventCategory.id))
+    # kept equal to the event's rows in rsvps by add_rsvp and remove_rsvp;
+    # RSVPs leave the listing cache be, so cached pages of /api/events/all
+    # show it up to LISTING_CACHE_TIMEOUT seconds late
+    rsvp_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    # the most seats add_rsvp hands out, unlimited when None
+    capacity = db.Column(db.Integer)
+    # UTC time of the last change, including to rsvp_count through Core
+    # updates of the table, which apply onupdate as well
+    updated_at = db.Column(db.DateTime, nullable=False, index=True,
+                           default=datetime.utcnow, onupdate=datetime.utcnow)
+    # date and time read as one timestamp by save, None when they cannot be
+    starts_at = db.Column(db.DateTime)
+    # maintained by a trigger on PostgreSQL, unused elsewhere (see app.search)
+    search_vector = db.deferred(db.Column(
+        db.Text().with_variant(postgresql.TSVECTOR(), 'postgresql')))
+
+    __table_args__ = (
+        db.Index('ix_eventlists_search_vector', 'search_vector', postgresql_using='gin'),
+        # range scans and keyset pages in chronological order
+        db.Index('ix_eventlists_starts_at_id', 'starts_at', 'id'),
+        # a user's and a category's events, in listing (id) order
+        db.Index('ix_eventlists_created_by_id', 'created_by', 'id'),
+        db.Index('ix_eventlists_event_category_id', 'event_category', 'id'),
+    )
 
     def __init__(self, title, location, time, date,
-                 description, image_url, created_by, event_category):
+                 description, image_url, created_by, event_category, capacity=None):
         """initialize an event with its creator."""
         self.title = title
         self.location = location
@@ -168,39 +264,164 @@ class Events(db.Model):
         self.image_url = image_url
         self.created_by = created_by
         self.event_category = event_category
+        self.capacity = capacity
 
     def save(self):
         """Save an event to the database.
         This includes creating a new event and editing one.
         """
+        self.starts_at = parse_starts_at(self.date, self.time)
         db.session.add(self)
         db.session.commit()
+        search.index_event(self)
+        listing_cache.invalidate()
+
+    @staticmethod
+    def create_many(rows, created_by):
+        """Inserts events from dicts of their fields in one transaction,
+        with one multi-row INSERT, and returns them in the same order."""
+        db.session.execute(Events.__table__.insert(), [
+            dict(row, created_by=created_by,
+                 starts_at=parse_starts_at(row['date'], row['time'])) for row in rows
+        ])
+        db.session.commit()
+        titles = [row['title'] for row in rows]
+        events = {event.title: event
+                  for event in Events.query.filter(Events.title.in_(titles))}
+        for event in events.values():
+            search.index_event(event)
+        listing_cache.invalidate()
+        return [events[title] for title in titles]
 
     def add_rsvp(self, user):
-        """ This method adds a user to the list of rsvps"""
-        # check if the user is already in the list
-        evt = user.myrsvps.filter_by(id=self.id).first()
-        if evt:
+        """Reserves a seat for a user, or puts them on the waitlist when
+        the event is at capacity. Returns RSVP_RESERVED, RSVP_EXISTS if
+        the user already had a seat, or RSVP_WAITLISTED.
+
+        The seat is claimed with a conditional UPDATE of rsvp_count, so
+        concurrent requests queue on the event row and none can take a
+        seat past capacity. The (user_id, event_id) primary key of rsvps
+        settles duplicates without reading them first."""
+        if self._claim_seat():
+            if not insert_ignoring_duplicates(rsvps, user_id=user.id, event_id=self.id):
+                db.session.rollback()  # gives the seat back
+                return RSVP_EXISTS
+            db.session.execute(waitlist.delete().where(
+                (waitlist.c.user_id == user.id) & (waitlist.c.event_id == self.id)))
+            db.session.commit()
+            return RSVP_RESERVED
+
+        reserved = db.session.execute(db.select([rsvps.c.user_id]).where(
+            (rsvps.c.user_id == user.id) & (rsvps.c.event_id == self.id))).first()
+        if reserved:
+            db.session.rollback()
+            return RSVP_EXISTS
+        insert_ignoring_duplicates(waitlist, user_id=user.id, event_id=self.id,
+                                   joined_on=datetime.utcnow())
+        db.session.commit()
+        return RSVP_WAITLISTED
+
+    def remove_rsvp(self, user):
+        """Gives up a user's seat, or their place on the waitlist, and
+        returns False if they had neither."""
+        deleted = db.session.execute(rsvps.delete().where(
+            (rsvps.c.user_id == user.id) & (rsvps.c.event_id == self.id)
+        )).rowcount
+        if deleted:
+            self._change_rsvp_count(-1)
+            db.session.commit()
             return True
-        self.rsvpList.append(user)
-        db.session.add(user)
+        deleted = db.session.execute(waitlist.delete().where(
+            (waitlist.c.user_id == user.id) & (waitlist.c.event_id == self.id)
+        )).rowcount
+        db.session.commit()
+        return deleted > 0
+
+    def promote_waitlisted(self):
+        """Gives a free seat to the user longest on the waitlist, and
+        returns that user, or None when no seat or nobody is waiting."""
+        if not self._claim_seat():
+            db.session.rollback()
+            return None
+        while True:
+            waiting = db.session.execute(
+                db.select([waitlist.c.id, waitlist.c.user_id])
+                .where(waitlist.c.event_id == self.id)
+                .order_by(waitlist.c.id).limit(1)
+            ).first()
+            if waiting is None:
+                db.session.rollback()
+                return None
+            db.session.execute(waitlist.delete().where(waitlist.c.id == waiting.id))
+            if insert_ignoring_duplicates(rsvps, user_id=waiting.user_id, event_id=self.id):
+                db.session.commit()
+                return User.query.get(waiting.user_id)
+
+    def fill_from_waitlist(self):
+        """Promotes waitlisted users into every free seat, as after the
+        capacity was raised, and returns the users promoted."""
+        promoted = []
+        user = self.promote_waitlisted()
+        while user is not None:
+            promoted.append(user)
+            user = self.promote_waitlisted()
+        return promoted
+
+    def _claim_seat(self):
+        # the row lock taken here is held until the caller commits
+        return db.session.execute(Events.__table__.update().where(
+            (Events.id == self.id)
+            & ((Events.capacity.is_(None)) | (Events.rsvp_count < Events.capacity))
+        ).values(rsvp_count=Events.rsvp_count + 1)).rowcount > 0
+
+    def _change_rsvp_count(self, change):
+        # computed by the database, so concurrent RSVPs cannot lose updates
+        db.session.execute(Events.__table__.update().where(
+            Events.id == self.id
+        ).values(rsvp_count=Events.rsvp_count + change))
+
+    @staticmethod
+    def reconcile_rsvp_counts():
+        """Recounts rsvp_count from the rsvps table wherever they differ,
+        and returns how many events were corrected."""
+        actual = db.select([db.func.count()]).where(
+            rsvps.c.event_id == Events.id).as_scalar()
+        corrected = db.session.execute(Events.__table__.update().where(
+            Events.rsvp_count != actual
+        ).values(rsvp_count=actual)).rowcount
         db.session.commit()
-        return False
+        if corrected:
+            listing_cache.invalidate()
+        return corrected
 
     @staticmethod
     def get_all_user(user_id):
         """This method gets all the events for a given user."""
         return Events.query.filter_by(created_by=user_id)
 
+    @staticmethod
+    def get_listing():
+        """This method builds the query used to list events.
+        Each row is (event, creator_name) so a whole page is loaded in a
+        single round trip; category names come from the category cache.
+        """
+        return db.session.query(Events, User.name).outerjoin(
+            User, Events.created_by == User.id
+        ).order_by(Events.id)
+
     @staticmethod
     def get__all_events():
         """This method gets all the events in the db"""
         return Events.query.all()
 
     def delete(self):
-        """This method deletes a given event."""
+        """This method deletes a given event, and its waitlist, which
+        no relationship cascades to."""
+        db.session.execute(waitlist.delete().where(waitlist.c.event_id == self.id))
         db.session.delete(self)
         db.session.commit()
+        search.remove_event(self)
+        listing_cache.invalidate()
 
     def __str__(self):
         return "<Events(title={}, location={}, date={}, time={}, event_category={})>".format(
@@ -209,33 +430,128 @@ class Events(db.Model):
     __repr__ = __str__
 
 
+install_search_trigger(Events.__table__)
+
+
 class BlacklistToken(db.Model):
     """
-    Token Model for storing JWT tokens
+    Token Model for storing the SHA-256 digests of blacklisted JWT tokens
     """
     __tablename__ = 'blacklist_tokens'
 
     id = db.Column(db.Integer, primary_key=True, autoincrement=True, unique=True)
-    token = db.Column(db.String(500), unique=True, nullable=False)
+    token_digest = db.Column(db.String(64), unique=True, nullable=False)
     blacklisted_on = db.Column(db.DateTime, nullable=False)
+    # once the token expires it is rejected anyway and the row can go
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
 
     def __init__(self, token):
-        self.token = token
+        self.token_digest = token_digest(token)
         self.blacklisted_on = datetime.utcnow()
+        self.expires_at = BlacklistToken.token_expiry(token)
+
+    @staticmethod
+    def token_expiry(token):
+        """Reads the exp claim of a token without verifying it,
+        assuming a full TOKEN_LIFETIME if it cannot be read."""
+        try:
+            payload = jwt.decode(
+                token, options={'verify_signature': False, 'verify_exp': False})
+            return datetime.utcfromtimestamp(payload['exp'])
+        except (jwt.InvalidTokenError, KeyError, TypeError, ValueError):
+            return datetime.utcnow() + TOKEN_LIFETIME
 
     def save(self):
         """Save the token to the database."""
         db.session.add(self)
         db.session.commit()
+        blacklist_filter.add(self.token_digest)
+        token_cache.invalidate_digest(self.token_digest)
 
     @staticmethod
     def check_blacklist(token):
-        # check whether auth token has been blacklisted
-        res = BlacklistToken.query.filter_by(token=str(token)).first()
+        # check whether auth token has been blacklisted, only asking
+        # the db when the bloom filter says it might be
+        digest = token_digest(str(token))
+        if not blacklist_filter.might_contain(digest):
+            return False
+        res = BlacklistToken.query.filter_by(token_digest=digest).first()
         if res:
             return True
         else:
             return False
 
+    @staticmethod
+    def purge_expired(batch_size=1000):
+        """Deletes the rows of expired tokens in batches, committing each
+        batch so only a few rows are locked at a time.
+        Returns the number of rows deleted."""
+        now = datetime.utcnow()
+        deleted = 0
+        while True:
+            ids = [row_id for row_id, in db.session.query(BlacklistToken.id).filter(
+                BlacklistToken.expires_at < now).order_by(
+                    BlacklistToken.expires_at).limit(batch_size)]
+            if not ids:
+                return deleted
+            BlacklistToken.query.filter(BlacklistToken.id.in_(ids)).delete(
+                synchronize_session=False)
+            db.session.commit()
+            deleted += len(ids)
+
+    def __repr__(self):
+        return '<id: token: {}'.format(self.token_digest)
+
+
+class OutboxMail(db.Model):
+    """
+    Outbox Model for storing emails until the mail worker sends them
+    """
+    __tablename__ = 'mail_outbox'
+
+    PENDING = 'pending'
+    SENT = 'sent'
+    FAILED = 'failed'
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    recipient = db.Column(db.String(255), nullable=False)
+    subject = db.Column(db.String(255), nullable=False)
+    html = db.Column(db.Text, nullable=False)
+    status = db.Column(db.String(10), nullable=False, default=PENDING)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, nullable=False)
+    next_attempt_at = db.Column(db.DateTime, nullable=False)
+    sent_at = db.Column(db.DateTime)
+
+    __table_args__ = (
+        db.Index('ix_mail_outbox_status_next_attempt_at', 'status', 'next_attempt_at'),
+    )
+
+    def __init__(self, recipient, subject, html):
+        self.recipient = recipient
+        self.subject = subject
+        self.html = html
+        self.status = OutboxMail.PENDING
+        self.attempts = 0
+        self.created_at = datetime.utcnow()
+        self.next_attempt_at = self.created_at
+
+    def save(self):
+        """Save the email to the outbox."""
+        db.session.add(self)
+        db.session.commit()
+
+    @staticmethod
+    def get_due(batch_size):
+        """This method gets the pending emails due for a send attempt,
+        locking them so several workers can drain the outbox at once."""
+        return OutboxMail.query.filter(
+            OutboxMail.status == OutboxMail.PENDING,
+            OutboxMail.next_attempt_at <= datetime.utcnow()
+        ).order_by(OutboxMail.id).limit(batch_size).with_for_update(
+            skip_locked=True).all()
+
     def __repr__(self):
-        return '<id: token: {}'.format(self.token)
+        return '<OutboxMail: (id={}, recipient={}, status={})>'.format(
+            self.id, self.recipient, self.status)
@@ -0,0 +1,153 @@
+"""Per-request SQL instrumentation.
+
+With SQL_PROFILING on, QueryProfiler times every statement the app's
+engine runs during a request. Each response gets a Server-Timing header
+with the query count, the time spent in the database and the whole
+request, and each request logs one line with the same figures. Requests
+slower than SQL_SLOW_REQUEST_MS also log their SQL_PROFILING_TOP slowest
+statements as a warning.
+
+Streamed responses keep querying after their headers are sent, so their
+Server-Timing only counts the queries made until then while the log line
+covers the whole response.
+"""
+
+import heapq
+import json
+import re
+import threading
+import time
+
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import event as sa_event
+
+STATEMENT_LENGTH = 200
+
+
+class RequestProfile(object):
+    """The queries of one request."""
+
+    def __init__(self, top):
+        self.started = time.perf_counter()
+        self.top = top
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.slowest = []
+        self.status = None
+
+    def record(self, statement, seconds):
+        """Adds one statement and how long it took."""
+        self.queries += 1
+        self.db_seconds += seconds
+        entry = (seconds, self.queries, statement)
+        if len(self.slowest) < self.top:
+            heapq.heappush(self.slowest, entry)
+        elif self.top:
+            heapq.heappushpop(self.slowest, entry)
+
+    def slowest_statements(self):
+        """Returns the slowest statements, slowest first."""
+        return [{'ms': round(seconds * 1000, 3),
+                 'statement': re.sub(r'\s+', ' ', statement).strip()[:STATEMENT_LENGTH]}
+                for seconds, _, statement in sorted(self.slowest, reverse=True)]
+
+
+class QueryProfiler(object):
+    """Counts and times the SQL of each request when enabled."""
+
+    def __init__(self, app=None):
+        self.enabled = False
+        self.slow_request_ms = 500
+        self.top = 3
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.slow_requests = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Hooks into the app and its engine if SQL_PROFILING is on."""
+        from app import db
+
+        self.enabled = app.config.get('SQL_PROFILING', False)
+        self.slow_request_ms = app.config.get('SQL_SLOW_REQUEST_MS', 500)
+        self.top = app.config.get('SQL_PROFILING_TOP', 3)
+        self.requests = 0
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.slow_requests = 0
+        app.extensions['query_profiler'] = self
+        if not self.enabled or self._start in app.before_request_funcs.get(None, []):
+            return
+
+        # the engine is looked up once the database url can no longer change
+        app.before_first_request(lambda: self._listen(db.get_engine(app)))
+        app.before_request(self._start)
+        app.after_request(self._add_server_timing)
+        app.teardown_request(self._finish)
+
+    def _listen(self, engine):
+        if not sa_event.contains(engine, 'before_cursor_execute', self._before_cursor_execute):
+            sa_event.listen(engine, 'before_cursor_execute', self._before_cursor_execute)
+            sa_event.listen(engine, 'after_cursor_execute', self._after_cursor_execute)
+
+    @staticmethod
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        # kept on the execution context, which a statement that raises
+        # takes with it; the few run without a context go untimed
+        if context is not None:
+            context._query_started = time.perf_counter()
+
+    @staticmethod
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        started = getattr(context, '_query_started', None)
+        if started is None:
+            return
+        seconds = time.perf_counter() - started
+        if has_request_context() and 'sql_profile' in g:
+            g.sql_profile.record(statement, seconds)
+
+    def _start(self):
+        g.sql_profile = RequestProfile(self.top)
+
+    @staticmethod
+    def _add_server_timing(response):
+        profile = g.get('sql_profile')
+        if profile is not None:
+            profile.status = response.status_code
+            total = time.perf_counter() - profile.started
+            response.headers.add('Server-Timing', 'db;desc="queries={}";dur={:.3f}'.format(
+                profile.queries, profile.db_seconds * 1000))
+            response.headers.add('Server-Timing', 'total;dur={:.3f}'.format(total * 1000))
+        return response
+
+    def _finish(self, exception=None):
+        profile = g.pop('sql_profile', None)
+        if profile is None:
+            return
+        duration_ms = (time.perf_counter() - profile.started) * 1000
+        slow = duration_ms > self.slow_request_ms
+        with self.lock:
+            self.requests += 1
+            self.queries += profile.queries
+            self.db_seconds += profile.db_seconds
+            self.slow_requests += slow
+
+        status = profile.status if profile.status is not None else 500
+        current_app.logger.info(
+            'request: method=%s path=%s status=%d ms=%.3f queries=%d db_ms=%.3f',
+            request.method, request.path, status, duration_ms,
+            profile.queries, profile.db_seconds * 1000)
+        if slow:
+            current_app.logger.warning(
+                'slow request: method=%s path=%s status=%d ms=%.3f queries=%d db_ms=%.3f '
+                'slowest=%s', request.method, request.path, status, duration_ms,
+                profile.queries, profile.db_seconds * 1000,
+                json.dumps(profile.slowest_statements()))
+
+    def stats(self):
+        """Returns the requests profiled by this process and their totals."""
+        return {'requests': self.requests, 'queries': self.queries,
+                'db_seconds': self.db_seconds, 'slow_requests': self.slow_requests}
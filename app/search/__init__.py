@@ -0,0 +1,158 @@
+"""Full text search over event titles, locations and descriptions.
+
+On PostgreSQL eventlists.search_vector is a tsvector kept up to date by a
+trigger and indexed with GIN, so a q= search is an index lookup ranked by
+ts_rank. Other databases (the SQLite test runs) fall back to an in-process
+inverted index that is built on first use and kept in step by
+Events.save and Events.delete.
+"""
+
+import re
+import threading
+
+from sqlalchemy import DDL, case, event, func
+
+# weights mirror the setweight() labels A, B and C used by the trigger
+SEARCH_FIELDS = (('title', 'A', 1.0), ('location', 'B', 0.4), ('description', 'C', 0.2))
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def tokenize(text):
+    """Splits text into lower cased words."""
+    return TOKEN_RE.findall((text or '').lower())
+
+
+def search_vector_expression(row='NEW'):
+    """The tsvector built from the weighted searchable columns of a row."""
+    return ' || '.join(
+        "setweight(to_tsvector('english', coalesce({}.{}, '')), '{}')".format(row, field, label)
+        for field, label, _ in SEARCH_FIELDS)
+
+
+SEARCH_FUNCTION_DDL = """
+CREATE OR REPLACE FUNCTION eventlists_search_vector_update() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector := {};
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql
+""".format(search_vector_expression())
+
+SEARCH_TRIGGER_DDL = """
+CREATE TRIGGER eventlists_search_vector_trigger
+BEFORE INSERT OR UPDATE OF title, location, description ON eventlists
+FOR EACH ROW EXECUTE PROCEDURE eventlists_search_vector_update()
+"""
+
+
+def install_search_trigger(table):
+    """Creates the search_vector trigger whenever the table is created
+    with create_all(), matching what the migration does."""
+    for statement in (SEARCH_FUNCTION_DDL, SEARCH_TRIGGER_DDL):
+        event.listen(table, 'after_create', DDL(statement).execute_if(dialect='postgresql'))
+
+
+class InvertedIndex(object):
+    """Maps each word to the events containing it and the weight it has there."""
+
+    def __init__(self):
+        self.postings = {}
+        self.documents = {}
+        self.loaded = False
+        self.lock = threading.Lock()
+
+    def add(self, event_id, fields):
+        """Indexes (or re-indexes) an event from a dict of its searchable fields."""
+        with self.lock:
+            self._remove(event_id)
+            weights = {}
+            for field, _, weight in SEARCH_FIELDS:
+                for term in tokenize(fields.get(field)):
+                    weights[term] = weights.get(term, 0) + weight
+            for term, weight in weights.items():
+                self.postings.setdefault(term, {})[event_id] = weight
+            self.documents[event_id] = set(weights)
+
+    def remove(self, event_id):
+        """Drops an event from the index."""
+        with self.lock:
+            self._remove(event_id)
+
+    def _remove(self, event_id):
+        for term in self.documents.pop(event_id, ()):
+            postings = self.postings.get(term)
+            postings.pop(event_id, None)
+            if not postings:
+                del self.postings[term]
+
+    def search(self, text):
+        """Returns the ids of events containing every word of text,
+        best match first."""
+        terms = set(tokenize(text))
+        if not terms:
+            return []
+        with self.lock:
+            matches = [self.postings.get(term, {}) for term in terms]
+            ids = set.intersection(*(set(postings) for postings in matches))
+            scores = {
+                event_id: sum(postings[event_id] for postings in matches)
+                for event_id in ids
+            }
+        return sorted(scores, key=lambda event_id: (-scores[event_id], event_id))
+
+
+class EventSearch(object):
+    """Searches events with the best backend the database supports."""
+
+    def __init__(self, app=None):
+        self.index = InvertedIndex()
+        self.db = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Starts the app with an empty fallback index."""
+        from app import db
+        self.db = db
+        self.index = InvertedIndex()
+        app.extensions['event_search'] = self
+
+    def uses_database(self):
+        """True when the database maintains the search index itself."""
+        return self.db.engine.dialect.name == 'postgresql'
+
+    def index_event(self, evt):
+        """Keeps the fallback index in step with a saved event."""
+        if self.index.loaded and not self.uses_database():
+            self.index.add(evt.id, {field: getattr(evt, field) for field, _, _ in SEARCH_FIELDS})
+
+    def remove_event(self, evt):
+        """Keeps the fallback index in step with a deleted event."""
+        if self.index.loaded and not self.uses_database():
+            self.index.remove(evt.id)
+
+    def _load_index(self):
+        from app.models import Events
+        columns = [getattr(Events, field) for field, _, _ in SEARCH_FIELDS]
+        for row in self.db.session.query(Events.id, *columns):
+            self.index.add(row[0], dict(zip((field for field, _, _ in SEARCH_FIELDS), row[1:])))
+        self.index.loaded = True
+
+    def filter(self, query, text):
+        """Restricts an events query to matches for text, best match first."""
+        from app.models import Events
+
+        if self.uses_database():
+            tsquery = func.plainto_tsquery('english', text)
+            rank = func.ts_rank(Events.search_vector, tsquery)
+            return query.filter(Events.search_vector.op('@@')(tsquery)).order_by(
+                None).order_by(rank.desc(), Events.id)
+
+        if not self.index.loaded:
+            self._load_index()
+        ids = self.index.search(text)
+        if not ids:
+            return query.filter(Events.id.in_([]))
+        ranking = case({event_id: position for position, event_id in enumerate(ids)},
+                       value=Events.id)
+        return query.filter(Events.id.in_(ids)).order_by(None).order_by(ranking)
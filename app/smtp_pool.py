@@ -0,0 +1,174 @@
+"""Pool of authenticated SMTP connections.
+
+Opening a connection to MAIL_SERVER costs a TCP connect, a STARTTLS
+negotiation and a login. The pool keeps up to MAIL_POOL_SIZE Flask-Mail
+connections open and reuses them, for inline sends and the outbox worker
+alike. A connection idle for MAIL_POOL_CHECK_AFTER seconds is checked with
+NOOP before reuse. One idle longer than MAIL_POOL_MAX_IDLE, which servers
+drop anyway, is reopened. A connection that fails while in use is thrown
+away rather than returned.
+"""
+
+import os
+import smtplib
+import threading
+import time
+from contextlib import contextmanager
+
+# errors about one message, after which the connection is still good
+MESSAGE_ERRORS = (smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused,
+                  smtplib.SMTPDataError)
+# any other SMTP or socket error means the connection cannot be trusted
+CONNECTION_ERRORS = (OSError,)
+
+
+def is_connection_error(error):
+    """True when error leaves the SMTP connection unusable."""
+    return isinstance(error, CONNECTION_ERRORS) and not isinstance(error, MESSAGE_ERRORS)
+
+
+def send_timed(connection, message):
+    """Sends a message on a connection, recording how long it took in
+    the mail_send_seconds metric."""
+    from app import metrics
+
+    started = time.perf_counter()
+    outcome = 'failed'
+    try:
+        connection.send(message)
+        outcome = 'sent'
+    finally:
+        metrics.observe('mail_send_seconds', time.perf_counter() - started, outcome=outcome)
+
+
+class PoolTimeout(Exception):
+    """Raised when no SMTP connection frees up in time."""
+
+
+class SMTPConnectionPool(object):
+    """Hands out open Flask-Mail connections and takes them back."""
+
+    def __init__(self, app=None):
+        self.size = 4
+        self.check_after = 30
+        self.max_idle = 300
+        self.timeout = 10
+        self.idle = []
+        self.pid = os.getpid()
+        self.condition = threading.Condition()
+        self.in_use = 0
+        self.opened = 0
+        self.reused = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Reads the pool settings and drops any open connection."""
+        self.close_all()
+        self.size = app.config.get('MAIL_POOL_SIZE', 4)
+        self.check_after = app.config.get('MAIL_POOL_CHECK_AFTER', 30)
+        self.max_idle = app.config.get('MAIL_POOL_MAX_IDLE', 300)
+        self.timeout = app.config.get('MAIL_POOL_TIMEOUT', 10)
+        self.opened = 0
+        self.reused = 0
+        app.extensions['mail_pool'] = self
+
+    def _fork_check(self):
+        # sockets inherited from a parent process are not ours to use or close
+        if self.pid != os.getpid():
+            self.idle = []
+            self.in_use = 0
+            self.pid = os.getpid()
+
+    @staticmethod
+    def _close(connection):
+        try:
+            connection.__exit__(None, None, None)
+        except Exception:
+            pass
+
+    def _usable(self, connection, last_used):
+        idle_for = time.time() - last_used
+        if idle_for > self.max_idle:
+            return False
+        if idle_for < self.check_after or connection.host is None:
+            return True
+        try:
+            return connection.host.noop()[0] == 250
+        except CONNECTION_ERRORS:
+            return False
+
+    def _checkout(self):
+        from app import mail
+
+        deadline = time.time() + self.timeout
+        with self.condition:
+            self._fork_check()
+            while not self.idle and self.in_use >= self.size:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    raise PoolTimeout('No SMTP connection became free in time')
+                self.condition.wait(remaining)
+            self.in_use += 1
+            idle = self.idle.pop() if self.idle else None
+
+        try:
+            if idle is not None:
+                connection, last_used = idle
+                if self._usable(connection, last_used):
+                    self.reused += 1
+                    return connection
+                self._close(connection)
+            connection = mail.connect()
+            connection.__enter__()
+            self.opened += 1
+            return connection
+        except Exception:
+            self._release(None)
+            raise
+
+    def _release(self, connection):
+        with self.condition:
+            self.in_use -= 1
+            if connection is not None:
+                self.idle.append((connection, time.time()))
+            self.condition.notify()
+
+    @contextmanager
+    def connection(self):
+        """Lends out an open connection for the duration of the block."""
+        connection = self._checkout()
+        try:
+            yield connection
+        except Exception as error:
+            if is_connection_error(error):
+                self._close(connection)
+                self._release(None)
+            else:
+                self._release(connection)
+            raise
+        else:
+            self._release(connection)
+
+    def send(self, message):
+        """Sends a message on a pooled connection, retrying once on a
+        fresh connection if the server had dropped the pooled one."""
+        try:
+            with self.connection() as connection:
+                send_timed(connection, message)
+        except smtplib.SMTPServerDisconnected:
+            with self.connection() as connection:
+                send_timed(connection, message)
+
+    def close_all(self):
+        """Closes every idle connection."""
+        with self.condition:
+            self._fork_check()
+            idle, self.idle = self.idle, []
+        for connection, _ in idle:
+            self._close(connection)
+
+    def stats(self):
+        """Returns how many connections were opened and reused."""
+        return {'opened': self.opened, 'reused': self.reused,
+                'idle': len(self.idle), 'in_use': self.in_use}
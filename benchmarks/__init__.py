@@ -0,0 +1,17 @@
+"""Benchmarks for the Bright Events API.
+
+Each bench_* module runs on its own with `python -m benchmarks.<module>`,
+and `python manage.py bench` runs them all after the load test in
+benchmarks.load, writing every result to one JSON file.
+"""
+
+from app import create_app
+
+
+def bench_app(database=None):
+    """Returns a testing app, on the database url given or TEST_DB_URL.
+    The benchmarks drop and recreate every table of that database."""
+    app = create_app(config_name='testing')
+    if database:
+        app.config['SQLALCHEMY_DATABASE_URI'] = database
+    return app
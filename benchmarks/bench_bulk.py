@@ -0,0 +1,74 @@
+"""Measures creating events one request at a time against in bulk.
+
+Usage: python -m benchmarks.bench_bulk [events]
+
+Runs against the database in TEST_DB_URL, which it drops and recreates.
+The same number of events is created with one POST /api/events per
+event, then with a single POST /api/events/bulk.
+"""
+
+import json
+import sys
+import time
+
+from app import db
+from app.models import EventCategory, User
+from benchmarks import bench_app
+
+
+def event_data(prefix, number):
+    """Returns the fields of the number'th benchmark event."""
+    return {
+        'title': '{} {}'.format(prefix, number), 'location': 'Nairobi', 'time': '10:00AM',
+        'date': '6th JAN 2017', 'description': 'Benchmark event',
+        'image_url': 'https://www.google.com', 'event_category': 1,
+    }
+
+
+def run(count=200, database=None):
+    """Returns the time taken to create count events both ways."""
+    app = bench_app(database)
+    client = app.test_client()
+    with app.app_context():
+        db.session.close()
+        db.drop_all()
+        db.create_all()
+        db.session.add_all([
+            User('bench user', 'bench@test.com', 'bench1234', True),
+            EventCategory(category_name='Benchmarks'),
+        ])
+        db.session.commit()
+
+    res = client.post('/api/auth/login', data={'email': 'bench@test.com',
+                                               'password': 'bench1234'})
+    headers = dict(Authorization='Bearer ' + json.loads(res.data.decode())['access_token'])
+
+    started = time.perf_counter()
+    for number in range(count):
+        client.post('/api/events', headers=headers, data=event_data('single', number))
+    one_by_one = time.perf_counter() - started
+
+    started = time.perf_counter()
+    res = client.post('/api/events/bulk', headers=headers, content_type='application/json',
+                      data=json.dumps([event_data('bulk', number) for number in range(count)]))
+    bulk = time.perf_counter() - started
+    assert res.status_code == 201, res.data
+
+    with app.app_context():
+        db.session.remove()
+        db.drop_all()
+    return {'events': count, 'one_by_one_ms': one_by_one * 1000, 'bulk_ms': bulk * 1000}
+
+
+def main(count=200):
+    """Prints the time taken to create count events both ways."""
+    result = run(count)
+    print('{} events'.format(count))
+    print('one request per event: {:.1f} ms ({:.3f} ms/event)'.format(
+        result['one_by_one_ms'], result['one_by_one_ms'] / count))
+    print('one bulk request:      {:.1f} ms ({:.3f} ms/event)'.format(
+        result['bulk_ms'], result['bulk_ms'] / count))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
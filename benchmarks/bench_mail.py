@@ -0,0 +1,70 @@
+"""Measures the cost of an SMTP connection per email against the pool.
+
+Usage: python -m benchmarks.bench_mail [emails]
+
+Delivers to a local SMTPSink, so the numbers leave out the network round
+trips and TLS handshake a real MAIL_SERVER adds to every new connection.
+"""
+
+import sys
+import time
+
+from app import mail, mail_pool
+from app.emails import build_message
+from app.emails.sink import SMTPSink
+from benchmarks import bench_app
+
+
+def time_sends(send, app, count):
+    """Returns the mean time in ms of count calls to send(message)."""
+    with app.app_context():
+        started = time.perf_counter()
+        for number in range(count):
+            send(build_message('user{}@example.com'.format(number), 'Bench', '<p>Hi</p>'))
+    return (time.perf_counter() - started) * 1000 / count
+
+
+def send_on_new_connection(message):
+    """Sends the way Flask-Mail's mail.send does, one connection each."""
+    with mail.connect() as connection:
+        connection.send(message)
+
+
+def run(count=200):
+    """Returns the send cost per email without and with the pool."""
+    sink = SMTPSink().start()
+    app = bench_app()
+    app.config.update(MAIL_SERVER=sink.host, MAIL_PORT=sink.port, MAIL_USE_TLS=False,
+                      MAIL_USE_SSL=False, MAIL_SUPPRESS_SEND=False, MAIL_DEBUG=False,
+                      MAIL_USERNAME='bench@example.com', MAIL_PASSWORD='bench')
+    mail.init_app(app)
+    mail_pool.init_app(app)
+
+    unpooled = time_sends(send_on_new_connection, app, count)
+    connections = sink.connections
+    pooled = time_sends(mail_pool.send, app, count)
+    result = {
+        'emails': count,
+        'unpooled_ms': unpooled, 'unpooled_connections': connections,
+        'pooled_ms': pooled, 'pooled_connections': sink.connections - connections,
+        'pool_stats': mail_pool.stats(),
+    }
+
+    mail_pool.close_all()
+    sink.stop()
+    return result
+
+
+def main(count=200):
+    """Prints the send cost per email without and with the pool."""
+    result = run(count)
+    print('{} emails to a local SMTP sink'.format(count))
+    print('connection per email: {:.3f} ms/email, {} connections'.format(
+        result['unpooled_ms'], result['unpooled_connections']))
+    print('pooled connections:   {:.3f} ms/email, {} connections'.format(
+        result['pooled_ms'], result['pooled_connections']))
+    print('pool stats: {}'.format(result['pool_stats']))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,296 @@
+"""Load test of the busiest API endpoints.
+
+Usage: python manage.py bench [options]
+       python -m benchmarks.load [events] [requests]
+
+Seeds the database (TEST_DB_URL or --database, which is dropped and
+recreated) with users, categories, events and rsvps, then sends each
+scenario's requests from a number of threads through the app's test
+client and reports throughput and p50/p95/p99 latency. The events, users
+and filters requested are drawn from random generators seeded with
+--seed, so runs against the same dataset send the same requests.
+
+Results are written as JSON, and compared with an earlier results file
+given as --baseline.
+"""
+
+import json
+import math
+import os
+import platform
+import random
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime
+
+from app import db, password_hasher, listing_cache, category_cache, token_cache
+from app.models import User, Events, EventCategory, rsvps
+from benchmarks import bench_app
+
+PASSWORD = 'bench1234'
+LOCATIONS = ('Nairobi', 'Mombasa', 'Kisumu', 'Nakuru', 'Eldoret', 'Malindi')
+PAGE_LIMIT = 10
+
+
+def user_email(number):
+    """Returns the email of the number'th seeded user."""
+    return 'u{}@bench.io'.format(number)
+
+
+def seed(app, users, categories, events, rsvp_count, rng):
+    """Recreates the tables and fills them with the dataset."""
+    with app.app_context():
+        db.session.close()
+        db.drop_all()
+        db.create_all()
+
+        # every user shares one hash, bcrypt would otherwise dominate seeding
+        password = password_hasher.hash_password(PASSWORD)
+        db.session.execute(User.__table__.insert(), [
+            {'name': 'user {}'.format(number), 'email': user_email(number),
+             'password': password, 'email_confirmed': True}
+            for number in range(users)
+        ])
+        db.session.execute(EventCategory.__table__.insert(), [
+            {'category_name': 'Category {}'.format(number)} for number in range(categories)
+        ])
+        db.session.commit()
+        category_cache.invalidate()
+
+        by_creator = {}
+        for number in range(events):
+            by_creator.setdefault(rng.randint(1, users), []).append({
+                'title': 'Event {}'.format(number),
+                'location': rng.choice(LOCATIONS),
+                'time': '{}:00AM'.format(rng.randint(1, 11)),
+                'date': '{} {} 2026'.format(rng.randint(1, 28), rng.choice(('Jan', 'Apr', 'Sep'))),
+                'description': 'Benchmark event {}'.format(number),
+                'image_url': '',
+                'event_category': rng.randint(1, categories),
+                'capacity': None,
+            })
+        for creator, rows in sorted(by_creator.items()):
+            Events.create_many(rows, created_by=creator)
+
+        pairs = set()
+        rsvp_count = min(rsvp_count, users * events)
+        while len(pairs) < rsvp_count:
+            pairs.add((rng.randint(1, users), rng.randint(1, events)))
+        if pairs:
+            db.session.execute(rsvps.insert(), [
+                {'user_id': user_id, 'event_id': event_id} for user_id, event_id in sorted(pairs)
+            ])
+            db.session.commit()
+        Events.reconcile_rsvp_counts()
+
+
+def scenarios(app, users, categories, events):
+    """Returns the scenarios as name: function(client, rng) -> response."""
+    with app.app_context():
+        # decoded tokens are cached, so a few hundred users are enough
+        tokens = {
+            user_id: 'Bearer ' + User.generate_token(user_id).decode()
+            for user_id in range(1, min(users, 200) + 1)
+        }
+    pages = max(events // PAGE_LIMIT, 1)
+
+    def events_listing(client, rng):
+        return client.get('/api/events/all?page={}&limit={}'.format(
+            rng.randint(1, pages), PAGE_LIMIT))
+
+    def events_filtered(client, rng):
+        return client.get('/api/events/all?event_category={}&location={}'.format(
+            rng.randint(1, categories), rng.choice(LOCATIONS)))
+
+    def event_detail(client, rng):
+        return client.get('/api/events/all/{}'.format(rng.randint(1, events)))
+
+    def login(client, rng):
+        return client.post('/api/auth/login', data={
+            'email': user_email(rng.randrange(users)), 'password': PASSWORD})
+
+    def rsvp(client, rng):
+        return client.post('/api/events/{}/rsvp'.format(rng.randint(1, events)),
+                           headers={'Authorization': tokens[rng.randint(1, len(tokens))]})
+
+    return {
+        'events_listing': events_listing,
+        'events_filtered': events_filtered,
+        'event_detail': event_detail,
+        'login': login,
+        'rsvp': rsvp,
+    }
+
+
+def percentile(ordered, share):
+    """Returns the nearest-rank percentile of sorted values."""
+    if not ordered:
+        return None
+    return ordered[max(math.ceil(share / 100 * len(ordered)) - 1, 0)]
+
+
+def summarize(latencies, errors, seconds):
+    """Returns throughput and latency figures of a scenario run."""
+    ordered = sorted(latencies)
+    milliseconds = [latency * 1000 for latency in ordered]
+    return {
+        'requests': len(ordered),
+        'errors': errors,
+        'seconds': seconds,
+        'throughput_rps': len(ordered) / seconds if seconds else None,
+        'mean_ms': sum(milliseconds) / len(milliseconds) if milliseconds else None,
+        'p50_ms': percentile(milliseconds, 50),
+        'p95_ms': percentile(milliseconds, 95),
+        'p99_ms': percentile(milliseconds, 99),
+        'max_ms': milliseconds[-1] if milliseconds else None,
+    }
+
+
+def run_scenario(app, name, send, requests, concurrency, warmup, seed_value):
+    """Sends requests (after warmup unrecorded ones) from concurrency
+    threads, and returns the summary of the recorded ones. A response
+    with a 4xx or 5xx status counts as an error."""
+    latencies, errors = [], []
+    lock = threading.Lock()
+
+    def worker(index, count):
+        client = app.test_client()
+        rng = random.Random('{}-{}-{}'.format(seed_value, name, index))
+        for _ in range(warmup):
+            send(client, rng)
+        ready.wait()
+        mine, failed = [], 0
+        for _ in range(count):
+            started = time.perf_counter()
+            res = send(client, rng)
+            mine.append(time.perf_counter() - started)
+            failed += res.status_code >= 400
+        with lock:
+            latencies.extend(mine)
+            errors.append(failed)
+
+    ready = threading.Barrier(concurrency + 1)
+    threads = [
+        threading.Thread(target=worker, args=(index, requests // concurrency
+                                              + (index < requests % concurrency)))
+        for index in range(concurrency)
+    ]
+    for thread in threads:
+        thread.start()
+    ready.wait()
+    started = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    return summarize(latencies, sum(errors), time.perf_counter() - started)
+
+
+def current_commit():
+    """Returns the git commit being measured, if known."""
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', 'HEAD'], stderr=subprocess.DEVNULL,
+            cwd=os.path.dirname(os.path.abspath(__file__))).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(users=200, categories=10, events=2000, rsvp_count=5000, requests=500,
+        concurrency=1, warmup=20, seed_value=1, database=None, only=None):
+    """Seeds the dataset, runs the scenarios (all, or those named in
+    only) and returns the results."""
+    app = bench_app(database)
+    rng = random.Random(seed_value)
+
+    started = time.perf_counter()
+    seed(app, users, categories, events, rsvp_count, rng)
+    seed_seconds = time.perf_counter() - started
+
+    results = {}
+    for name, send in scenarios(app, users, categories, events).items():
+        if only and name not in only:
+            continue
+        results[name] = run_scenario(app, name, send, requests, concurrency, warmup, seed_value)
+
+    with app.app_context():
+        dialect = db.engine.dialect.name
+        db.session.remove()
+        db.drop_all()
+    return {
+        'created_at': datetime.utcnow().isoformat(),
+        'commit': current_commit(),
+        'python': platform.python_version(),
+        'database': dialect,
+        'settings': {
+            'users': users, 'categories': categories, 'events': events, 'rsvps': rsvp_count,
+            'requests': requests, 'concurrency': concurrency, 'warmup': warmup,
+            'seed': seed_value, 'bcrypt_log_rounds': app.config.get('BCRYPT_LOG_ROUNDS'),
+            'cache_backend': app.config.get('CACHE_BACKEND'),
+        },
+        'seed_seconds': seed_seconds,
+        'scenarios': results,
+        'caches': {'listing': listing_cache.stats(), 'category': category_cache.stats(),
+                   'token': token_cache.stats()},
+    }
+
+
+def compare(results, baseline):
+    """Returns lines comparing the throughput and p95 of each scenario
+    with a baseline results dict."""
+    lines = []
+    for name, current in sorted(results['scenarios'].items()):
+        before = baseline.get('scenarios', {}).get(name)
+        if not before:
+            lines.append('{}: not in the baseline'.format(name))
+            continue
+        lines.append('{}: {:.1f} -> {:.1f} req/s ({}), p95 {:.2f} -> {:.2f} ms ({})'.format(
+            name, before['throughput_rps'], current['throughput_rps'],
+            change(before['throughput_rps'], current['throughput_rps']),
+            before['p95_ms'], current['p95_ms'], change(before['p95_ms'], current['p95_ms'])))
+    return lines
+
+
+def change(before, after):
+    """Formats the relative change from before to after."""
+    if not before:
+        return 'n/a'
+    return '{:+.1f}%'.format((after - before) * 100 / before)
+
+
+def report(results):
+    """Returns the results as lines of text."""
+    lines = ['{} database, {} events, {} requests per scenario from {} threads'.format(
+        results['database'], results['settings']['events'],
+        results['settings']['requests'], results['settings']['concurrency'])]
+    for name, summary in results['scenarios'].items():
+        lines.append(
+            '{:<16} {:>8.1f} req/s  p50 {:>7.2f} ms  p95 {:>7.2f} ms  p99 {:>7.2f} ms  '
+            'errors {}'.format(name, summary['throughput_rps'], summary['p50_ms'],
+                               summary['p95_ms'], summary['p99_ms'], summary['errors']))
+    return lines
+
+
+def write_results(results, output=None):
+    """Writes the results to output, by default a timestamped file in
+    benchmarks/results, and returns the path."""
+    if output is None:
+        output = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results',
+                              'bench-{}.json'.format(datetime.utcnow().strftime('%Y%m%dT%H%M%S')))
+    directory = os.path.dirname(output)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(output, 'w') as results_file:
+        json.dump(results, results_file, indent=2, sort_keys=True)
+    return output
+
+
+def main(events=2000, requests=500):
+    """Prints the load test results and writes them to benchmarks/results."""
+    results = run(events=events, requests=requests)
+    print('\n'.join(report(results)))
+    print('Results written to {}'.format(write_results(results)))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,21 @@
+"""gunicorn settings, read by `gunicorn -c gunicorn.conf.py manage:app`.
+
+The number of worker processes comes from WEB_CONCURRENCY, which gunicorn
+reads on its own and the app reads to size its per-process pools.
+"""
+
+import glob
+import os
+
+# a login waits on the bcrypt pool while the worker's other threads serve
+threads = 4
+
+
+def on_starting(server):
+    """Removes the metrics snapshots of processes of an earlier run, whose
+    counters /metrics would otherwise keep adding up."""
+    directory = os.getenv('METRICS_DIR')
+    if not directory:
+        return
+    for path in glob.glob(os.path.join(directory, '*.json*')):
+        os.remove(path)
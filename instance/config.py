@@ -14,6 +14,68 @@ class Config(object):
     MAIL_USERNAME = "mellowtonny@gmail.com"
     MAIL_PASSWORD = "cibvos-8sezje-cocVud"
     MAIL_SUPPRESS_SEND = False
+    # emails go through the mail_outbox table, sent by `python manage.py mail_worker`
+    MAIL_QUEUE_ENABLED = True
+    MAIL_OUTBOX_BATCH_SIZE = 50
+    MAIL_OUTBOX_MAX_ATTEMPTS = 5
+    MAIL_OUTBOX_RETRY_DELAY = 30
+    MAIL_WORKER_POLL_INTERVAL = 2
+    # authenticated SMTP connections kept open per process
+    MAIL_POOL_SIZE = 4
+    MAIL_POOL_CHECK_AFTER = 30
+    MAIL_POOL_MAX_IDLE = 300
+    MAIL_POOL_TIMEOUT = 10
+    EMAIL_TEMPLATE_CACHE_SIZE = 256
+    DEFAULT_PAGE_LIMIT = 10
+    MAX_PAGE_LIMIT = 100
+    EXPORT_BATCH_SIZE = 1000
+    BULK_EVENTS_LIMIT = 500
+    # processes serving requests, the worker count gunicorn reads; each has
+    # its own "simple" cache, which the others' writes do not reach
+    WEB_CONCURRENCY = int(os.getenv('WEB_CONCURRENCY', 1))
+    # "simple" caches in-process, "redis" shares entries through CACHE_REDIS_URL,
+    # the default when there is one and several processes serve requests
+    CACHE_REDIS_URL = os.getenv('CACHE_REDIS_URL')
+    CACHE_BACKEND = os.getenv('CACHE_BACKEND',
+                              'redis' if CACHE_REDIS_URL and WEB_CONCURRENCY > 1 else 'simple')
+    CATEGORY_CACHE_TIMEOUT = 300
+    # pages of /api/events/all, dropped whenever an event or category changes;
+    # on a "simple" backend only the process making the change drops them,
+    # and the others serve their pages for up to this many seconds more;
+    # RSVPs drop no pages, so listed rsvp_counts lag by up to as long
+    LISTING_CACHE_TIMEOUT = 60
+    LISTING_CACHE_LOCK_TIMEOUT = 5
+    # verified tokens kept per process, and for at most this many seconds;
+    # a cached token is still checked against the blacklist filter
+    TOKEN_CACHE_SIZE = 1024
+    TOKEN_CACHE_TIMEOUT = 30
+    # bloom filter in front of blacklist_tokens, re-synced as soon as another
+    # process blacklists a token when CACHE_BACKEND is shared; with several
+    # processes and no shared backend every check goes to the db
+    BLACKLIST_FILTER_CAPACITY = 100000
+    BLACKLIST_FILTER_ERROR_RATE = 0.001
+    BLACKLIST_FILTER_REFRESH = 5
+    BLACKLIST_FILTER_OVERLAP = 50
+    # seconds between purges of expired blacklisted tokens, 0 leaves it to
+    # `python manage.py purge_tokens`
+    BLACKLIST_PURGE_INTERVAL = int(os.getenv('BLACKLIST_PURGE_INTERVAL', 0))
+    BLACKLIST_PURGE_BATCH_SIZE = 1000
+    # bcrypt runs in a pool of processes per web process, by default the
+    # cpus shared out between them; callers beyond the queue get a 503
+    BCRYPT_LOG_ROUNDS = 12
+    BCRYPT_POOL_SIZE = int(os.getenv('BCRYPT_POOL_SIZE',
+                                     max((os.cpu_count() or 1) // WEB_CONCURRENCY, 1)))
+    BCRYPT_QUEUE_SIZE = 0
+    BCRYPT_QUEUE_TIMEOUT = 0
+    # time each request's SQL, reported in Server-Timing and the log
+    SQL_PROFILING = os.getenv('SQL_PROFILING', '').lower() in ('1', 'true', 'yes')
+    SQL_SLOW_REQUEST_MS = int(os.getenv('SQL_SLOW_REQUEST_MS', 500))
+    SQL_PROFILING_TOP = 3
+    # /metrics; under gunicorn each worker writes its metrics to METRICS_DIR,
+    # which every worker needs for /metrics to add them all up
+    METRICS_ENABLED = True
+    METRICS_DIR = os.getenv('METRICS_DIR')
+    METRICS_FLUSH_INTERVAL = 1
 
 
 class DevelopmentConfig(Config):
@@ -28,6 +90,8 @@ class TestingConfig(Config):
     SQLALCHEMY_DATABASE_URI = os.getenv('TEST_DB_URL')
     DEBUG = True
     MAIL_SUPPRESS_SEND = True
+    BCRYPT_LOG_ROUNDS = 4
+    BCRYPT_POOL_SIZE = 0
 
 
 class StagingConfig(Config):
@@ -3,7 +3,7 @@ import unittest
 # class for handling a set of commands
 from flask_script import Manager
 from flask_migrate import Migrate, MigrateCommand
-from app import db, create_app
+from app import db, create_app, token_purger
 
 # initialize the app with all its configurations
 app = create_app("development")
@@ -29,5 +29,72 @@ def test():
     return 1
 
 
+# define our command for pruning the token blacklist called "purge_tokens"
+# Usage: python manage.py purge_tokens
+@manager.command
+def purge_tokens():
+    """Deletes blacklisted tokens that have expired."""
+    pruned = token_purger.run_once()
+    print('Pruned {} expired blacklisted tokens'.format(pruned))
+
+
+# define our command for recounting event rsvps called "reconcile_rsvps"
+# Usage: python manage.py reconcile_rsvps
+@manager.command
+def reconcile_rsvps():
+    """Corrects rsvp_count on events whose count has drifted."""
+    from app.models import Events
+    corrected = Events.reconcile_rsvp_counts()
+    print('Corrected the rsvp count of {} events'.format(corrected))
+
+
+# define our command for sending queued emails called "mail_worker"
+# Usage: python manage.py mail_worker
+@manager.command
+def mail_worker():
+    """Sends the emails queued in the outbox until stopped."""
+    from app.emails.outbox import run_worker
+    run_worker()
+
+
+# define our command for benchmarking the api called "bench"
+# Usage: python manage.py bench --events 5000 --concurrency 4
+@manager.option('--users', dest='users', type=int, default=200)
+@manager.option('--categories', dest='categories', type=int, default=10)
+@manager.option('--events', dest='events', type=int, default=2000)
+@manager.option('--rsvps', dest='rsvps', type=int, default=5000)
+@manager.option('--requests', dest='requests', type=int, default=500)
+@manager.option('--concurrency', dest='concurrency', type=int, default=1)
+@manager.option('--seed', dest='seed', type=int, default=1)
+@manager.option('--scenario', dest='scenarios', action='append',
+                help='run only this scenario, may be repeated')
+@manager.option('--database', dest='database', help='database url, TEST_DB_URL by default')
+@manager.option('--output', dest='output', help='results file, benchmarks/results by default')
+@manager.option('--baseline', dest='baseline', help='earlier results file to compare with')
+@manager.option('--skip-micro', dest='skip_micro', action='store_true',
+                help='skip the auth, mail and bulk benchmarks')
+def bench(users, categories, events, rsvps, requests, concurrency, seed, scenarios,
+          database, output, baseline, skip_micro):
+    """Load tests the API on a seeded database and writes JSON results."""
+    import json
+    from benchmarks import bench_auth, bench_bulk, bench_mail, load
+
+    micro = {}
+    if not skip_micro:
+        micro['auth'] = bench_auth.run(database=database)
+        micro['mail'] = bench_mail.run()
+        micro['bulk'] = bench_bulk.run(database=database)
+
+    results = load.run(users=users, categories=categories, events=events, rsvp_count=rsvps,
+                       requests=requests, concurrency=concurrency, seed_value=seed,
+                       database=database, only=scenarios)
+    results['benchmarks'] = micro
+    print('\n'.join(load.report(results)))
+    if baseline:
+        with open(baseline) as baseline_file:
+            print('\n'.join(load.compare(results, json.load(baseline_file))))
+    print('Results written to {}'.format(load.write_results(results, output)))
+
+
 if __name__ == '__main__':
     manager.run()
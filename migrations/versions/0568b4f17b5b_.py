@@ -0,0 +1,38 @@
+"""rsvp count on eventlists
+
+Revision ID: 0568b4f17b5b
+Revises: 90c4fc5046fa
+Create Date: 2026-10-18 12:31:09.845120
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0568b4f17b5b'
+down_revision = '90c4fc5046fa'
+branch_labels = None
+depends_on = None
+
+eventlists = sa.table(
+    'eventlists',
+    sa.column('id', sa.Integer),
+    sa.column('rsvp_count', sa.Integer),
+)
+rsvps = sa.table(
+    'rsvps',
+    sa.column('event_id', sa.Integer),
+)
+
+
+def upgrade():
+    op.add_column('eventlists', sa.Column('rsvp_count', sa.Integer(), server_default='0',
+                                          nullable=False))
+    op.execute(eventlists.update().values(rsvp_count=sa.select([sa.func.count()]).where(
+        rsvps.c.event_id == eventlists.c.id).as_scalar()))
+
+
+def downgrade():
+    with op.batch_alter_table('eventlists') as batch_op:
+        batch_op.drop_column('rsvp_count')
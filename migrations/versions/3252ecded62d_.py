@@ -0,0 +1,66 @@
+"""store token digests in blacklist_tokens
+
+Revision ID: 3252ecded62d
+Revises: 43eef4776b81
+Create Date: 2026-10-18 10:02:47.518903
+
+"""
+import hashlib
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3252ecded62d'
+down_revision = '43eef4776b81'
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 1000
+
+blacklist_tokens = sa.table(
+    'blacklist_tokens',
+    sa.column('id', sa.Integer),
+    sa.column('token', sa.String),
+    sa.column('token_digest', sa.String),
+)
+
+
+def upgrade():
+    op.add_column('blacklist_tokens', sa.Column('token_digest', sa.String(length=64), nullable=True))
+
+    # backfill in batches so a large table is never held in memory
+    connection = op.get_bind()
+    last_id = 0
+    while True:
+        rows = connection.execute(
+            sa.select([blacklist_tokens.c.id, blacklist_tokens.c.token])
+            .where(blacklist_tokens.c.id > last_id)
+            .order_by(blacklist_tokens.c.id)
+            .limit(BATCH_SIZE)
+        ).fetchall()
+        if not rows:
+            break
+        for row_id, token in rows:
+            connection.execute(
+                blacklist_tokens.update()
+                .where(blacklist_tokens.c.id == row_id)
+                .values(token_digest=hashlib.sha256(token.encode()).hexdigest())
+            )
+        last_id = rows[-1][0]
+
+    with op.batch_alter_table('blacklist_tokens') as batch_op:
+        batch_op.alter_column('token_digest', existing_type=sa.String(length=64), nullable=False)
+        batch_op.create_unique_constraint('blacklist_tokens_token_digest_key', ['token_digest'])
+        batch_op.drop_column('token')
+
+
+def downgrade():
+    # the raw tokens cannot be recovered, keep the digests in their place
+    op.add_column('blacklist_tokens', sa.Column('token', sa.String(length=500), nullable=True))
+    op.execute(blacklist_tokens.update().values(token=blacklist_tokens.c.token_digest))
+    with op.batch_alter_table('blacklist_tokens') as batch_op:
+        batch_op.alter_column('token', existing_type=sa.String(length=500), nullable=False)
+        batch_op.create_unique_constraint('blacklist_tokens_token_key', ['token'])
+        batch_op.drop_column('token_digest')
@@ -0,0 +1,59 @@
+"""full text search on eventlists
+
+Revision ID: 43eef4776b81
+Revises: ffd2c17aaac1
+Create Date: 2026-10-18 09:12:31.402117
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = '43eef4776b81'
+down_revision = 'ffd2c17aaac1'
+branch_labels = None
+depends_on = None
+
+SEARCH_VECTOR = """
+    setweight(to_tsvector('english', coalesce({row}.title, '')), 'A') ||
+    setweight(to_tsvector('english', coalesce({row}.location, '')), 'B') ||
+    setweight(to_tsvector('english', coalesce({row}.description, '')), 'C')
+"""
+
+
+def upgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        # other databases use the in-process index in app.search
+        op.add_column('eventlists', sa.Column('search_vector', sa.Text(), nullable=True))
+        op.create_index('ix_eventlists_search_vector', 'eventlists', ['search_vector'])
+        return
+
+    op.add_column('eventlists', sa.Column('search_vector', postgresql.TSVECTOR(), nullable=True))
+    op.execute("""
+        CREATE OR REPLACE FUNCTION eventlists_search_vector_update() RETURNS trigger AS $$
+        BEGIN
+            NEW.search_vector := {};
+            RETURN NEW;
+        END
+        $$ LANGUAGE plpgsql
+    """.format(SEARCH_VECTOR.format(row='NEW')))
+    op.execute("""
+        CREATE TRIGGER eventlists_search_vector_trigger
+        BEFORE INSERT OR UPDATE OF title, location, description ON eventlists
+        FOR EACH ROW EXECUTE PROCEDURE eventlists_search_vector_update()
+    """)
+    # backfill the existing rows before building the index
+    op.execute("UPDATE eventlists SET search_vector = {}".format(
+        SEARCH_VECTOR.format(row='eventlists')))
+    op.create_index('ix_eventlists_search_vector', 'eventlists', ['search_vector'],
+                    postgresql_using='gin')
+
+
+def downgrade():
+    op.drop_index('ix_eventlists_search_vector', table_name='eventlists')
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute('DROP TRIGGER IF EXISTS eventlists_search_vector_trigger ON eventlists')
+        op.execute('DROP FUNCTION IF EXISTS eventlists_search_vector_update()')
+    op.drop_column('eventlists', 'search_vector')
@@ -0,0 +1,38 @@
+"""updated_at on eventlists
+
+Revision ID: 49378a159090
+Revises: 41e33e7c540f
+Create Date: 2026-10-18 13:48:20.561932
+
+"""
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '49378a159090'
+down_revision = '41e33e7c540f'
+branch_labels = None
+depends_on = None
+
+eventlists = sa.table(
+    'eventlists',
+    sa.column('updated_at', sa.DateTime),
+)
+
+
+def upgrade():
+    op.add_column('eventlists', sa.Column('updated_at', sa.DateTime(), nullable=True))
+    # when events were last changed was never recorded, so count it as now
+    op.execute(eventlists.update().values(updated_at=datetime.utcnow()))
+    with op.batch_alter_table('eventlists') as batch_op:
+        batch_op.alter_column('updated_at', existing_type=sa.DateTime(), nullable=False)
+    op.create_index(op.f('ix_eventlists_updated_at'), 'eventlists', ['updated_at'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_eventlists_updated_at'), table_name='eventlists')
+    with op.batch_alter_table('eventlists') as batch_op:
+        batch_op.drop_column('updated_at')
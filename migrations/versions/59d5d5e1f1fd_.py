@@ -0,0 +1,74 @@
+"""starts_at on eventlists
+
+Revision ID: 59d5d5e1f1fd
+Revises: 49378a159090
+Create Date: 2026-10-18 14:20:37.904415
+
+"""
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+from dateutil import parser as date_parser
+
+
+# revision identifiers, used by Alembic.
+revision = '59d5d5e1f1fd'
+down_revision = '49378a159090'
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 1000
+
+eventlists = sa.table(
+    'eventlists',
+    sa.column('id', sa.Integer),
+    sa.column('date', sa.String),
+    sa.column('time', sa.String),
+    sa.column('starts_at', sa.DateTime),
+    sa.column('updated_at', sa.DateTime),
+)
+
+
+def parse_starts_at(date, time):
+    # as app.models.parse_starts_at when this revision was written
+    try:
+        return date_parser.parse('{} {}'.format(date, time))
+    except (ValueError, OverflowError):
+        return None
+
+
+def upgrade():
+    op.add_column('eventlists', sa.Column('starts_at', sa.DateTime(), nullable=True))
+
+    # events whose date and time cannot be read keep a NULL starts_at, the
+    # rest count as changed so incremental catalogue exports pick it up
+    connection = op.get_bind()
+    now = datetime.utcnow()
+    last_id = 0
+    while True:
+        rows = connection.execute(
+            sa.select([eventlists.c.id, eventlists.c.date, eventlists.c.time])
+            .where(eventlists.c.id > last_id)
+            .order_by(eventlists.c.id)
+            .limit(BATCH_SIZE)
+        ).fetchall()
+        if not rows:
+            break
+        for row_id, date, time in rows:
+            starts_at = parse_starts_at(date, time)
+            if starts_at is not None:
+                connection.execute(
+                    eventlists.update()
+                    .where(eventlists.c.id == row_id)
+                    .values(starts_at=starts_at, updated_at=now)
+                )
+        last_id = rows[-1][0]
+
+    op.create_index('ix_eventlists_starts_at_id', 'eventlists', ['starts_at', 'id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_eventlists_starts_at_id', table_name='eventlists')
+    with op.batch_alter_table('eventlists') as batch_op:
+        batch_op.drop_column('starts_at')
@@ -0,0 +1,54 @@
+"""expiry time on blacklist_tokens
+
+Revision ID: 5dfbd71f5d23
+Revises: 3252ecded62d
+Create Date: 2026-10-18 10:41:05.227164
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5dfbd71f5d23'
+down_revision = '3252ecded62d'
+branch_labels = None
+depends_on = None
+
+# tokens are issued for 1440 minutes, so none outlives its blacklisting by more
+TOKEN_LIFETIME_MINUTES = 1440
+
+blacklist_tokens = sa.table(
+    'blacklist_tokens',
+    sa.column('blacklisted_on', sa.DateTime),
+    sa.column('expires_at', sa.DateTime),
+)
+
+
+def token_expiry(dialect):
+    """Returns blacklisted_on plus the token lifetime in the dialect's SQL."""
+    if dialect == 'sqlite':
+        # %f keeps the fraction of a second that datetime() drops
+        return sa.func.strftime('%Y-%m-%d %H:%M:%f', blacklist_tokens.c.blacklisted_on,
+                                '+{} minutes'.format(TOKEN_LIFETIME_MINUTES))
+    return blacklist_tokens.c.blacklisted_on + sa.literal_column(
+        "INTERVAL '{} minutes'".format(TOKEN_LIFETIME_MINUTES), sa.Interval)
+
+
+def upgrade():
+    op.add_column('blacklist_tokens', sa.Column('expires_at', sa.DateTime(), nullable=True))
+
+    # only digests are stored, so the exp claim is bounded from blacklisted_on
+    connection = op.get_bind()
+    connection.execute(blacklist_tokens.update().values(
+        expires_at=token_expiry(connection.dialect.name)))
+
+    with op.batch_alter_table('blacklist_tokens') as batch_op:
+        batch_op.alter_column('expires_at', existing_type=sa.DateTime(), nullable=False)
+    op.create_index(op.f('ix_blacklist_tokens_expires_at'), 'blacklist_tokens',
+                    ['expires_at'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_blacklist_tokens_expires_at'), table_name='blacklist_tokens')
+    op.drop_column('blacklist_tokens', 'expires_at')
@@ -0,0 +1,49 @@
+"""primary key on rsvps
+
+Revision ID: 90c4fc5046fa
+Revises: 7f4d42b05632
+Create Date: 2026-10-18 12:02:41.318207
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '90c4fc5046fa'
+down_revision = '7f4d42b05632'
+branch_labels = None
+depends_on = None
+
+rsvps = sa.table(
+    'rsvps',
+    sa.column('user_id', sa.Integer),
+    sa.column('event_id', sa.Integer),
+)
+
+
+def upgrade():
+    # the table had no key, so keep one row per (user_id, event_id) pair
+    connection = op.get_bind()
+    pairs = connection.execute(
+        sa.select([rsvps.c.user_id, rsvps.c.event_id]).distinct()
+        .where(rsvps.c.user_id.isnot(None))
+        .where(rsvps.c.event_id.isnot(None))
+    ).fetchall()
+    connection.execute(rsvps.delete())
+    if pairs:
+        connection.execute(rsvps.insert(), [
+            {'user_id': user_id, 'event_id': event_id} for user_id, event_id in pairs
+        ])
+
+    with op.batch_alter_table('rsvps') as batch_op:
+        batch_op.alter_column('user_id', existing_type=sa.Integer(), nullable=False)
+        batch_op.alter_column('event_id', existing_type=sa.Integer(), nullable=False)
+        batch_op.create_primary_key('rsvps_pkey', ['user_id', 'event_id'])
+
+
+def downgrade():
+    with op.batch_alter_table('rsvps') as batch_op:
+        batch_op.drop_constraint('rsvps_pkey', type_='primary')
+        batch_op.alter_column('event_id', existing_type=sa.Integer(), nullable=True)
+        batch_op.alter_column('user_id', existing_type=sa.Integer(), nullable=True)
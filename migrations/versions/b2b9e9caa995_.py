@@ -0,0 +1,36 @@
+"""updated_at on event_category
+
+Revision ID: b2b9e9caa995
+Revises: 391361ee49fd
+Create Date: 2026-10-18 15:31:44.208716
+
+"""
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b2b9e9caa995'
+down_revision = '391361ee49fd'
+branch_labels = None
+depends_on = None
+
+event_category = sa.table(
+    'event_category',
+    sa.column('updated_at', sa.DateTime),
+)
+
+
+def upgrade():
+    op.add_column('event_category', sa.Column('updated_at', sa.DateTime(), nullable=True))
+    # when categories were last changed was never recorded, so count it as now
+    op.execute(event_category.update().values(updated_at=datetime.utcnow()))
+    with op.batch_alter_table('event_category') as batch_op:
+        batch_op.alter_column('updated_at', existing_type=sa.DateTime(), nullable=False)
+
+
+def downgrade():
+    with op.batch_alter_table('event_category') as batch_op:
+        batch_op.drop_column('updated_at')
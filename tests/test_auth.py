@@ -3,8 +3,14 @@
 import unittest
 import os
 import json
+import threading
+import time
+from datetime import datetime, timedelta
 from itsdangerous import URLSafeTimedSerializer
-from app import create_app, db
+from app import create_app, db, token_purger, password_hasher, token_cache, blacklist_filter
+from app.cache.blacklist import BlacklistFilter
+from app.hashing import PasswordHasher, HashingBusy
+from app.models import BlacklistToken
 
 SECRET = URLSafeTimedSerializer(os.getenv('SECRET'))
 
@@ -180,6 +186,93 @@ class AuthTestCase(unittest.TestCase):
         self.assertTrue(data['message'] == 'Successfully logged out.')
         self.assertEqual(response.status_code, 200)
 
+    def test_token_rejected_after_logout(self):
+        """ Test a cached token stops working as soon as it is logged out """
+        access_token = self.get_access_token()
+        headers = dict(Authorization='Bearer ' + access_token)
+
+        # the first two requests verify then cache the token
+        self.client().get('/api/auth/status', headers=headers)
+        self.client().get('/api/auth/status', headers=headers)
+        self.client().post('/api/auth/logout', headers=headers)
+
+        response = self.client().get('/api/auth/status', headers=headers)
+        data = json.loads(response.data.decode())
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(data['message'], 'Token blacklisted. Please log in again.')
+
+    def test_token_logged_out_elsewhere_rejected(self):
+        """ Test a cached token stops working once another process logs it out """
+        access_token = self.get_access_token()
+        headers = dict(Authorization='Bearer ' + access_token)
+        self.client().get('/api/auth/status', headers=headers)
+
+        # another process blacklists the token, leaving this one's cache be
+        with self.app.app_context():
+            db.session.add(BlacklistToken(token=access_token))
+            db.session.commit()
+        blacklist_filter.backend.set(BlacklistFilter.VERSION_KEY, 'elsewhere')
+
+        response = self.client().get('/api/auth/status', headers=headers)
+        data = json.loads(response.data.decode())
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(data['message'], 'Token blacklisted. Please log in again.')
+        self.assertEqual(token_cache.stats()['size'], 0)
+
+    def test_expired_blacklisted_tokens_purged(self):
+        """ Test purging removes only the blacklisted tokens that expired """
+        self.user_logout()
+        with self.app.app_context():
+            logged_out = BlacklistToken.query.first()
+            self.assertGreater(logged_out.expires_at, datetime.utcnow() + timedelta(hours=23))
+
+            expired = BlacklistToken(token='expired-token')
+            expired.expires_at = datetime.utcnow() - timedelta(minutes=1)
+            expired.save()
+
+        self.assertEqual(token_purger.run_once(), 1)
+        self.assertEqual(token_purger.stats()['rows_pruned'], 1)
+        with self.app.app_context():
+            self.assertEqual(BlacklistToken.query.count(), 1)
+
+    def test_hashing_pool(self):
+        """ Test passwords are hashed and checked on the worker pool """
+        hasher = PasswordHasher()
+        hasher.pool_size, hasher.rounds = 1, 4
+        try:
+            pw_hash = hasher.hash_password('test_password')
+            self.assertTrue(hasher.check_password(pw_hash, 'test_password'))
+            self.assertFalse(hasher.check_password(pw_hash, 'wrong_password'))
+        finally:
+            hasher.shutdown()
+
+    def test_login_when_hashing_saturated(self):
+        """ Test login answers 503 instead of queueing behind a full pool """
+        self.user_registration()
+        password_hasher.pool_size = 1
+        password_hasher.queue_timeout = 0
+        password_hasher.slots = threading.BoundedSemaphore(1)
+        password_hasher.slots.acquire()  # the only slot is taken
+
+        res = self.user_login()
+        self.assertEqual(res.status_code, 503)
+        self.assertEqual(res.headers['Retry-After'], '1')
+        self.assertRaises(HashingBusy, password_hasher.hash_password, 'test_password')
+
+    def test_saturated_pool_turns_callers_away_at_once(self):
+        """ Test a call finding every pool worker busy is not queued """
+        hasher = PasswordHasher()
+        self.app.config.update(BCRYPT_POOL_SIZE=1, BCRYPT_LOG_ROUNDS=4)
+        hasher.init_app(self.app)
+        self.addCleanup(hasher.shutdown)
+        hasher.slots.acquire()  # a hash is running on the only worker
+
+        started = time.perf_counter()
+        self.assertRaises(HashingBusy, hasher.hash_password, 'test_password')
+        self.assertLess(time.perf_counter() - started, 0.1)
+        hasher.slots.release()
+        self.assertTrue(hasher.check_password(hasher.hash_password('pw'), 'pw'))
+
     def test_email_exist_for_confirmation(self):
         """Test Email is valid by sending an email and  being confirmed """
         self.user_registration()
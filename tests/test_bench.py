@@ -0,0 +1,44 @@
+"""Tests for the load test behind `manage.py bench`."""
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from benchmarks import load
+
+
+class LoadTestCase(unittest.TestCase):
+    """Test case for the load test on a tiny dataset."""
+
+    def test_percentiles(self):
+        """Test percentiles are nearest-rank."""
+        values = list(range(1, 101))
+        self.assertEqual(load.percentile(values, 50), 50)
+        self.assertEqual(load.percentile(values, 95), 95)
+        self.assertEqual(load.percentile(values, 99), 99)
+        self.assertEqual(load.percentile([7], 99), 7)
+        self.assertIsNone(load.percentile([], 50))
+
+    def test_run_writes_results(self):
+        """Test every scenario runs without errors and is written out."""
+        results = load.run(users=5, categories=2, events=20, rsvp_count=10,
+                           requests=12, concurrency=2, warmup=1)
+        self.assertEqual(sorted(results['scenarios']), [
+            'event_detail', 'events_filtered', 'events_listing', 'login', 'rsvp'])
+        for name, summary in results['scenarios'].items():
+            self.assertEqual((summary['requests'], summary['errors']), (12, 0), name)
+            self.assertLessEqual(summary['p50_ms'], summary['p99_ms'])
+
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = load.write_results(results, os.path.join(directory, 'results.json'))
+        with open(path) as results_file:
+            self.assertEqual(json.load(results_file)['settings']['events'], 20)
+        self.assertEqual(len(load.compare(results, results)), 5)
+
+
+# Make the tests conveniently executable
+if __name__ == "__main__":
+    unittest.main()
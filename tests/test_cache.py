@@ -0,0 +1,369 @@
+"""import depancies."""
+
+import unittest
+import json
+import time
+import threading
+from unittest import mock
+from sqlalchemy import event as sa_event
+from app import create_app, db, category_cache, listing_cache, blacklist_filter
+from app.cache import SimpleBackend, RedisBackend, InMemoryRedis
+from app.cache.blacklist import BloomFilter, BlacklistFilter
+from app.cache.listings import ListingCache
+from app.cache.tokens import TokenCache, token_digest
+from app.models import EventCategory, BlacklistToken, Events, User
+
+
+class CategoryCacheTestCase(unittest.TestCase):
+    """Test case for the event category cache."""
+
+    def setUp(self):
+        """Set up test variables."""
+        self.app = create_app(config_name="testing")
+        self.client = self.app.test_client
+
+        with self.app.app_context():
+            # create all tables
+            db.session.close()
+            db.drop_all()
+            db.create_all()
+            EventCategory(category_name='Sports').save()
+
+    def test_categories_served_from_cache(self):
+        """Test repeated category reads only query the db once."""
+        with self.app.app_context():
+            self.assertEqual(category_cache.get_name(1), 'Sports')
+            self.assertEqual(category_cache.get_name('1'), 'Sports')
+            self.assertIsNone(category_cache.get_name(2))
+        res = self.client().get('/api/category')
+        self.assertEqual(json.loads(res.data.decode()),
+                         [{'id': 1, 'category_name': 'Sports'}])
+        self.assertEqual(category_cache.stats(), {'hits': 3, 'misses': 1})
+
+    def test_categories_conditional_get(self):
+        """Test unchanged categories are answered 304 until one is saved."""
+        res = self.client().get('/api/category')
+        headers = {'If-None-Match': res.headers['ETag']}
+        # a deleted category would not move it, so there is no Last-Modified
+        self.assertNotIn('Last-Modified', res.headers)
+        res = self.client().get('/api/category', headers=headers)
+        self.assertEqual(res.status_code, 304)
+        self.assertEqual(category_cache.stats(), {'hits': 1, 'misses': 1})
+
+        with self.app.app_context():
+            EventCategory(category_name='Music').save()
+        res = self.client().get('/api/category', headers=headers)
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(len(json.loads(res.data.decode())), 2)
+
+    def test_category_updated_at(self):
+        """Test the cached updated_at reads back as the stored datetime."""
+        with self.app.app_context():
+            category = EventCategory.query.get(1)
+            self.assertEqual(category_cache.get_updated_at(1), category.updated_at)
+            self.assertEqual(category_cache.get_updated_at('1'), category.updated_at)
+            self.assertIsNone(category_cache.get_updated_at(2))
+
+    def test_save_and_delete_invalidate_cache(self):
+        """Test changing a category is visible straight away."""
+        with self.app.app_context():
+            self.assertEqual(category_cache.get_name(1), 'Sports')
+            category = EventCategory.query.get(1)
+            category.category_name = 'Athletics'
+            category.save()
+            self.assertEqual(category_cache.get_name(1), 'Athletics')
+            category.delete()
+            self.assertEqual(category_cache.get_all(), [])
+
+    def test_cache_entries_expire(self):
+        """Test cached categories are reloaded after the timeout."""
+        with self.app.app_context():
+            category_cache.get_all()
+            with mock.patch('app.cache.time.time', return_value=10 ** 11):
+                category_cache.get_all()
+        self.assertEqual(category_cache.stats(), {'hits': 0, 'misses': 2})
+
+    def test_shared_backend(self):
+        """Test the cache works the same on the shared backend."""
+        category_cache.backend = RedisBackend(InMemoryRedis())
+        with self.app.app_context():
+            self.assertEqual(category_cache.get_all(), [(1, 'Sports')])
+            self.assertEqual(category_cache.get_all(), [(1, 'Sports')])
+            EventCategory(category_name='Music').save()
+            self.assertEqual(len(category_cache.get_all()), 2)
+        self.assertEqual(category_cache.stats(), {'hits': 1, 'misses': 2})
+
+    def test_simple_backend(self):
+        """Test the in-process backend stores, expires and deletes values."""
+        backend = SimpleBackend()
+        backend.set('key', [1, 'one'], timeout=60)
+        self.assertEqual(backend.get('key'), [1, 'one'])
+        with mock.patch('app.cache.time.time', return_value=10 ** 11):
+            self.assertIsNone(backend.get('key'))
+        backend.set('key', 'value')
+        backend.delete('key')
+        self.assertIsNone(backend.get('key'))
+        self.assertTrue(backend.add('key', 'first', timeout=60))
+        self.assertFalse(backend.add('key', 'second'))
+        self.assertEqual(backend.get('key'), 'first')
+
+    def tearDown(self):
+        """teardown all initialized variables."""
+        with self.app.app_context():
+            # drop all tables
+            db.session.remove()
+            db.drop_all()
+
+
+class ListingCacheTestCase(unittest.TestCase):
+    """Test case for the event listing response cache."""
+
+    def setUp(self):
+        """Set up an app with an event to list."""
+        self.app = create_app(config_name="testing")
+        self.client = self.app.test_client
+
+        with self.app.app_context():
+            db.session.close()
+            db.drop_all()
+            db.create_all()
+            user = User(name='cache user', email='cache@test.com',
+                        password='cache1234', email_confirmed=True)
+            db.session.add(user)
+            db.session.commit()
+            EventCategory(category_name='Sports').save()
+            self.event('Marathon').save()
+
+    @staticmethod
+    def event(title):
+        """Returns an unsaved event of the test user."""
+        return Events(title=title, location='Nairobi', time='10:00AM',
+                      date='6th JAN 2017', description='Cached', image_url='',
+                      created_by=1, event_category=1)
+
+    def titles(self, url='/api/events/all'):
+        """Returns the titles listed at url and the queries it took."""
+        statements = []
+
+        def before_cursor_execute(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        with self.app.app_context():
+            engine = db.engine
+        sa_event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+        try:
+            res = self.client().get(url)
+        finally:
+            sa_event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+        return [event['title'] for event in json.loads(res.data.decode())], len(statements)
+
+    def test_listing_served_from_cache(self):
+        """Test equivalent listing requests share one cached page."""
+        # the page and the categories
+        self.assertEqual(self.titles('/api/events/all?limit=5&title=mara'), (['Marathon'], 2))
+        self.assertEqual(self.titles('/api/events/all?title=mara&limit=5&page=1'),
+                         (['Marathon'], 0))
+        self.assertGreater(self.titles('/api/events/all?title=mara&q=marathon')[1], 0)
+        self.assertEqual(listing_cache.stats(), {'hits': 1, 'misses': 1, 'waits': 0})
+
+    def test_changes_invalidate_listing(self):
+        """Test saved and deleted events are listed at once, and RSVPs
+        once the cached page expires."""
+        self.titles()
+        with self.app.app_context():
+            self.event('Relay').save()
+        self.assertEqual(self.titles()[0], ['Marathon', 'Relay'])
+
+        with self.app.app_context():
+            Events.query.get(1).add_rsvp(User.query.get(1))
+        res = self.client().get('/api/events/all')
+        self.assertEqual(json.loads(res.data.decode())[0]['rsvp_count'], 0)
+        with mock.patch('app.cache.time.time', return_value=time.time() + 61):
+            res = self.client().get('/api/events/all')
+        self.assertEqual(json.loads(res.data.decode())[0]['rsvp_count'], 1)
+
+        with self.app.app_context():
+            Events.query.get(2).delete()
+        self.assertEqual(self.titles()[0], ['Marathon'])
+
+    def test_cached_page_conditional_get(self):
+        """Test a cached page keeps its ETag."""
+        etag = self.client().get('/api/events/all').headers['ETag']
+        res = self.client().get('/api/events/all', headers={'If-None-Match': etag})
+        self.assertEqual(res.status_code, 304)
+
+    def stampede(self, caches):
+        """Sends 20 concurrent misses for one key through the caches and
+        returns how many times the value was loaded."""
+        loads = []
+
+        def load():
+            loads.append(1)
+            time.sleep(0.1)
+            return 'page'
+
+        def get(cache):
+            self.assertEqual(cache.get_or_set('page=1', load), 'page')
+
+        threads = [threading.Thread(target=get, args=(caches[number % len(caches)],))
+                   for number in range(20)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return len(loads)
+
+    def test_unshared_backend_with_several_processes_warned(self):
+        """Test start up warns that other processes' pages may be stale."""
+        self.app.config['WEB_CONCURRENCY'] = 2
+        with self.assertLogs(self.app.logger, 'WARNING') as logs:
+            ListingCache(self.app)
+        self.assertIn('up to 60s stale', logs.output[0])
+        self.app.config['CACHE_BACKEND'] = 'redis-local'
+        with mock.patch.object(self.app.logger, 'warning') as warning:
+            ListingCache(self.app)
+        warning.assert_not_called()
+
+    def test_stampede_loads_once(self):
+        """Test concurrent misses of a process load the page once."""
+        self.assertEqual(self.stampede([listing_cache]), 1)
+
+    def test_stampede_loads_once_across_processes(self):
+        """Test processes sharing a backend load the page once."""
+        backend = RedisBackend(InMemoryRedis())
+        caches = []
+        for _ in range(3):
+            cache = ListingCache()
+            cache.backend = backend
+            caches.append(cache)
+        self.assertEqual(self.stampede(caches), 1)
+        self.assertEqual(sum(cache.stats()['waits'] for cache in caches), 2)
+
+    def tearDown(self):
+        """teardown all initialized variables."""
+        with self.app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+
+class TokenCacheTestCase(unittest.TestCase):
+    """Test case for the verified token cache."""
+
+    def setUp(self):
+        """Set up a small cache."""
+        self.cache = TokenCache()
+        self.cache.max_size = 2
+        self.expires = time.time() + 3600
+
+    def test_cached_token(self):
+        """Test a cached token returns its user id until invalidated."""
+        self.cache.set('token-a', 7, self.expires)
+        self.assertEqual(self.cache.get('token-a'), 7)
+        self.cache.invalidate('token-a')
+        self.assertIsNone(self.cache.get('token-a'))
+        self.assertEqual(self.cache.stats(), {'hits': 1, 'misses': 1, 'size': 0})
+
+    def test_least_recently_used_evicted(self):
+        """Test the cache never grows beyond its size."""
+        self.cache.set('token-a', 1, self.expires)
+        self.cache.set('token-b', 2, self.expires)
+        self.cache.get('token-a')
+        self.cache.set('token-c', 3, self.expires)
+        self.assertEqual(self.cache.get('token-a'), 1)
+        self.assertIsNone(self.cache.get('token-b'))
+        self.assertEqual(self.cache.get('token-c'), 3)
+
+    def test_entries_expire(self):
+        """Test entries expire at the token exp or the cache timeout."""
+        self.cache.set('token-a', 1, time.time() - 1)
+        self.assertIsNone(self.cache.get('token-a'))
+        self.cache.set('token-b', 2, self.expires)
+        with mock.patch('app.cache.tokens.time.time',
+                        return_value=time.time() + self.cache.timeout + 1):
+            self.assertIsNone(self.cache.get('token-b'))
+
+
+class BlacklistFilterTestCase(unittest.TestCase):
+    """Test case for the bloom filter in front of blacklist_tokens."""
+
+    def setUp(self):
+        """Set up test variables."""
+        self.app = create_app(config_name="testing")
+
+        with self.app.app_context():
+            # create all tables
+            db.session.close()
+            db.drop_all()
+            db.create_all()
+            BlacklistToken(token='already-blacklisted').save()
+
+    def test_filter_loaded_from_db(self):
+        """Test tokens blacklisted before start up are found."""
+        with self.app.app_context():
+            self.assertTrue(BlacklistToken.check_blacklist('already-blacklisted'))
+            self.assertFalse(BlacklistToken.check_blacklist('fresh-token'))
+            BlacklistToken(token='logged-out').save()
+            self.assertTrue(BlacklistToken.check_blacklist('logged-out'))
+        self.assertEqual(blacklist_filter.stats()['db_lookups'], 2)
+
+    def test_only_token_digest_stored(self):
+        """Test the raw token never reaches the blacklist table."""
+        with self.app.app_context():
+            stored = BlacklistToken.query.first()
+            self.assertEqual(len(stored.token_digest), 64)
+            self.assertNotIn('already-blacklisted', stored.token_digest)
+
+    def test_rows_from_other_processes_picked_up(self):
+        """Test the filter re-reads rows added by other processes."""
+        with self.app.app_context():
+            self.assertFalse(BlacklistToken.check_blacklist('elsewhere'))
+            # simulate another worker logging out without touching our filter
+            db.session.add(BlacklistToken(token='elsewhere'))
+            db.session.commit()
+            blacklist_filter.refresh_interval = 0
+            self.assertTrue(BlacklistToken.check_blacklist('elsewhere'))
+
+    def test_logout_elsewhere_seen_at_once(self):
+        """Test a token blacklisted by another process sharing the backend
+        is found without waiting for the refresh interval."""
+        other = BlacklistFilter()
+        other.backend = blacklist_filter.backend = RedisBackend(InMemoryRedis())
+        other.refresh_interval = blacklist_filter.refresh_interval = 3600
+        with self.app.app_context():
+            self.assertFalse(other.might_contain(token_digest('elsewhere')))
+            BlacklistToken(token='elsewhere').save()
+            self.assertTrue(other.might_contain(token_digest('elsewhere')))
+            self.assertFalse(other.might_contain(token_digest('fresh-token')))
+
+    def test_unshared_backend_with_several_processes(self):
+        """Test every check asks the db when other processes' logouts
+        cannot reach the filter."""
+        self.app.config['WEB_CONCURRENCY'] = 2
+        blacklist_filter.init_app(self.app)
+        with self.app.app_context():
+            self.assertFalse(BlacklistToken.check_blacklist('elsewhere'))
+            db.session.add(BlacklistToken(token='elsewhere'))
+            db.session.commit()
+            self.assertTrue(BlacklistToken.check_blacklist('elsewhere'))
+        self.assertEqual(blacklist_filter.stats()['db_lookups'], 2)
+
+    def test_bloom_filter_error_rate(self):
+        """Test the bloom filter has no false negatives and few false positives."""
+        bloom = BloomFilter(1000, error_rate=0.01)
+        for number in range(1000):
+            bloom.add('member-{}'.format(number))
+        self.assertTrue(all('member-{}'.format(number) in bloom for number in range(1000)))
+        false_positives = sum('other-{}'.format(number) in bloom for number in range(10000))
+        self.assertLess(false_positives, 300)
+
+    def tearDown(self):
+        """teardown all initialized variables."""
+        with self.app.app_context():
+            # drop all tables
+            db.session.remove()
+            db.drop_all()
+
+
+# Make the tests conveniently executable
+if __name__ == "__main__":
+    unittest.main()
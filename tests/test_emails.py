@@ -0,0 +1,143 @@
+"""import depancies."""
+
+import unittest
+from app import create_app, db, mail, mail_pool, email_templates
+from app.emails import send_mail
+from app.emails.outbox import drain_outbox
+from app.emails.sink import SMTPSink
+from app.models import Events, OutboxMail
+
+
+class EmailTestCase(unittest.TestCase):
+    """Test case for the mail outbox and its worker."""
+
+    def setUp(self):
+        """Set up test variables and point the app at a local SMTP sink."""
+        self.sink = SMTPSink().start()
+        self.app = create_app(config_name="testing")
+        self.app.config.update(
+            MAIL_SERVER=self.sink.host, MAIL_PORT=self.sink.port,
+            MAIL_USE_TLS=False, MAIL_SUPPRESS_SEND=False)
+        mail.init_app(self.app)
+        self.client = self.app.test_client
+
+        with self.app.app_context():
+            # create all tables
+            db.session.close()
+            db.drop_all()
+            db.create_all()
+
+    def user_registration(self):
+        """This helper method helps register a test user."""
+        user_data = {
+            'name': 'test user',
+            'email': 'test@example.com',
+            'password': 'test_password'
+        }
+        return self.client().post('/api/auth/register', data=user_data)
+
+    def test_registration_queues_email(self):
+        """Test registering writes the welcome email to the outbox only."""
+        self.user_registration()
+        with self.app.app_context():
+            queued = OutboxMail.query.all()
+            self.assertEqual(len(queued), 1)
+            self.assertEqual(queued[0].recipient, 'test@example.com')
+            self.assertEqual(queued[0].status, OutboxMail.PENDING)
+        self.assertEqual(self.sink.messages, [])
+
+    def test_worker_sends_batch_over_one_connection(self):
+        """Test the worker sends every due email over a single SMTP session."""
+        with self.app.app_context():
+            for number in range(3):
+                OutboxMail('user{}@example.com'.format(number), 'Hello', '<p>Hi</p>').save()
+            self.assertEqual(drain_outbox(), (3, 0))
+            self.assertEqual(drain_outbox(), (0, 0))
+            self.assertEqual(
+                OutboxMail.query.filter_by(status=OutboxMail.SENT).count(), 3)
+        self.assertEqual(len(self.sink.messages), 3)
+        self.assertEqual(self.sink.connections, 1)
+        self.assertEqual(self.sink.messages[0]['to'], ['user0@example.com'])
+
+    def test_worker_retries_then_gives_up(self):
+        """Test an email that cannot be sent is retried, then marked failed."""
+        self.sink.refused.add('user@example.com')
+        self.app.config['MAIL_OUTBOX_RETRY_DELAY'] = 0
+        self.app.config['MAIL_OUTBOX_MAX_ATTEMPTS'] = 2
+        with self.app.app_context():
+            OutboxMail('user@example.com', 'Hello', '<p>Hi</p>').save()
+            OutboxMail('other@example.com', 'Hello', '<p>Hi</p>').save()
+            self.assertEqual(drain_outbox(), (1, 1))
+            queued = OutboxMail.query.filter_by(recipient='user@example.com').first()
+            self.assertEqual((queued.status, queued.attempts), (OutboxMail.PENDING, 1))
+            self.assertEqual(drain_outbox(), (0, 1))
+            queued = OutboxMail.query.filter_by(recipient='user@example.com').first()
+            self.assertEqual((queued.status, queued.attempts), (OutboxMail.FAILED, 2))
+            self.assertTrue(queued.last_error)
+
+    def test_smtp_outage_uses_no_attempts(self):
+        """Test emails are not charged attempts when no connection opens."""
+        self.sink.stop()
+        with self.app.app_context():
+            for number in range(3):
+                OutboxMail('user{}@example.com'.format(number), 'Hello', '<p>Hi</p>').save()
+            self.assertEqual(drain_outbox(), (0, 0))
+            self.assertEqual([(queued.status, queued.attempts, queued.last_error)
+                              for queued in OutboxMail.query.order_by(OutboxMail.id)],
+                             [(OutboxMail.PENDING, 0, None)] * 3)
+
+    def test_inline_sends_reuse_connection(self):
+        """Test emails sent inline share one pooled SMTP connection."""
+        self.app.config['MAIL_QUEUE_ENABLED'] = False
+        with self.app.app_context():
+            for number in range(3):
+                self.assertEqual(
+                    send_mail('user{}@example.com'.format(number), 'Hello', '<p>Hi</p>'), 'sent')
+        self.assertEqual(len(self.sink.messages), 3)
+        self.assertEqual(self.sink.connections, 1)
+        self.assertEqual(mail_pool.stats()['opened'], 1)
+        self.assertEqual(mail_pool.stats()['reused'], 2)
+
+    def test_pool_replaces_dead_connection(self):
+        """Test a pooled connection that died is replaced before use."""
+        self.app.config['MAIL_QUEUE_ENABLED'] = False
+        mail_pool.check_after = 0
+        with self.app.app_context():
+            send_mail('user@example.com', 'Hello', '<p>Hi</p>')
+            connection, _ = mail_pool.idle[0]
+            connection.host.close()  # as if the server dropped it
+            send_mail('user@example.com', 'Hello again', '<p>Hi</p>')
+        self.assertEqual(len(self.sink.messages), 2)
+        self.assertEqual(mail_pool.stats()['opened'], 2)
+
+    def test_rsvp_body_rendered_once_per_event(self):
+        """Test RSVP emails for one event render the template once."""
+        event = Events('Swimming', 'Lake Turkana', '10:00', '2026-12-01',
+                       'Swim with us', '', 1, 1)
+        event.id = 1
+        with self.app.app_context():
+            first = email_templates.render_rsvp(event, 'Ann')
+            second = email_templates.render_rsvp(event, '<b>Bob</b>')
+            event.location = 'Lake Victoria'
+            moved = email_templates.render_rsvp(event, 'Ann')
+        self.assertIn('Hey Ann', first)
+        self.assertIn('Swimming', first)
+        self.assertIn('Hey &lt;b&gt;Bob&lt;/b&gt;', second)
+        self.assertIn('Lake Victoria', moved)
+        stats = email_templates.stats()
+        self.assertEqual((stats['rsvp_hits'], stats['rsvp_misses']), (1, 2))
+        self.assertEqual(stats['renders']['inline_rsvp.html']['count'], 2)
+
+    def tearDown(self):
+        """teardown all initialized variables."""
+        mail_pool.close_all()
+        self.sink.stop()
+        with self.app.app_context():
+            # drop all tables
+            db.session.remove()
+            db.drop_all()
+
+
+# Make the tests conveniently executable
+if __name__ == "__main__":
+    unittest.main()
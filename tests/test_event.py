@@ -3,8 +3,15 @@
 import unittest
 import os
 import json
+import gzip
+import threading
+from datetime import datetime
+from unittest import mock
 from itsdangerous import URLSafeTimedSerializer
+from sqlalchemy import event as sa_event
 from app import create_app, db
+from app.models import User, Events, EventCategory
+from app.events.pagination import encode_cursor
 
 SECRET = URLSafeTimedSerializer(os.getenv('SECRET'))
 
@@ -304,6 +311,204 @@ class EventTestCase(unittest.TestCase):
             headers=dict(Authorization="Bearer " + access_token))
         self.assertEqual(res.status_code, 200)
 
+    def test_user_rsvp_is_idempotent(self):
+        """Test a second RSVP by the same user is refused and not stored."""
+        access_token = self.get_access_token()
+        results = json.loads(self.event_creation().data.decode())
+        for status in (200, 202):
+            res = self.client().post(
+                '/api/events/{}/rsvp'.format(results['id']),
+                headers=dict(Authorization="Bearer " + access_token))
+            self.assertEqual(res.status_code, status)
+        with self.app.app_context():
+            self.assertEqual(Events.query.get(results['id']).rsvpList.count(), 1)
+
+    def test_rsvp_count_follows_rsvps(self):
+        """Test rsvp_count is listed, kept in step and reconcilable."""
+        access_token = self.get_access_token()
+        results = json.loads(self.event_creation().data.decode())
+        self.assertEqual(results['rsvp_count'], 0)
+        url = '/api/events/{}/rsvp'.format(results['id'])
+        headers = dict(Authorization="Bearer " + access_token)
+        # listed pages are cached without regard to RSVPs, single events are not
+        event_url = '/api/events/all/{}'.format(results['id'])
+        self.client().post(url, headers=headers)
+        res = self.client().get(event_url)
+        self.assertEqual(json.loads(res.data.decode())['rsvp_count'], 1)
+
+        self.assertEqual(self.client().delete(url, headers=headers).status_code, 200)
+        self.assertEqual(self.client().delete(url, headers=headers).status_code, 404)
+        res = self.client().get(event_url)
+        self.assertEqual(json.loads(res.data.decode())['rsvp_count'], 0)
+
+        with self.app.app_context():
+            Events.query.filter_by(id=results['id']).update({'rsvp_count': 5})
+            db.session.commit()
+            self.assertEqual(Events.reconcile_rsvp_counts(), 1)
+            self.assertEqual(Events.query.get(results['id']).rsvp_count, 0)
+
+    def test_concurrent_rsvps_do_not_oversell(self):
+        """Test simultaneous RSVPs to a full event fill it exactly and
+        waitlist the rest, and a cancelled seat goes to the waitlist."""
+        results = json.loads(self.event_creation().data.decode())
+        url = '/api/events/{}/rsvp'.format(results['id'])
+        with self.app.app_context():
+            Events.query.filter_by(id=results['id']).update({'capacity': 5})
+            tokens = []
+            for number in range(20):
+                user = User('guest {}'.format(number), 'guest{}@test.com'.format(number),
+                            'guest1234', True)
+                user.save()
+                tokens.append(User.generate_token(user.id).decode())
+
+        barrier = threading.Barrier(len(tokens))
+        statuses = []
+
+        def rsvp(token):
+            client = self.client()
+            barrier.wait()
+            res = client.post(url, headers=dict(Authorization="Bearer " + token))
+            statuses.append((res.status_code, json.loads(res.data.decode())['message']))
+
+        threads = [threading.Thread(target=rsvp, args=(token,)) for token in tokens]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(sum(1 for status, _ in statuses if status == 200), 5)
+        self.assertEqual(sum(1 for _, message in statuses if 'waitlist' in message), 15)
+        with self.app.app_context():
+            event = Events.query.get(results['id'])
+            self.assertEqual(event.rsvp_count, 5)
+            self.assertEqual(event.rsvpList.count(), 5)
+            seated = event.rsvpList.first()
+            token = User.generate_token(seated.id).decode()
+
+        res = self.client().delete(url, headers=dict(Authorization="Bearer " + token))
+        self.assertEqual(res.status_code, 200)
+        with self.app.app_context():
+            event = Events.query.get(results['id'])
+            self.assertEqual((event.rsvp_count, event.rsvpList.count()), (5, 5))
+
+    def test_waitlist_follows_capacity_and_delete(self):
+        """Test raising capacity seats those waiting, and an event with a
+        waitlist can still be deleted."""
+        access_token = self.get_access_token()
+        results = json.loads(self.event_creation().data.decode())
+        with self.app.app_context():
+            event = Events.query.get(results['id'])
+            event.capacity = 1
+            event.save()
+            for number in range(4):
+                user = User('guest {}'.format(number), 'guest{}@test.com'.format(number),
+                            'guest1234', True)
+                user.save()
+                event.add_rsvp(user)
+            self.assertEqual(event.rsvpList.count(), 1)
+
+        headers = dict(Authorization="Bearer " + access_token)
+        res = self.client().put(
+            '/api/events/{}'.format(results['id']), headers=headers,
+            data=dict(self.bulk_event('swimming in lake turkana'), capacity=3))
+        self.assertEqual(res.status_code, 200)
+        with self.app.app_context():
+            event = Events.query.get(results['id'])
+            self.assertEqual((event.rsvp_count, event.rsvpList.count()), (3, 3))
+
+        # one guest is still waiting
+        res = self.client().delete('/api/events/{}'.format(results['id']), headers=headers)
+        self.assertEqual(res.status_code, 200)
+        with self.app.app_context():
+            self.assertIsNone(Events.query.get(results['id']))
+
+    def test_rsvp_export_streams_attendees(self):
+        """Test an event's creator can export its attendees as CSV and NDJSON."""
+        access_token = self.get_access_token()
+        results = json.loads(self.event_creation().data.decode())
+        headers = dict(Authorization="Bearer " + access_token)
+        self.client().post('/api/events/{}/rsvp'.format(results['id']), headers=headers)
+        url = '/api/events/{}/rsvps/export'.format(results['id'])
+
+        res = self.client().get(url, headers=headers)
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.mimetype, 'text/csv')
+        self.assertTrue(res.is_streamed)
+        self.assertEqual(res.data.decode().splitlines(),
+                         ['user_id,name,email', '1,test user,user@test.com'])
+
+        res = self.client().get(url + '?format=ndjson', headers=headers)
+        self.assertEqual([json.loads(line) for line in res.data.decode().splitlines()],
+                         [{'user_id': 1, 'name': 'test user', 'email': 'user@test.com'}])
+
+        res = self.client().get(url + '?format=xml', headers=headers)
+        self.assertEqual(res.status_code, 400)
+
+        self.register_fake_user()
+        fake_token = json.loads(self.login_fake_user().data.decode())['access_token']
+        res = self.client().get(url, headers=dict(Authorization="Bearer " + fake_token))
+        self.assertEqual(res.status_code, 401)
+
+    def bulk_event(self, title):
+        """This helper builds one event of a bulk creation request."""
+        return {
+            "title": title, "location": "Naivasha", "time": "10:00AM",
+            "date": "6th JAN 2017", "description": "Swim in a lake",
+            "image_url": "https://www.google.com", "event_category": 1
+        }
+
+    def test_bulk_event_creation(self):
+        """Test API can create many events in one request."""
+        access_token = self.get_access_token()
+        self.create_event_cartegory()
+        self.email_verification()
+        res = self.client().post(
+            '/api/events/bulk', headers=dict(Authorization="Bearer " + access_token),
+            data=json.dumps([self.bulk_event('lake {}'.format(number)) for number in range(3)]),
+            content_type='application/json')
+        self.assertEqual(res.status_code, 201)
+        events = json.loads(res.data.decode())['events']
+        self.assertEqual([event['title'] for event in events],
+                         ['Lake 0', 'Lake 1', 'Lake 2'])
+        self.assertEqual(events[0]['event_category'], 'Sports')
+        with self.app.app_context():
+            self.assertEqual(Events.query.count(), 3)
+
+    def test_bulk_event_creation_reports_rows(self):
+        """Test a bulk request with invalid rows creates nothing and
+        reports each invalid row."""
+        access_token = self.get_access_token()
+        self.event_creation()
+        rows = [self.bulk_event('lake 0'), self.bulk_event('swimming in lake turkana'),
+                self.bulk_event('lake 0'), dict(self.bulk_event('lake 3'), location=''),
+                dict(self.bulk_event('lake 4'), event_category=9)]
+        res = self.client().post(
+            '/api/events/bulk', headers=dict(Authorization="Bearer " + access_token),
+            data=json.dumps(rows), content_type='application/json')
+        self.assertEqual(res.status_code, 400)
+        self.assertEqual([error['index'] for error in json.loads(res.data.decode())['errors']],
+                         [1, 2, 3, 4])
+        with self.app.app_context():
+            self.assertEqual(Events.query.count(), 1)
+
+    def test_bulk_event_creation_checks_lengths(self):
+        """Test fields longer than their columns are reported as row errors."""
+        access_token = self.get_access_token()
+        self.event_creation()
+        rows = [self.bulk_event('lake 0'), self.bulk_event('lake ' + 'x' * 25),
+                dict(self.bulk_event('lake 2'), description='x' * 256),
+                dict(self.bulk_event('lake 3'), image_url='x' * 255)]
+        res = self.client().post(
+            '/api/events/bulk', headers=dict(Authorization="Bearer " + access_token),
+            data=json.dumps(rows), content_type='application/json')
+        self.assertEqual(res.status_code, 400)
+        self.assertEqual(json.loads(res.data.decode())['errors'], [
+            {'index': 1, 'message': 'title must be at most 25 characters'},
+            {'index': 2, 'message': 'description must be at most 255 characters'},
+        ])
+        with self.app.app_context():
+            self.assertEqual(Events.query.count(), 1)
+
     def test_api_can_filter_event_title(self):
         """Test API can filter an event by title (GET request)."""
         self.event_creation()
@@ -398,6 +603,275 @@ class EventTestCase(unittest.TestCase):
         self.assertEqual(res.status_code, 404)
         self.assertIn('No events found', str(res.data))
 
+    def seed_events(self, count):
+        """This helper inserts a number of events straight into the db."""
+        with self.app.app_context():
+            user = User(name='seed user', email='seed@test.com',
+                        password='seed1234', email_confirmed=True)
+            category = EventCategory(category_name='Seeded')
+            db.session.add_all([user, category])
+            db.session.commit()
+            for number in range(count):
+                db.session.add(Events(
+                    title='Seeded event {}'.format(number), location='Nairobi',
+                    time='10:00AM', date='6th JAN 2017', description='Seeded',
+                    image_url='https://www.google.com', created_by=user.id,
+                    event_category=category.id))
+            db.session.commit()
+
+    def count_queries(self, url):
+        """This helper returns the response and the number of SQL
+        statements issued while serving a GET request."""
+        return self.count_queries_with(url, {})
+
+    def count_queries_with(self, url, headers):
+        """This helper is count_queries sending the given headers."""
+        statements = []
+
+        def before_cursor_execute(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        with self.app.app_context():
+            engine = db.engine
+        sa_event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+        try:
+            res = self.client().get(url, headers=headers)
+        finally:
+            sa_event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+        return res, len(statements)
+
+    def test_listing_query_count_is_constant(self):
+        """Test the events listing does not issue a query per event."""
+        self.seed_events(12)
+        self.client().get('/api/events/all')  # warm the category cache
+
+        small, small_count = self.count_queries('/api/events/all?limit=2')
+        large, large_count = self.count_queries('/api/events/all?limit=12')
+
+        self.assertEqual(len(json.loads(small.data.decode())), 2)
+        results = json.loads(large.data.decode())
+        self.assertEqual(len(results), 12)
+        self.assertEqual(results[0]['event_category'], 'Seeded')
+        self.assertEqual(results[0]['created_by'], 'seed user')
+        self.assertEqual(small_count, large_count)
+        self.assertEqual(large_count, 1)
+
+    def test_listing_cursor_pagination(self):
+        """Test API can page through all events with a cursor (GET request)."""
+        self.seed_events(12)
+
+        titles = []
+        cursor = ''
+        while cursor is not None:
+            res = self.client().get(
+                '/api/events/all?limit=5&cursor={}'.format(cursor))
+            self.assertEqual(res.status_code, 200)
+            result = json.loads(res.data.decode())
+            titles.extend(event['title'] for event in result['events'])
+            cursor = result['next_cursor']
+
+        self.assertEqual(len(titles), 12)
+        self.assertEqual(len(set(titles)), 12)
+
+    def test_listing_invalid_cursor(self):
+        """Test API rejects a cursor it did not issue (GET request)."""
+        self.seed_events(1)
+        res = self.client().get('/api/events/all?cursor=not-a-cursor')
+        self.assertEqual(res.status_code, 400)
+
+    def test_listing_tampered_cursor(self):
+        """Test API rejects cursor values of the wrong type (GET request)."""
+        self.seed_events(1)
+        for values in ({'id': None}, {'id': {}}, {'id': [1]}, {'id': 'abc'},
+                       {'id': True}, {'id': 1.5}):
+            res = self.client().get('/api/events/all?cursor={}'.format(encode_cursor(values)))
+            self.assertEqual(res.status_code, 400, values)
+        for values in ({'starts_at': None, 'id': 1}, {'starts_at': 5, 'id': 1},
+                       {'starts_at': '2026-01-01T10:00:00', 'id': '1'},
+                       {'starts_at': 'not a date', 'id': 1}):
+            res = self.client().get('/api/events/all?sort=starts_at&cursor={}'.format(
+                encode_cursor(values)))
+            self.assertEqual(res.status_code, 400, values)
+
+    def test_listing_limit_is_capped(self):
+        """Test API does not return more events than MAX_PAGE_LIMIT."""
+        self.app.config['MAX_PAGE_LIMIT'] = 5
+        self.seed_events(8)
+        res = self.client().get('/api/events/all?limit=1000')
+        self.assertEqual(len(json.loads(res.data.decode())), 5)
+
+    def test_api_search_events(self):
+        """Test API can search events, best match first (GET request)."""
+        self.seed_events(3)
+        with self.app.app_context():
+            user = User.query.filter_by(email='seed@test.com').first()
+            for title, description in [('Poetry by the river', 'Readings at dusk'),
+                                       ('Reading marathon', 'Bring poetry books')]:
+                Events(title=title, location='Nairobi', time='10:00AM',
+                       date='6th JAN 2017', description=description,
+                       image_url='https://www.google.com', created_by=user.id,
+                       event_category=1).save()
+
+        res = self.client().get('/api/events/all?q=poetry')
+        self.assertEqual(res.status_code, 200)
+        titles = [event['title'] for event in json.loads(res.data.decode())]
+        self.assertEqual(titles, ['Poetry by the river', 'Reading marathon'])
+
+        res = self.client().get('/api/events/all?q=poetry marathon')
+        titles = [event['title'] for event in json.loads(res.data.decode())]
+        self.assertEqual(titles, ['Reading marathon'])
+
+        res = self.client().get('/api/events/all?q=opera')
+        self.assertEqual(res.status_code, 404)
+
+        with self.app.app_context():
+            event = Events.query.filter_by(title='Reading marathon').first()
+            event.description = 'An opera night'
+            event.save()
+        res = self.client().get('/api/events/all?q=opera')
+        titles = [event['title'] for event in json.loads(res.data.decode())]
+        self.assertEqual(titles, ['Reading marathon'])
+
+    def test_catalogue_export_streams_filtered_events(self):
+        """Test the catalogue export applies the listing filters."""
+        self.seed_events(3)
+        res = self.client().get('/api/events/all/export?title=event 1')
+        self.assertEqual(res.status_code, 200)
+        self.assertTrue(res.is_streamed)
+        rows = [json.loads(line) for line in res.data.decode().splitlines()]
+        self.assertEqual([row['title'] for row in rows], ['Seeded event 1'])
+        self.assertEqual(rows[0]['event_category'], 'Seeded')
+        self.assertEqual(rows[0]['created_by'], 'seed user')
+
+        res = self.client().get('/api/events/all/export?format=csv.gz')
+        self.assertEqual(res.mimetype, 'application/gzip')
+        lines = gzip.decompress(res.data).decode().splitlines()
+        self.assertEqual(len(lines), 4)
+        self.assertTrue(lines[0].startswith('id,title,location'))
+
+    def test_catalogue_export_sends_only_changes(self):
+        """Test If-Modified-Since gets only events changed since."""
+        self.seed_events(2)
+        with self.app.app_context():
+            Events.query.filter_by(title='Seeded event 0').update(
+                {'updated_at': datetime(2019, 12, 31)})
+            Events.query.filter_by(title='Seeded event 1').update(
+                {'updated_at': datetime(2020, 1, 1)})
+            db.session.commit()
+        res = self.client().get('/api/events/all/export')
+        self.assertEqual(res.headers['Last-Modified'], 'Wed, 01 Jan 2020 00:00:00 GMT')
+        self.assertEqual(res.headers['Vary'], 'If-Modified-Since')
+        self.assertNotIn('Cache-Control', res.headers)
+        headers = {'If-Modified-Since': res.headers['Last-Modified']}
+        res = self.client().get('/api/events/all/export', headers=headers)
+        self.assertEqual(res.status_code, 200)
+        # the delta must not be cached as the whole export
+        self.assertEqual(res.headers['Cache-Control'], 'no-store')
+        self.assertEqual(res.headers['Vary'], 'If-Modified-Since')
+        self.assertEqual([json.loads(line)['title'] for line in res.data.decode().splitlines()],
+                         ['Seeded event 1'])
+
+        # a delete leaves Last-Modified where it was, and is not answered 304
+        with self.app.app_context():
+            Events.query.filter_by(title='Seeded event 0').first().delete()
+        res = self.client().get('/api/events/all/export', headers=headers)
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.headers['Last-Modified'], 'Wed, 01 Jan 2020 00:00:00 GMT')
+
+        with self.app.app_context():
+            event = Events.query.filter_by(title='Seeded event 1').first()
+            event.add_rsvp(User.query.first())
+        res = self.client().get('/api/events/all/export', headers=headers)
+        self.assertEqual(res.status_code, 200)
+        rows = [json.loads(line) for line in res.data.decode().splitlines()]
+        self.assertEqual([(row['title'], row['rsvp_count']) for row in rows],
+                         [('Seeded event 1', 1)])
+
+    def test_listing_by_start_time(self):
+        """Test events can be listed in time order within a date range."""
+        self.seed_events(0)
+        with self.app.app_context():
+            for title, date in [('May', '5th May 2026'), ('Jan', '1st Jan 2026'),
+                                ('Mar', '3rd Mar 2026'), ('Feb', '2nd Feb 2026'),
+                                ('Someday', 'Someday')]:
+                Events(title=title, location='Nairobi', time='10:00AM', date=date,
+                       description='Dated', image_url='', created_by=1,
+                       event_category=1).save()
+
+        res = self.client().get('/api/events/all?sort=starts_at&from=2026-01-15&to=2026-05-01')
+        self.assertEqual([event['title'] for event in json.loads(res.data.decode())],
+                         ['Feb', 'Mar'])
+        self.assertEqual(json.loads(res.data.decode())[0]['starts_at'], '2026-02-02T10:00:00')
+
+        titles, cursor = [], ''
+        while cursor is not None:
+            res = self.client().get(
+                '/api/events/all?sort=starts_at&limit=2&cursor={}'.format(cursor))
+            data = json.loads(res.data.decode())
+            titles.extend(event['title'] for event in data['events'])
+            cursor = data['next_cursor']
+        self.assertEqual(titles, ['Jan', 'Feb', 'Mar', 'May'])
+
+        self.assertEqual(self.client().get('/api/events/all?from=whenever').status_code, 400)
+        self.assertEqual(self.client().get('/api/events/all?sort=title').status_code, 400)
+
+    def test_single_event_conditional_get(self):
+        """Test an unchanged event is answered 304 without loading it."""
+        self.seed_events(1)
+        res = self.client().get('/api/events/all/1')
+        etag = res.headers['ETag']
+        res, count = self.count_queries_with('/api/events/all/1', {'If-None-Match': etag})
+        self.assertEqual(res.status_code, 304)
+        self.assertEqual(res.data, b'')
+        self.assertEqual(res.headers['ETag'], etag)
+        self.assertEqual(count, 1)
+
+        with self.app.app_context():
+            Events.query.get(1).add_rsvp(User.query.first())
+        res = self.client().get('/api/events/all/1', headers={'If-None-Match': etag})
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(json.loads(res.data.decode())['rsvp_count'], 1)
+        self.assertNotEqual(res.headers['ETag'], etag)
+
+    def test_listing_conditional_get(self):
+        """Test an unchanged page of events is answered 304."""
+        self.seed_events(3)
+        res = self.client().get('/api/events/all?limit=2')
+        headers = {'If-None-Match': res.headers['ETag']}
+        self.assertEqual(self.client().get('/api/events/all?limit=2',
+                                           headers=headers).status_code, 304)
+        self.assertEqual(self.client().get('/api/events/all?limit=3',
+                                           headers=headers).status_code, 200)
+
+        # uncached listings compare the ETag before serializing anything
+        url = '/api/events/all?limit=2&cursor='
+        headers = {'If-None-Match': self.client().get(url).headers['ETag']}
+        with mock.patch('app.events.views.serialize_event') as serialize:
+            self.assertEqual(self.client().get(url, headers=headers).status_code, 304)
+        serialize.assert_not_called()
+
+        with self.app.app_context():
+            category = EventCategory.query.get(1)
+            category.category_name = 'Reseeded'
+            category.save()
+        self.assertEqual(self.client().get('/api/events/all?limit=2',
+                                           headers=headers).status_code, 200)
+
+    def test_listing_after_delete_is_modified(self):
+        """Test deleting a listed event is not answered 304."""
+        self.seed_events(3)
+        res = self.client().get('/api/events/all')
+        headers = {'If-None-Match': res.headers['ETag'],
+                   'If-Modified-Since': 'Fri, 01 Jan 2100 00:00:00 GMT'}
+        with self.app.app_context():
+            Events.query.get(2).delete()
+        res = self.client().get('/api/events/all', headers=headers)
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(len(json.loads(res.data.decode())), 2)
+        res = self.client().get('/api/events/all', headers={
+            'If-Modified-Since': headers['If-Modified-Since']})
+        self.assertEqual(res.status_code, 200)
+
     def tearDown(self):
         """teardown all initialized variables."""
         with self.app.app_context():
@@ -0,0 +1,139 @@
+"""Tests for the /metrics endpoint."""
+
+import json
+import os
+import runpy
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+from app import create_app, db, mail, metrics
+from app.emails.outbox import drain_outbox
+from app.emails.sink import SMTPSink
+from app.models import EventCategory, OutboxMail
+
+
+class MetricsTestCase(unittest.TestCase):
+    """Test case for the metrics of requests, the database, mail and caches."""
+
+    def setUp(self):
+        """Set up an app with a category to read."""
+        self.app = create_app(config_name="testing")
+        self.client = self.app.test_client
+
+        with self.app.app_context():
+            db.session.close()
+            db.drop_all()
+            db.create_all()
+            EventCategory(category_name='Sports').save()
+
+    def samples(self):
+        """Returns the sample lines of /metrics mapped to their values."""
+        res = self.client().get('/metrics')
+        self.assertEqual(res.status_code, 200)
+        self.assertTrue(res.content_type.startswith('text/plain; version=0.0.4'))
+        return dict(line.rsplit(' ', 1) for line in res.data.decode().splitlines()
+                    if not line.startswith('#'))
+
+    def test_request_metrics(self):
+        """Test requests are counted and timed per endpoint and status."""
+        self.client().get('/api/category')
+        self.client().get('/api/category')
+        self.client().get('/api/events/all')
+        self.client().get('/no/such/page')
+        samples = self.samples()
+
+        self.assertEqual(samples['http_requests_total{endpoint="event.EVENT_CATEGORIES_VIEW",'
+                                 'method="GET",status="200"}'], '2')
+        self.assertEqual(samples['http_requests_total{endpoint="event.ALL_EVENTS_VIEW",'
+                                 'method="GET",status="404"}'], '1')
+        self.assertEqual(samples['http_requests_total{endpoint="unmatched",'
+                                 'method="GET",status="404"}'], '1')
+        series = 'endpoint="event.EVENT_CATEGORIES_VIEW",method="GET"'
+        self.assertEqual(samples['http_request_duration_seconds_bucket{%s,le="+Inf"}' % series], '2')
+        self.assertEqual(samples['http_request_duration_seconds_count{%s}' % series], '2')
+        # the scrape itself is the one request in flight
+        self.assertEqual(samples['http_requests_in_flight{endpoint="metrics"}'], '1')
+        self.assertEqual(samples['http_requests_in_flight{endpoint="event.ALL_EVENTS_VIEW"}'], '0')
+        self.assertGreater(int(samples['db_pool_checkout_seconds_count']), 0)
+
+        self.assertEqual(samples['cache_requests_total{cache="category",result="miss"}'], '1')
+        self.assertEqual(samples['cache_requests_total{cache="category",result="hit"}'], '2')
+        self.assertEqual(float(samples['cache_hit_ratio{cache="category"}']), 2 / 3)
+
+    def test_mail_send_latency(self):
+        """Test every email the worker sends is timed."""
+        sink = SMTPSink().start()
+        self.app.config.update(MAIL_SERVER=sink.host, MAIL_PORT=sink.port,
+                               MAIL_USE_TLS=False, MAIL_SUPPRESS_SEND=False)
+        mail.init_app(self.app)
+        try:
+            with self.app.app_context():
+                for number in range(3):
+                    OutboxMail('user{}@example.com'.format(number), 'Hello', '<p>Hi</p>').save()
+                self.assertEqual(drain_outbox(), (3, 0))
+        finally:
+            sink.stop()
+        samples = self.samples()
+        self.assertEqual(samples['mail_send_seconds_count{outcome="sent"}'], '3')
+        self.assertEqual(samples['smtp_connections_total{outcome="opened"}'], '1')
+
+    def test_processes_added_up(self):
+        """Test /metrics adds up the snapshots every process writes."""
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.app.config['METRICS_DIR'] = directory
+        metrics.directory = directory
+
+        self.client().get('/api/category')
+        other = dict(metrics.snapshot(), gauges=[
+            ['http_requests_in_flight', [['endpoint', 'event.EVENT_CATEGORIES_VIEW']], 1]])
+        exited = subprocess.Popen([sys.executable, '-c', 'pass'])
+        exited.wait()
+        for pid in (os.getppid(), exited.pid):
+            with open(os.path.join(directory, '{}.json'.format(pid)), 'w') as snapshot_file:
+                json.dump(dict(other, pid=pid), snapshot_file)
+
+        samples = self.samples()
+        self.assertEqual(samples['http_requests_total{endpoint="event.EVENT_CATEGORIES_VIEW",'
+                                 'method="GET",status="200"}'], '3')
+        # requests in flight in a process that has exited are dropped
+        self.assertEqual(samples['http_requests_in_flight{endpoint="metrics"}'], '1')
+        self.assertEqual(samples['http_requests_in_flight{'
+                                 'endpoint="event.EVENT_CATEGORIES_VIEW"}'], '1')
+        self.assertEqual(samples['cache_requests_total{cache="category",result="miss"}'], '3')
+
+    def test_single_process_warned_without_directory(self):
+        """Test start up warns when workers cannot add up their metrics."""
+        self.app.config['WEB_CONCURRENCY'] = 2
+        with self.assertLogs(self.app.logger, 'WARNING') as logs:
+            metrics.init_app(self.app)
+        self.assertIn('METRICS_DIR is not set', logs.output[0])
+
+    def test_gunicorn_empties_directory_on_start(self):
+        """Test the gunicorn config drops the snapshots of an earlier run."""
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        for name in ('1.json', '2.json.tmp', 'notes.txt'):
+            open(os.path.join(directory, name), 'w').close()
+        config = runpy.run_path(os.path.join(
+            os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'gunicorn.conf.py'))
+        with mock.patch.dict(os.environ, {'METRICS_DIR': directory}):
+            config['on_starting'](None)
+        self.assertEqual(os.listdir(directory), ['notes.txt'])
+
+    def tearDown(self):
+        """teardown all initialized variables."""
+        metrics.directory = None
+        metrics.stop()
+        with self.app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+
+# Make the tests conveniently executable
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,81 @@
+"""Tests for the per-request SQL instrumentation."""
+
+import unittest
+from unittest import mock
+
+from app import create_app, db, query_profiler
+from app.models import EventCategory
+
+
+class QueryProfilerTestCase(unittest.TestCase):
+    """Test case for the query profiler."""
+
+    def setUp(self):
+        """Set up an app with profiling on and a category to read."""
+        self.app = create_app(config_name="testing")
+        self.app.config['SQL_PROFILING'] = True
+        query_profiler.init_app(self.app)
+        self.client = self.app.test_client
+
+        with self.app.app_context():
+            db.session.close()
+            db.drop_all()
+            db.create_all()
+            EventCategory(category_name='Sports').save()
+
+    def test_server_timing_header(self):
+        """Test responses report their queries and database time."""
+        res = self.client().get('/api/category')
+        self.assertEqual(res.status_code, 200)
+        timings = res.headers.getlist('Server-Timing')
+        self.assertTrue(timings[0].startswith('db;desc="queries=1";dur='))
+        self.assertTrue(timings[1].startswith('total;dur='))
+
+        res = self.client().get('/api/category')
+        self.assertTrue(res.headers['Server-Timing'].startswith('db;desc="queries=0"'))
+        self.assertEqual(query_profiler.stats()['requests'], 2)
+        self.assertEqual(query_profiler.stats()['queries'], 1)
+
+    def test_slow_request_logged(self):
+        """Test requests over the threshold log their slowest statements."""
+        with mock.patch.object(self.app.logger, 'info') as info, \
+                mock.patch.object(self.app.logger, 'warning') as warning:
+            self.client().get('/api/events/all')
+            self.assertIn('queries=', info.call_args[0][0])
+            warning.assert_not_called()
+
+            query_profiler.slow_request_ms = 0
+            self.client().get('/api/events/all?limit=3')
+        self.assertEqual(query_profiler.stats()['slow_requests'], 1)
+        message = warning.call_args[0][0] % warning.call_args[0][1:]
+        self.assertIn('slow request: method=GET path=/api/events/all status=404', message)
+        self.assertIn('"statement": "SELECT', message)
+
+    def test_failed_statement_leaves_nothing_behind(self):
+        """Test a statement that raises is not left on its connection."""
+        self.client().get('/api/category')
+        with self.app.app_context(), db.engine.connect() as conn:
+            with self.assertRaises(Exception):
+                conn.execute('SELECT * FROM no_such_table')
+            conn.execute('SELECT 1')
+            self.assertNotIn('query_started', conn.info)
+
+    def test_profiling_off_by_default(self):
+        """Test nothing is added unless SQL_PROFILING is on."""
+        app = create_app(config_name="testing")
+        self.assertFalse(query_profiler.enabled)
+        with app.app_context():
+            db.create_all()
+        res = app.test_client().get('/api/category')
+        self.assertNotIn('Server-Timing', res.headers)
+
+    def tearDown(self):
+        """teardown all initialized variables."""
+        with self.app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+
+# Make the tests conveniently executable
+if __name__ == "__main__":
+    unittest.main()
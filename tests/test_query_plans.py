@@ -0,0 +1,171 @@
+"""Checks the hot queries keep using indexes.
+
+Each test makes requests while recording the SQL they issue, then asks
+the database for the plan of every statement that reads one of the
+WATCHED tables. On SQLite every access to those tables must be a SEARCH
+using an index and need no temporary sort. On PostgreSQL sequential and
+bitmap scans are disabled first, which on tables this small leaves an
+index scan in the right order whenever a fitting index exists, so a Seq
+Scan, a scan of a whole index or a Sort node means there is none.
+"""
+
+import re
+import unittest
+
+from sqlalchemy import event as sa_event
+from app import create_app, db
+from app.models import User, Events, EventCategory
+
+WATCHED = ('eventlists', 'rsvps', 'waitlist', 'users')
+EXPLAINED = ('SELECT', 'UPDATE', 'DELETE')
+# maps each PostgreSQL index to the first column it is sorted by
+LEADING_COLUMNS_SQL = """
+    SELECT index_class.relname, attribute.attname
+    FROM pg_index
+    JOIN pg_class index_class ON index_class.oid = pg_index.indexrelid
+    JOIN pg_attribute attribute ON attribute.attrelid = pg_index.indrelid
+        AND attribute.attnum = pg_index.indkey[0]
+"""
+
+
+class QueryPlanTestCase(unittest.TestCase):
+    """Test the plans of the queries behind the busiest endpoints."""
+
+    def setUp(self):
+        """Set up an app with a user, a category and a few events."""
+        self.app = create_app(config_name="testing")
+        self.client = self.app.test_client
+
+        with self.app.app_context():
+            db.session.close()
+            db.drop_all()
+            db.create_all()
+            user = User(name='plan user', email='plan@test.com',
+                        password='plan1234', email_confirmed=True)
+            category = EventCategory(category_name='Plans')
+            db.session.add_all([user, category])
+            db.session.commit()
+            for number in range(5):
+                Events(title='Planned event {}'.format(number), location='Nairobi',
+                       time='10:00AM', date='{} Jan 2026'.format(number + 1),
+                       description='Planned', image_url='', created_by=user.id,
+                       event_category=category.id).save()
+            self.headers = dict(
+                Authorization='Bearer ' + User.generate_token(user.id).decode())
+
+    def record_statements(self, *requests):
+        """Makes (method, url) requests and returns the statements and
+        parameters they sent to the database."""
+        statements = []
+
+        def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            if not executemany:
+                statements.append((statement, parameters))
+
+        with self.app.app_context():
+            engine = db.engine
+        sa_event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+        try:
+            for method, url in requests:
+                res = getattr(self.client(), method)(url, headers=self.headers)
+                self.assertLess(res.status_code, 400, url)
+                res.get_data()  # streamed responses query as they are read
+        finally:
+            sa_event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+        return statements
+
+    def plan_problems(self, statement, parameters):
+        """Returns what is wrong with the plan of one statement."""
+        with self.app.app_context():
+            dialect = db.engine.dialect.name
+            connection = db.engine.raw_connection()
+        try:
+            cursor = connection.cursor()
+            if dialect == 'postgresql':
+                cursor.execute('SET LOCAL enable_seqscan = off')
+                cursor.execute('SET LOCAL enable_bitmapscan = off')
+                cursor.execute(LEADING_COLUMNS_SQL)
+                leading_columns = dict(cursor.fetchall())
+                cursor.execute('EXPLAIN (FORMAT JSON) ' + statement, parameters)
+                return postgresql_problems(cursor.fetchone()[0][0]['Plan'], leading_columns)
+            cursor.execute('EXPLAIN QUERY PLAN ' + statement, parameters)
+            return sqlite_problems([row[-1] for row in cursor.fetchall()])
+        finally:
+            connection.rollback()
+            connection.close()
+
+    def assert_indexed(self, *requests):
+        """Fails if any statement of the requests scans a WATCHED table."""
+        checked = 0
+        for statement, parameters in self.record_statements(*requests):
+            if not statement.lstrip().upper().startswith(EXPLAINED):
+                continue
+            if not any(re.search(r'\b{}\b'.format(table), statement) for table in WATCHED):
+                continue
+            checked += 1
+            problems = self.plan_problems(statement, parameters)
+            self.assertEqual(problems, [], statement)
+        self.assertGreater(checked, 0)
+
+    def test_user_events_listing(self):
+        """Test a user's events are read through an index."""
+        self.assert_indexed(('get', '/api/events'), ('get', '/api/events?cursor='))
+
+    def test_category_listing(self):
+        """Test a category's events are read through an index."""
+        self.assert_indexed(('get', '/api/events/all?event_category=1'),
+                            ('get', '/api/events/all?event_category=1&cursor='))
+
+    def test_start_time_listing(self):
+        """Test date range listings are index range scans."""
+        self.assert_indexed(
+            ('get', '/api/events/all?sort=starts_at&from=2026-01-02&to=2026-01-04'),
+            ('get', '/api/events/all?sort=starts_at&cursor='))
+
+    def test_rsvp_paths(self):
+        """Test reserving, exporting and cancelling seats use indexes."""
+        with self.app.app_context():
+            Events.query.filter_by(id=1).update({'capacity': 1})
+            db.session.commit()
+        self.assert_indexed(('post', '/api/events/1/rsvp'),
+                            ('get', '/api/events/1/rsvps/export'),
+                            ('delete', '/api/events/1/rsvp'))
+
+    def tearDown(self):
+        """teardown all initialized variables."""
+        with self.app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+
+def sqlite_problems(details):
+    """Finds table scans and temporary sorts in EXPLAIN QUERY PLAN rows."""
+    problems = []
+    for detail in details:
+        if detail.startswith('SCAN') and detail.split()[1] in WATCHED:
+            problems.append(detail)
+        elif 'TEMP B-TREE' in detail:
+            problems.append(detail)
+    return problems
+
+
+def postgresql_problems(plan, leading_columns):
+    """Finds scans of WATCHED tables, sequential or along a whole index,
+    and sorts in a JSON plan. An index scan only narrows the rows read
+    when its Index Cond constrains the index's first column."""
+    problems = []
+    if plan.get('Relation Name') in WATCHED and 'Scan' in plan['Node Type']:
+        leading = leading_columns.get(plan.get('Index Name'))
+        condition = plan.get('Index Cond', '')
+        if not leading or not re.search(r'\b{}\b'.format(leading), condition):
+            problems.append('{} on {}'.format(plan['Node Type'], plan['Relation Name']))
+    if plan['Node Type'] == 'Sort':
+        problems.append('Sort on {}'.format(', '.join(plan['Sort Key'])))
+    for child in plan.get('Plans', []):
+        problems.extend(postgresql_problems(child, leading_columns))
+    return problems
+
+
+# Make the tests conveniently executable
+if __name__ == "__main__":
+    unittest.main()